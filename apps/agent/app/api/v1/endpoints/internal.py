@@ -0,0 +1,148 @@
+from typing import Any, Dict, List, Optional
+import hmac
+import json
+import logging
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import message_to_dict, messages_to_dict
+from pydantic import BaseModel, Field
+from app.core.analytics import analytics_pipeline
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.services.conversation_actor_service import conversation_actor_service
+from app.services.gemini_cache_service import (
+    cache_usage_tracker,
+    gemini_context_cache,
+)
+from app.services.dedupe_service import (
+    completed_message_dedupe,
+    processed_message_dedupe,
+    webhook_request_dedupe,
+)
+from app.services.http_transport_service import http_transport
+from app.services.ingress_queue_service import ingress_queue_service
+from app.services.main_api_service import main_api_service
+from app.services.postgres_checkpointer_service import (
+    get_postgres_checkpointer_service,
+    get_postgres_checkpointer_stats,
+)
+
+router = APIRouter()
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def verify_internal_token(authorization: Optional[str] = Header(None)):
+    """Only the main API (which shares AGENT_API_SECRET) may call these endpoints."""
+    expected = f"Bearer {settings.AGENT_API_SECRET}"
+    if not authorization or not hmac.compare_digest(authorization, expected):
+        logger.warning("🔐 INTERNAL: Rejected request with invalid credentials")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+@router.get("/metrics", dependencies=[Depends(verify_internal_token)])
+async def get_metrics() -> Dict[str, Any]:
+    """Process metrics plus the current state of the message pipeline."""
+    return {
+        "metrics": metrics.snapshot(),
+        "ingress_queue": await ingress_queue_service.get_stats(),
+        "conversation_actors": conversation_actor_service.get_stats(),
+        "http_clients": http_transport.get_stats(),
+        "analytics": analytics_pipeline.get_stats(),
+        "llm_prompt_cache": {
+            "usage": cache_usage_tracker.get_stats(),
+            "context_caches": (
+                gemini_context_cache.get_stats() if gemini_context_cache else None
+            ),
+        },
+        "dedupe": {
+            "messages": processed_message_dedupe.get_stats(),
+            "completed_messages": completed_message_dedupe.get_stats(),
+            "webhooks": webhook_request_dedupe.get_stats(),
+        },
+        "idempotent_writes": main_api_service.idempotent_writes.get_stats(),
+        "user_data_cache": main_api_service.user_data_cache.get_stats(),
+        "main_api_read_cache": main_api_service.read_cache.get_stats(),
+        "checkpointer": await get_postgres_checkpointer_stats(),
+    }
+
+
+@router.post(
+    "/users/{phone_number}/invalidate", dependencies=[Depends(verify_internal_token)]
+)
+async def invalidate_user_data(phone_number: str) -> Dict[str, bool]:
+    """Drop the cached user data and reads, e.g. after the main API changed the user."""
+    return {"invalidated": main_api_service.invalidate_user(phone_number)}
+
+
+EXPORT_PAGE_SIZE = 200
+
+
+class DeleteConversationsRequest(BaseModel):
+    thread_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+@router.get(
+    "/conversations/{thread_id}/messages",
+    dependencies=[Depends(verify_internal_token)],
+)
+async def get_conversation_messages(
+    thread_id: str,
+    before: Optional[int] = Query(
+        None, ge=0, description="next_cursor of the previous page"
+    ),
+    limit: int = Query(50, ge=1, le=500),
+) -> Dict[str, Any]:
+    """A page of a conversation's messages, starting from the most recent ones."""
+    postgres_service = await get_postgres_checkpointer_service()
+    page = await postgres_service.get_thread_messages(
+        thread_id, before=before, limit=limit
+    )
+    return {**page, "messages": messages_to_dict(page["messages"])}
+
+
+@router.get(
+    "/conversations/{thread_id}/messages/export",
+    dependencies=[Depends(verify_internal_token)],
+)
+async def export_conversation_messages(thread_id: str) -> StreamingResponse:
+    """
+    Every message of a conversation, oldest first, streamed as NDJSON.
+
+    Pages of EXPORT_PAGE_SIZE messages are read and encoded one at a time,
+    all from the same cached decoded history.
+    """
+    postgres_service = await get_postgres_checkpointer_service()
+
+    async def lines():
+        start = 0
+        while True:
+            page = await postgres_service.get_thread_messages(
+                thread_id, before=start + EXPORT_PAGE_SIZE, limit=EXPORT_PAGE_SIZE
+            )
+            # The last page can start before `start`; skip what was already sent
+            for message in page["messages"][start - page["start"] :]:
+                yield json.dumps(
+                    message_to_dict(message), ensure_ascii=False, default=str
+                ) + "\n"
+            start += EXPORT_PAGE_SIZE
+            if start >= page["total"]:
+                break
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.delete(
+    "/conversations/{thread_id}", dependencies=[Depends(verify_internal_token)]
+)
+async def delete_conversation(thread_id: str) -> Dict[str, int]:
+    """Permanently delete a conversation (checkpoints, blobs and writes)."""
+    postgres_service = await get_postgres_checkpointer_service()
+    return await postgres_service.delete_threads([thread_id])
+
+
+@router.post("/conversations/delete", dependencies=[Depends(verify_internal_token)])
+async def delete_conversations(request: DeleteConversationsRequest) -> Dict[str, int]:
+    """Permanently delete several conversations, e.g. for a data erasure request."""
+    postgres_service = await get_postgres_checkpointer_service()
+    return await postgres_service.delete_threads(request.thread_ids)
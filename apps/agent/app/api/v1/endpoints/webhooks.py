@@ -1,6 +1,6 @@
 from typing import Any, Dict, Optional
 from fastapi import APIRouter, HTTPException, Request, Response, Query
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import get_settings
 import httpx
 import base64
@@ -9,9 +9,9 @@ import asyncio
 import hmac
 import hashlib
 import json
+import time
 import traceback
-from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime
 from app.services.main_api_service import (
     main_api_service,
     ExpenseItem,
@@ -26,68 +26,34 @@ from app.services.apolo_subscription_services import (
     apolo_trial_conversion_service,
 )
 from app.services.whatsapp_service import send_message
+from app.services.http_transport_service import http_transport
 from app.services.mistral_service import mistral_service
+from app.services.ingress_queue_service import (
+    ingress_queue_service,
+    IngressJob,
+    IngressQueueFullError,
+    PermanentJobError,
+)
+from app.services.conversation_actor_service import conversation_actor_service
+from app.services.dedupe_service import (
+    completed_message_dedupe,
+    processed_message_dedupe,
+    webhook_request_dedupe,
+)
 from app.utils.media_modifier import modify_media_with_context
 
 # Removed Redis/chat_storage imports - now using LangGraph PostgreSQL storage only
 from app.utils.error_handler import handle_error
+from app.utils.retry import backoff_delay, is_retryable_error
 from app.core.analytics import mixpanel
+from app.core.metrics import metrics
 
 router = APIRouter()
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-# In-memory stores for message processing
-processed_messages = (
-    {}
-)  # Track processed message IDs with timestamps {msg_id: timestamp}
-user_message_batches = defaultdict(list)  # Store batched messages per user
-user_batch_timers = {}  # Track debouncing timers per user
-user_processing_lock = defaultdict(
-    asyncio.Lock
-)  # Prevent concurrent processing per user
-
-# Track webhook requests to detect duplicates
-webhook_requests = {}  # Track webhook request signatures/hashes with timestamps
-
-
-# Cleanup old processed messages every hour to prevent memory leaks
-async def cleanup_processed_messages():
-    """Clean up old processed message IDs and webhook requests to prevent memory leaks"""
-    while True:
-        await asyncio.sleep(3600)  # Clean up every hour
-
-        # Remove messages older than 2 hours
-        cutoff_time = datetime.now() - timedelta(hours=2)
-        messages_to_remove = [
-            msg_id
-            for msg_id, timestamp in processed_messages.items()
-            if timestamp < cutoff_time
-        ]
-
-        for msg_id in messages_to_remove:
-            del processed_messages[msg_id]
-
-        # Remove webhook requests older than 1 hour
-        webhook_cutoff_time = datetime.now() - timedelta(hours=1)
-        webhook_requests_to_remove = [
-            req_hash
-            for req_hash, timestamp in webhook_requests.items()
-            if timestamp < webhook_cutoff_time
-        ]
-
-        for req_hash in webhook_requests_to_remove:
-            del webhook_requests[req_hash]
-
-        if messages_to_remove or webhook_requests_to_remove:
-            logger.info(
-                f"🧹 CLEANUP: Removed {len(messages_to_remove)} old messages and {len(webhook_requests_to_remove)} old webhook requests. "
-                f"Remaining: {len(processed_messages)} messages, {len(webhook_requests)} webhook requests"
-            )
-
-
-# Cleanup task will be started when the first webhook is processed
-cleanup_task_started = False
+# Bounds media downloads, OCR and transcription running at once across deliveries
+preprocess_semaphore = asyncio.Semaphore(settings.MESSAGE_PREPROCESS_CONCURRENCY)
 
 
 def verify_webhook_signature(
@@ -136,68 +102,88 @@ def verify_webhook_signature(
         return False
 
 
-async def process_with_langgraph_retry(current_message, user_data, max_retries=3):
-    """Process current message with LangGraph service with retry logic"""
-    for attempt in range(max_retries):
+async def _process_with_retry(service, label, tier, current_message, user_data):
+    """
+    Run an agent turn, retrying transient failures with jittered backoff.
+
+    A retry resumes the failed run from its last checkpoint, so model calls and
+    tool writes that already completed are not repeated; if nothing was
+    checkpointed yet the turn starts over. Fatal errors are raised immediately.
+
+    Raises:
+        PermanentJobError: Once the turn failed for good, so the ingress queue
+            doesn't retry the whole delivery on top of these attempts
+    """
+    max_attempts = max(1, settings.AGENT_RETRY_MAX_ATTEMPTS)
+    resume = False
+    for attempt in range(1, max_attempts + 1):
         try:
             logger.info(
-                f"🤖 LangGraph attempt {attempt + 1}/{max_retries} for user {user_data.phone_number}"
+                f"🤖 {label} attempt {attempt}/{max_attempts} for user {user_data.phone_number}"
+                + (" (resuming)" if resume else "")
             )
-            response = await apolo_langgraph_service.process_conversation(
+            response = await service.process_conversation(
                 current_message=current_message,
                 user_data=user_data,
                 thread_id=user_data.chatId,
+                resume=resume,
             )
             logger.info(
-                f"✅ LangGraph success on attempt {attempt + 1} for user {user_data.phone_number}"
+                f"✅ {label} success on attempt {attempt} for user {user_data.phone_number}"
             )
             return response
         except Exception as e:
-            import traceback
-
             error_details = traceback.format_exc()
+            retryable = is_retryable_error(e)
             logger.error(
-                f"❌ LangGraph attempt {attempt + 1} failed for user {user_data.phone_number}: {str(e)}"
+                f"❌ {label} attempt {attempt} failed for user {user_data.phone_number} "
+                f"({'retryable' if retryable else 'fatal'}): {str(e)}"
             )
             logger.error(f"📋 Full error traceback:\n{error_details}")
-            if attempt == max_retries - 1:
+            if not retryable or attempt == max_attempts:
                 logger.error(
-                    f"🚨 All LangGraph retries failed for user {user_data.phone_number}"
+                    f"🚨 Giving up on {label} for user {user_data.phone_number} after {attempt} attempt(s)"
                 )
-                raise e
-            await asyncio.sleep(1)  # Brief delay before retry
-
+                raise PermanentJobError(str(e)) from e
 
-async def process_with_free_langgraph_retry(current_message, user_data, max_retries=3):
-    """Process current message with Free LangGraph service with retry logic"""
-    for attempt in range(max_retries):
-        try:
-            logger.info(
-                f"🤖 Free LangGraph attempt {attempt + 1}/{max_retries} for user {user_data.phone_number}"
+        await asyncio.sleep(
+            backoff_delay(
+                attempt,
+                settings.AGENT_RETRY_BASE_DELAY_SECONDS,
+                settings.AGENT_RETRY_MAX_DELAY_SECONDS,
             )
-            response = await lukai_free_langgraph_service.process_conversation(
-                current_message=current_message,
-                user_data=user_data,
-                thread_id=user_data.chatId,
-            )
-            logger.info(
-                f"✅ Free LangGraph success on attempt {attempt + 1} for user {user_data.phone_number}"
+        )
+        try:
+            resume = await service.can_resume(
+                current_message, user_data, thread_id=user_data.chatId
             )
-            return response
         except Exception as e:
-            import traceback
-
-            error_details = traceback.format_exc()
-            logger.error(
-                f"❌ Free LangGraph attempt {attempt + 1} failed for user {user_data.phone_number}: {str(e)}"
+            logger.warning(
+                f"⚠️ {label}: Could not read checkpoint for user {user_data.phone_number}, restarting turn: {str(e)}"
             )
-            logger.error(f"📋 Full error traceback:\n{error_details}")
-            if attempt == max_retries - 1:
-                logger.error(
-                    f"🚨 All Free LangGraph retries failed for user {user_data.phone_number}"
-                )
-                raise e
-            await asyncio.sleep(1)  # Brief delay before retry
+            resume = False
+        metrics.increment(
+            "agent_retries",
+            labels={"tier": tier, "mode": "resume" if resume else "restart"},
+        )
+
+
+async def process_with_langgraph_retry(current_message, user_data):
+    """Process current message with LangGraph service with retry logic"""
+    return await _process_with_retry(
+        apolo_langgraph_service, "LangGraph", "apolo", current_message, user_data
+    )
+
+
+async def process_with_free_langgraph_retry(current_message, user_data):
+    """Process current message with Free LangGraph service with retry logic"""
+    return await _process_with_retry(
+        lukai_free_langgraph_service,
+        "Free LangGraph",
+        "free",
+        current_message,
+        user_data,
+    )
 
 
 async def mark_message_read_and_show_typing(user_phone: str, message_id: str):
@@ -207,33 +193,31 @@ async def mark_message_read_and_show_typing(user_phone: str, message_id: str):
             f"📖 Marking message {message_id} as read and showing typing indicator for {user_phone}"
         )
 
-        async with httpx.AsyncClient() as client:
-            headers = {
-                "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
-                "Content-Type": "application/json",
-            }
+        client = http_transport.get_client(http_transport.WHATSAPP)
+        headers = {
+            "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
+            "Content-Type": "application/json",
+        }
 
-            payload = {
-                "messaging_product": "whatsapp",
-                "status": "read",
-                "message_id": message_id,
-                "typing_indicator": {"type": "text"},
-            }
+        payload = {
+            "messaging_product": "whatsapp",
+            "status": "read",
+            "message_id": message_id,
+            "typing_indicator": {"type": "text"},
+        }
 
-            url = f"{settings.WHATSAPP_API_URL}/v19.0/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
+        url = f"{settings.WHATSAPP_API_URL}/v19.0/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
 
-            response = await client.post(
-                url, headers=headers, json=payload, timeout=10.0
-            )
+        response = await client.post(url, headers=headers, json=payload)
 
-            if response.status_code == 200:
-                logger.info(
-                    f"✅ Successfully marked message {message_id} as read and showed typing indicator"
-                )
-            else:
-                logger.warning(
-                    f"⚠️ Failed to mark message as read/show typing. Status: {response.status_code}, Response: {response.text}"
-                )
+        if response.status_code == 200:
+            logger.info(
+                f"✅ Successfully marked message {message_id} as read and showed typing indicator"
+            )
+        else:
+            logger.warning(
+                f"⚠️ Failed to mark message as read/show typing. Status: {response.status_code}, Response: {response.text}"
+            )
 
     except Exception as e:
         # Fire-and-forget: log error but don't fail the processing
@@ -242,229 +226,198 @@ async def mark_message_read_and_show_typing(user_phone: str, message_id: str):
         )
 
 
-async def process_user_message_batch(user_phone: str):
-    """Process a batch of messages for a specific user"""
-    logger.info(f"🚀 BATCH_PROCESS: Starting batch processing for user {user_phone}")
+def get_conversation_service(user_data):
+    """Pick the LangGraph service that handles this user's subscription status"""
+    if user_data.subscription and user_data.subscription.status in (
+        "active",
+        "on_trial",
+    ):
+        return apolo_langgraph_service
+    return lukai_free_langgraph_service
 
-    async with user_processing_lock[user_phone]:
-        logger.info(f"🔒 BATCH_PROCESS: Acquired processing lock for user {user_phone}")
 
-        try:
-            if (
-                user_phone not in user_message_batches
-                or not user_message_batches[user_phone]
-            ):
-                logger.warning(
-                    f"🚫 BATCH_PROCESS: No messages to process for user {user_phone}"
-                )
-                return
-
-            # Get the batch of messages to process
-            message_batch = user_message_batches[user_phone].copy()
-            user_message_batches[user_phone].clear()  # Clear the batch
-
-            logger.info(
-                f"📦 BATCH_PROCESS: Processing batch of {len(message_batch)} messages for user {user_phone}"
-            )
+async def prefetch_user_conversation(user_phone: str, message_data: dict):
+    """Warm the user's graph and latest checkpoint while their batch is debouncing"""
+    user_data = message_data.get("user")
+    if user_data is None:
+        return
+    try:
+        service = get_conversation_service(user_data)
+        await service.prefetch_conversation(user_data, thread_id=user_data.chatId)
+    except Exception as e:
+        # Prefetching is best effort; the batch loads everything itself on a miss
+        logger.warning(
+            f"⚠️ PREFETCH: Failed to prefetch conversation for user {user_phone}: {str(e)}"
+        )
 
-            # Log message IDs in batch
-            message_ids = [msg.get("message_id", "unknown") for msg in message_batch]
-            logger.info(f"📋 BATCH_PROCESS: Message IDs in batch: {message_ids}")
 
-            # Mark the last message as read and show typing indicator
-            # (marking the last message as read will also mark earlier messages as read)
-            if message_batch:
-                last_message_id = message_batch[-1].get("message_id")
-                if last_message_id:
-                    await mark_message_read_and_show_typing(user_phone, last_message_id)
+async def process_user_message_batch(user_phone: str, message_batch: list[dict]):
+    """Process a debounced batch of messages for a specific user.
 
-            # Get user data from the first message (all should have same user)
-            user_data = message_batch[0]["user"]
+    Called by the user's conversation actor, which guarantees batches for the
+    same user are processed one at a time. If the batch fails, the completions
+    of its messages fail too, so the ingress queue retries their deliveries
+    (and tells the user once it gives up).
+    """
+    logger.info(f"🚀 BATCH_PROCESS: Starting batch processing for user {user_phone}")
 
-            logger.info(
-                f"💬 BATCH_PROCESS: Processing batch with LangGraph PostgreSQL storage for user {user_phone}"
+    batch_error: BaseException | None = None
+    try:
+        if not message_batch:
+            logger.warning(
+                f"🚫 BATCH_PROCESS: No messages to process for user {user_phone}"
             )
+            return
 
-            # Extract current message text for LangGraph - combine all text content from batch
-            current_message_text = ""
+        logger.info(
+            f"📦 BATCH_PROCESS: Processing batch of {len(message_batch)} messages for user {user_phone}"
+        )
 
-            for i, msg_data in enumerate(message_batch):
-                logger.info(
-                    f"📝 BATCH_PROCESS: Processing message {i+1}/{len(message_batch)} - ID: {msg_data.get('message_id')}"
-                )
+        # Log message IDs in batch
+        message_ids = [msg.get("message_id", "unknown") for msg in message_batch]
+        logger.info(f"📋 BATCH_PROCESS: Message IDs in batch: {message_ids}")
 
-                if msg_data.get("text"):
-                    current_message_text += msg_data["text"] + "\n"
-                    logger.info(
-                        f"✅ BATCH_PROCESS: Added text content: '{msg_data['text'][:50]}...'"
-                    )
+        # Mark the last message as read and show typing indicator
+        # (marking the last message as read will also mark earlier messages as read)
+        if message_batch:
+            last_message_id = message_batch[-1].get("message_id")
+            if last_message_id:
+                await mark_message_read_and_show_typing(user_phone, last_message_id)
 
-                # Add image context if present
-                if "image_url" in msg_data:
-                    logger.info(f"✅ BATCH_PROCESS: Added image content")
+        # Get user data from the first message (all should have same user)
+        user_data = message_batch[0]["user"]
 
-            # Clean up the message text
-            current_message_text = current_message_text.strip()
+        logger.info(
+            f"💬 BATCH_PROCESS: Processing batch with LangGraph PostgreSQL storage for user {user_phone}"
+        )
+
+        # Extract current message text for LangGraph - combine all text content from batch
+        current_message_text = ""
 
+        for i, msg_data in enumerate(message_batch):
             logger.info(
-                f"🤖 BATCH_PROCESS: Sending current message to AI: '{current_message_text[:100]}...'"
+                f"📝 BATCH_PROCESS: Processing message {i+1}/{len(message_batch)} - ID: {msg_data.get('message_id')}"
             )
 
-            # Process with appropriate service based on subscription status
-            if user_data.subscription:
-                if (
-                    user_data.subscription.status == "active"
-                    or user_data.subscription.status == "on_trial"
-                ):
-                    logger.info(
-                        f"💎 BATCH_PROCESS: Using apolo_langgraph_service (active/trial subscription)"
-                    )
-                    response = await process_with_langgraph_retry(
-                        current_message=current_message_text,
-                        user_data=user_data,
-                    )
-                else:
-                    logger.info(
-                        f"⛔ BATCH_PROCESS: Using lukai_free_langgraph_service (expired subscription)"
-                    )
-                    response = await process_with_free_langgraph_retry(
-                        current_message=current_message_text,
-                        user_data=user_data,
-                    )
-            else:
+            if msg_data.get("text"):
+                current_message_text += msg_data["text"] + "\n"
                 logger.info(
-                    f"🆓 BATCH_PROCESS: Using lukai_free_langgraph_service (free plan)"
-                )
-                response = await process_with_free_langgraph_retry(
-                    current_message=current_message_text,
-                    user_data=user_data,
+                    f"✅ BATCH_PROCESS: Added text content: '{msg_data['text'][:50]}...'"
                 )
 
-            # Ensure response is a string
-            if isinstance(response, list):
-                response = str(response)
-            elif response is None:
-                response = "I apologize, but I couldn't process your request. Please try again."
+            # Add image context if present
+            if "image_url" in msg_data:
+                logger.info(f"✅ BATCH_PROCESS: Added image content")
 
-            logger.info(
-                f"✅ BATCH_PROCESS: Generated response for user {user_phone}: '{response[:100]}...'"
-            )
+        # Clean up the message text
+        current_message_text = current_message_text.strip()
 
-            # Note: No need to save chat - LangGraph PostgreSQL handles persistence automatically
-            logger.info(
-                f"💾 BATCH_PROCESS: Chat persistence handled by LangGraph PostgreSQL for user {user_phone}"
-            )
+        logger.info(
+            f"🤖 BATCH_PROCESS: Sending current message to AI: '{current_message_text[:100]}...'"
+        )
 
-            # Send the response back to the user via WhatsApp
-            logger.info(
-                f"📤 BATCH_PROCESS: Sending response to WhatsApp for user {user_phone}"
-            )
-            await send_message(user_data.phone_number, response)
+        # Process with appropriate service based on subscription status
+        if get_conversation_service(user_data) is apolo_langgraph_service:
             logger.info(
-                f"✅ BATCH_PROCESS: Successfully sent response to user {user_phone}"
+                f"💎 BATCH_PROCESS: Using apolo_langgraph_service (active/trial subscription)"
             )
-
-        except Exception as e:
-            logger.error(
-                f"❌ BATCH_PROCESS: Error processing message batch for user {user_phone}: {str(e)}"
-            )
-            await handle_error(
-                error=e,
-                user_id=user_phone,
-                endpoint="webhooks.whatsapp.process_message_batch",
-                message=f"Error processing message batch for user {user_phone}",
+            response = await process_with_langgraph_retry(
+                current_message=current_message_text,
+                user_data=user_data,
             )
-            # Send error message to user
-            try:
-                await send_message(
-                    user_phone,
-                    "I encountered an error processing your messages. Please try again.",
-                )
-                logger.info(
-                    f"📤 BATCH_PROCESS: Sent error message to user {user_phone}"
-                )
-            except Exception as send_error:
-                logger.error(
-                    f"❌ BATCH_PROCESS: Failed to send error message to user {user_phone}: {str(send_error)}"
-                )
-        finally:
+        else:
             logger.info(
-                f"🔓 BATCH_PROCESS: Released processing lock for user {user_phone}"
+                f"🆓 BATCH_PROCESS: Using lukai_free_langgraph_service (free plan or expired subscription)"
+            )
+            response = await process_with_free_langgraph_retry(
+                current_message=current_message_text,
+                user_data=user_data,
             )
 
+        # Ensure response is a string
+        if isinstance(response, list):
+            response = str(response)
+        elif response is None:
+            response = (
+                "I apologize, but I couldn't process your request. Please try again."
+            )
 
-async def schedule_batch_processing(user_phone: str):
-    """Schedule batch processing with 5-second debouncing"""
-    logger.info(f"⏰ TIMER: Scheduling batch processing for user {user_phone}")
-
-    # Cancel existing timer if any
-    if user_phone in user_batch_timers:
-        old_timer = user_batch_timers[user_phone]
-        old_timer.cancel()
-        logger.info(f"❌ TIMER: Cancelled existing timer for user {user_phone}")
-
-    async def delayed_processing():
-        logger.info(f"⏳ TIMER: Starting 5-second countdown for user {user_phone}")
-        await asyncio.sleep(5)  # 10-second debouncing
         logger.info(
-            f"⏰ TIMER: 5-second timer expired for user {user_phone}, starting batch processing"
+            f"✅ BATCH_PROCESS: Generated response for user {user_phone}: '{response[:100]}...'"
         )
 
-        # Remove timer reference
-        if user_phone in user_batch_timers:
-            del user_batch_timers[user_phone]
-            logger.info(f"🗑️ TIMER: Removed timer reference for user {user_phone}")
-
-        # Process the batch
-        await process_user_message_batch(user_phone)
-
-    # Create new timer
-    user_batch_timers[user_phone] = asyncio.create_task(delayed_processing())
-    logger.info(f"✅ TIMER: Created new 5-second timer for user {user_phone}")
-
-
-async def add_message_to_batch(user_phone: str, message_data: dict):
-    """Add a message to the user's batch and schedule processing"""
-    message_id = message_data.get("message_id", "unknown")
-    current_batch_size = len(user_message_batches[user_phone])
-
-    logger.info(
-        f"🔄 BATCHING: Adding message {message_id} to batch for user {user_phone}"
-    )
-    logger.info(f"📊 BATCHING: Current batch size before adding: {current_batch_size}")
-
-    # Check if user is currently being processed
-    if user_processing_lock[user_phone].locked():
-        logger.warning(
-            f"🔒 BATCHING: User {user_phone} is currently being processed, queueing message {message_id} for next batch"
-        )
-        # User is being processed, queue for next batch
-        # We'll let the current timer handle this message when it fires
-    else:
+        # Note: No need to save chat - LangGraph PostgreSQL handles persistence automatically
         logger.info(
-            f"🟢 BATCHING: User {user_phone} is not being processed, proceeding with batching"
+            f"💾 BATCH_PROCESS: Chat persistence handled by LangGraph PostgreSQL for user {user_phone}"
         )
 
-    # Add message to batch
-    user_message_batches[user_phone].append(message_data)
-    new_batch_size = len(user_message_batches[user_phone])
-
-    logger.info(
-        f"✅ BATCHING: Message {message_id} added to batch. New batch size: {new_batch_size}"
-    )
-
-    # Check if there's an existing timer
-    if user_phone in user_batch_timers:
+        # Send the response back to the user via WhatsApp
         logger.info(
-            f"⏰ BATCHING: Existing timer found for user {user_phone}, will cancel and reschedule"
+            f"📤 BATCH_PROCESS: Sending response to WhatsApp for user {user_phone}"
         )
-    else:
+        await send_message(user_data.phone_number, response)
         logger.info(
-            f"🆕 BATCHING: No existing timer for user {user_phone}, creating new one"
+            f"✅ BATCH_PROCESS: Successfully sent response to user {user_phone}"
         )
 
-    # Schedule/reschedule batch processing
-    await schedule_batch_processing(user_phone)
+        # Redeliveries of these messages are skipped from now on
+        await asyncio.gather(
+            *(
+                completed_message_dedupe.add(msg_data.get("message_id") or "")
+                for msg_data in message_batch
+            )
+        )
+
+    except Exception as e:
+        logger.error(
+            f"❌ BATCH_PROCESS: Error processing message batch for user {user_phone}: {str(e)}"
+        )
+        await handle_error(
+            error=e,
+            user_id=user_phone,
+            endpoint="webhooks.whatsapp.process_message_batch",
+            message=f"Error processing message batch for user {user_phone}",
+        )
+        batch_error = e
+    except asyncio.CancelledError as e:
+        batch_error = e
+        raise
+    finally:
+        # Let the ingress queue acknowledge (or retry) the deliveries in this batch
+        for msg_data in message_batch:
+            completion = msg_data.get("completion")
+            if completion is None or completion.done():
+                continue
+            if batch_error is None:
+                completion.set_result(None)
+            elif isinstance(batch_error, asyncio.CancelledError):
+                # Shutting down: leave the deliveries to be replayed on restart
+                completion.cancel()
+            else:
+                completion.set_exception(batch_error)
+        logger.info(f"🏁 BATCH_PROCESS: Finished batch for user {user_phone}")
+
+
+async def notify_dead_lettered_job(job: IngressJob, error: Exception):
+    """Tell the senders of a delivery the ingress queue gave up on"""
+    senders = {
+        str(message["from"])
+        for entry in job.payload["body"].get("entry", [])
+        for change in entry.get("changes", [])
+        for message in change.get("value", {}).get("messages", [])
+        if message.get("from")
+    }
+    for sender in senders:
+        try:
+            await send_message(
+                sender,
+                "I encountered an error processing your messages. Please try again.",
+            )
+            logger.info(f"📤 BATCH_PROCESS: Sent error message to user {sender}")
+        except Exception as send_error:
+            logger.error(
+                f"❌ BATCH_PROCESS: Failed to send error message to user {sender}: {str(send_error)}"
+            )
 
 
 async def process_image_message(message: dict, message_data: dict):
@@ -523,7 +476,9 @@ async def process_image_message(message: dict, message_data: dict):
 
                     # Modify image with embedded context
                     try:
-                        modified_media_base64 = modify_media_with_context(
+                        # PIL/PDF rendering is CPU-bound, keep it off the event loop
+                        modified_media_base64 = await asyncio.to_thread(
+                            modify_media_with_context,
                             media_bytes=media_content,
                             mime_type=image.get("mime_type", "image/jpeg"),
                             caption=caption,
@@ -584,13 +539,11 @@ async def process_image_message(message: dict, message_data: dict):
                                 expense_items.append(expense_item)
 
                             try:
-                                expense_result = (
-                                    await main_api_service.register_expenses(
-                                        user_phone_number=message_data[
-                                            "user"
-                                        ].phone_number,
-                                        expenses=expense_items,
-                                    )
+                                expense_result = await main_api_service.register_expenses(
+                                    user_phone_number=message_data["user"].phone_number,
+                                    expenses=expense_items,
+                                    # A replayed delivery doesn't register them twice
+                                    idempotency_key=f"{message_data['message_id']}:expenses",
                                 )
                                 if expense_result.success:
                                     registration_results.append(
@@ -628,6 +581,7 @@ async def process_image_message(message: dict, message_data: dict):
                                 income_result = await main_api_service.register_incomes(
                                     user_phone_number=message_data["user"].phone_number,
                                     incomes=income_items,
+                                    idempotency_key=f"{message_data['message_id']}:incomes",
                                 )
                                 if income_result.success:
                                     registration_results.append(
@@ -795,7 +749,9 @@ async def process_document_message(message: dict, message_data: dict):
 
                     # Modify document with embedded context
                     try:
-                        modified_media_base64 = modify_media_with_context(
+                        # PIL/PDF rendering is CPU-bound, keep it off the event loop
+                        modified_media_base64 = await asyncio.to_thread(
+                            modify_media_with_context,
                             media_bytes=media_content,
                             mime_type=document.get("mime_type", "application/pdf"),
                             caption=caption,
@@ -856,13 +812,11 @@ async def process_document_message(message: dict, message_data: dict):
                                 expense_items.append(expense_item)
 
                             try:
-                                expense_result = (
-                                    await main_api_service.register_expenses(
-                                        user_phone_number=message_data[
-                                            "user"
-                                        ].phone_number,
-                                        expenses=expense_items,
-                                    )
+                                expense_result = await main_api_service.register_expenses(
+                                    user_phone_number=message_data["user"].phone_number,
+                                    expenses=expense_items,
+                                    # A replayed delivery doesn't register them twice
+                                    idempotency_key=f"{message_data['message_id']}:expenses",
                                 )
                                 if expense_result.success:
                                     registration_results.append(
@@ -900,6 +854,7 @@ async def process_document_message(message: dict, message_data: dict):
                                 income_result = await main_api_service.register_incomes(
                                     user_phone_number=message_data["user"].phone_number,
                                     incomes=income_items,
+                                    idempotency_key=f"{message_data['message_id']}:incomes",
                                 )
                                 if income_result.success:
                                     registration_results.append(
@@ -1066,37 +1021,42 @@ async def download_media(media_id: str) -> bytes:
         HTTPException: If media download fails
     """
     try:
-        async with httpx.AsyncClient() as client:
-            headers = {
-                "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
-                "Accept": "*/*",  # Accept any content type
-            }
-
-            # First get the media URL
-            url_response = await client.get(
-                f"{settings.WHATSAPP_API_URL}/v19.0/{media_id}/",
-                headers=headers,
-                timeout=30.0,  # 30 seconds timeout
-            )
-            url_response.raise_for_status()
-            media_data = url_response.json()
-            media_url = media_data.get("url")
+        client = http_transport.get_client(http_transport.WHATSAPP)
+        headers = {
+            "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
+            "Accept": "*/*",  # Accept any content type
+        }
 
-            if not media_url:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Media URL not found for media ID: {media_id}",
-                )
+        # First get the media URL
+        url_response = await client.get(
+            f"{settings.WHATSAPP_API_URL}/v19.0/{media_id}/",
+            headers=headers,
+        )
+        url_response.raise_for_status()
+        media_data = url_response.json()
+        media_url = media_data.get("url")
 
-            # Then download the media
-            media_response = await client.get(
-                media_url,
-                headers=headers,
-                timeout=60.0,  # 60 seconds timeout for media download
+        if not media_url:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Media URL not found for media ID: {media_id}",
             )
-            media_response.raise_for_status()
 
-            return media_response.content
+        # Then download the media
+        media_response = await client.get(
+            media_url,
+            headers=headers,
+            # Large files need longer reads than the API calls on this client
+            timeout=httpx.Timeout(
+                connect=client.timeout.connect,
+                read=settings.HTTP_MEDIA_DOWNLOAD_TIMEOUT_SECONDS,
+                write=client.timeout.write,
+                pool=client.timeout.pool,
+            ),
+        )
+        media_response.raise_for_status()
+
+        return media_response.content
 
     except httpx.TimeoutException:
         raise HTTPException(
@@ -1252,26 +1212,14 @@ async def whatsapp_webhook(request: Request) -> Dict[str, Any]:
 
         # Create a hash of the webhook payload to detect duplicates
         webhook_hash = hashlib.sha256(raw_body).hexdigest()
-        current_time = datetime.now()
 
-        # Check for duplicate webhook requests
-        if webhook_hash in webhook_requests:
-            time_diff = (current_time - webhook_requests[webhook_hash]).total_seconds()
+        # Skip duplicate webhook requests seen within the dedupe window
+        # (redeliveries after the window could be legitimate retries)
+        if await webhook_request_dedupe.contains(webhook_hash):
             logger.warning(
-                f"🔄 WEBHOOK DUPLICATE: Same webhook received {time_diff:.2f}s ago. Hash: {webhook_hash[:16]}..."
+                f"⏭️ WEBHOOK DUPLICATE: Skipping recently seen webhook. Hash: {webhook_hash[:16]}..."
             )
-            # Still process if it's been more than 30 seconds (could be legitimate retry)
-            if time_diff < 30:
-                logger.warning(
-                    f"⏭️ WEBHOOK: Skipping duplicate webhook (too recent: {time_diff:.2f}s)"
-                )
-                return {"status": "duplicate_skipped"}
-
-        # Record this webhook request
-        webhook_requests[webhook_hash] = current_time
-        logger.info(
-            f"📝 WEBHOOK: Recorded webhook hash: {webhook_hash[:16]}... Total tracked: {len(webhook_requests)}"
-        )
+            return {"status": "duplicate_skipped"}
 
         if (
             body.get("entry")
@@ -1299,9 +1247,22 @@ async def whatsapp_webhook(request: Request) -> Dict[str, Any]:
             message_ids = [msg.get("id", "unknown") for msg in messages]
             logger.info(f"📨 WEBHOOK: Processing message IDs: {message_ids}")
 
-            # Return 200 OK immediately to WhatsApp to prevent timeout retries
-            # Process messages asynchronously in the background
-            asyncio.create_task(process_webhook_messages(body, user_phone or "unknown"))
+            # Persist the delivery to the durable ingress queue before ACKing so
+            # it survives restarts; the queue workers process it in the background
+            try:
+                job_id = await ingress_queue_service.enqueue(
+                    {"body": body, "user_phone": user_phone or "unknown"}
+                )
+            except IngressQueueFullError as e:
+                # Backpressure: let Meta redeliver later instead of growing unbounded
+                logger.warning(f"🚦 WEBHOOK: {str(e)}, asking WhatsApp to retry")
+                return JSONResponse(status_code=503, content={"status": "queue_full"})
+
+            # Record this webhook request only once it has been durably accepted
+            await webhook_request_dedupe.add(webhook_hash)
+            logger.info(
+                f"📝 WEBHOOK: Enqueued ingress job {job_id}, recorded webhook hash: {webhook_hash[:16]}..."
+            )
 
             response_time = (
                 datetime.now() - webhook_received_at
@@ -1330,21 +1291,60 @@ async def whatsapp_webhook(request: Request) -> Dict[str, Any]:
         return {"status": "error"}
 
 
-async def process_webhook_messages(body: dict, user_phone: str | None = None):
-    """Process WhatsApp webhook messages asynchronously"""
-    try:
-        # Start cleanup task on first webhook processing
-        global cleanup_task_started
-        if not cleanup_task_started:
-            asyncio.create_task(cleanup_processed_messages())
-            cleanup_task_started = True
+async def handle_ingress_job(job: IngressJob):
+    """
+    Ingress queue handler for a single webhook delivery.
+
+    Returns an awaitable that resolves once every batch containing one of the
+    delivery's messages has been processed, so the job is only acknowledged
+    after the user got their reply. It raises if any of those batches failed,
+    and the queue retries the delivery.
+    """
+    completions = await process_webhook_messages(
+        job.payload["body"],
+        job.payload.get("user_phone"),
+        redelivered=job.is_redelivery,
+    )
+    if not completions:
+        return None
+    return wait_for_batches(completions)
+
+
+async def wait_for_batches(completions: list[asyncio.Future]):
+    """Wait for every completion, then raise the first batch failure if any"""
+    results = await asyncio.gather(*completions, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def process_webhook_messages(
+    body: dict, user_phone: str | None = None, redelivered: bool = False
+) -> list[asyncio.Future]:
+    """Process WhatsApp webhook messages asynchronously
+
+    Args:
+        body: The webhook payload
+        user_phone: Sender of the first message, for error reporting
+        redelivered: True when the ingress queue replays a delivery that was not
+            acknowledged. Its message IDs are already marked as seen, so only
+            the messages whose batch didn't complete are processed again
+
+    Returns:
+        Completion futures of the messages that were added to a user batch
 
+    Raises:
+        Whatever failed, so the ingress queue retries the delivery
+    """
+    completions: list[asyncio.Future] = []
+    pending_by_user: dict[str, list[asyncio.Task]] = {}
+    try:
         logger.info(f"🔄 Starting webhook processing for user: {user_phone}")
 
         # Verify that this is a WhatsApp Business Account webhook
         if body.get("object") != "whatsapp_business_account":
             logger.warning("❌ Invalid webhook object type")
-            return
+            return completions
 
         # Process each entry in the webhook
         for entry in body.get("entry", []):
@@ -1368,7 +1368,7 @@ async def process_webhook_messages(body: dict, user_phone: str | None = None):
                     )
                     continue
 
-                # Process each message
+                # Collect each new message (deduplication happens in arrival order)
                 messages = value.get("messages", [])
                 logger.info(f"📨 Found {len(messages)} messages to process")
 
@@ -1382,20 +1382,40 @@ async def process_webhook_messages(body: dict, user_phone: str | None = None):
                     )
 
                     # Skip if message already processed (deduplication)
-                    if message_id in processed_messages:
+                    if redelivered:
+                        await processed_message_dedupe.add(message_id or "")
+                        is_duplicate = await completed_message_dedupe.contains(
+                            message_id or ""
+                        )
+                    else:
+                        is_duplicate = (
+                            not await processed_message_dedupe.check_and_mark(
+                                message_id or ""
+                            )
+                        )
+                    if is_duplicate:
                         logger.warning(
                             f"🔄 DUPLICATE DETECTED! Skipping message {message_id} - already processed"
                         )
                         continue
 
-                    # Mark message as processed with timestamp
-                    processed_messages[message_id] = datetime.now()
-                    logger.info(
-                        f"✅ Marked message {message_id} as processed. Total processed: {len(processed_messages)}"
+                    logger.info(f"✅ Marked message {message_id} as processed")
+                    pending_by_user.setdefault(str(message_from), []).append(
+                        asyncio.create_task(
+                            preprocess_with_limit(message, value, user_phone)
+                        )
                     )
 
-                    # Process the individual message
-                    await process_individual_message(message, value, user_phone)
+        # Preprocess every message concurrently; each user's messages are still
+        # handed to their conversation in the order they were sent
+        per_user_completions = await asyncio.gather(
+            *(
+                submit_in_order(preprocess_tasks)
+                for preprocess_tasks in pending_by_user.values()
+            )
+        )
+        for user_completions in per_user_completions:
+            completions.extend(user_completions)
 
     except Exception as e:
         logger.error(f"❌ Error processing webhook messages: {str(e)}")
@@ -1405,12 +1425,71 @@ async def process_webhook_messages(body: dict, user_phone: str | None = None):
             endpoint="webhooks.whatsapp.process_webhook_messages",
             message=f"Error processing webhook messages: {str(e)}",
         )
+        for preprocess_tasks in pending_by_user.values():
+            for task in preprocess_tasks:
+                task.cancel()
+        raise
+
+    return completions
+
+
+async def preprocess_with_limit(
+    message: dict, value: dict, user_phone: str | None = None
+) -> dict | None:
+    """Run process_individual_message under the global preprocessing limit"""
+    async with preprocess_semaphore:
+        started_at = time.monotonic()
+        message_data = await process_individual_message(message, value, user_phone)
+        metrics.observe(
+            "message_preprocess_seconds",
+            time.monotonic() - started_at,
+            {"type": str(message.get("type"))},
+        )
+        return message_data
+
+
+async def submit_in_order(preprocess_tasks: list[asyncio.Task]) -> list[asyncio.Future]:
+    """Submit one user's preprocessed messages to their conversation in order
+
+    Each message is submitted as soon as it and every earlier message from the
+    same user are ready.
+
+    Returns:
+        Completion futures resolved once the batch containing each message is
+        processed
+    """
+    completions: list[asyncio.Future] = []
+    for task in preprocess_tasks:
+        message_data = await task
+        if message_data is None or not message_data.get("from"):
+            continue
+
+        logger.info(
+            f"📦 Adding message {message_data['message_id']} to batch for user {message_data['from']}"
+        )
+        # The ingress queue acknowledges the delivery once this resolves
+        completion = asyncio.get_running_loop().create_future()
+        message_data["completion"] = completion
+        conversation_actor_service.submit(str(message_data["from"]), message_data)
+        completions.append(completion)
+    return completions
 
 
 async def process_individual_message(
     message: dict, value: dict, user_phone: str | None = None
-):
-    """Process an individual WhatsApp message and add it to the user's batch"""
+) -> dict | None:
+    """Preprocess an individual WhatsApp message for the user's batch
+
+    Media is only downloaded (and transcribed or annotated) once the user
+    upsert succeeded, so a delivery that fails the user check costs nothing
+    more. For active users the upsert is served from the user data cache.
+
+    Returns:
+        The preprocessed message data, or None if the message should be dropped
+
+    Raises:
+        If preprocessing failed, so the ingress queue retries the delivery
+    """
     try:
         message_type = message.get("type")
         message_id = message.get("id")
@@ -1427,6 +1506,10 @@ async def process_individual_message(
             "type": message_type,
         }
 
+        if not message_data["from"]:
+            logger.error(f"❌ No phone number found in message {message_id}")
+            return
+
         # Get user data
         try:
             logger.info(f"👤 Fetching user data for {message_from}")
@@ -1436,10 +1519,6 @@ async def process_individual_message(
                 contacts[0].get("profile", {}).get("name") if contacts else None
             )
 
-            if not message_data["from"]:
-                logger.error(f"❌ No phone number found in message {message_id}")
-                return
-
             user_response = await main_api_service.upsert_user(
                 str(message_data["from"]), contact_name=contact_name
             )
@@ -1447,15 +1526,8 @@ async def process_individual_message(
             logger.info(f"✅ User data fetched successfully for {message_from}")
         except Exception as e:
             logger.error(f"❌ Error fetching user data for {message_from}: {str(e)}")
-            await handle_error(
-                error=e,
-                user_id=user_phone,
-                endpoint="webhooks.whatsapp.upsert_user",
-                message=f"Error fetching user data for message: {message_data['message_id']}",
-            )
-            # Continue processing even if user fetch fails
-            message_data["user"] = None
-            return
+            # Reported below; the ingress queue retries the delivery
+            raise
 
         # Track analytics
         logger.info(f"📊 Tracking analytics for message {message_id}")
@@ -1493,12 +1565,7 @@ async def process_individual_message(
             logger.info(f"🎵 Processing audio message {message_id}")
             await process_audio_message(message, message_data)
 
-        # Add processed message to user's batch
-        if message_data.get("from"):
-            logger.info(
-                f"📦 Adding message {message_id} to batch for user {message_from}"
-            )
-            await add_message_to_batch(str(message_data["from"]), message_data)
+        return message_data
 
     except Exception as e:
         msg_id = message.get("id", "unknown") if "message" in locals() else "unknown"
@@ -1509,3 +1576,4 @@ async def process_individual_message(
             endpoint="webhooks.whatsapp.process_individual_message",
             message=f"Error processing individual message: {str(e)}",
         )
+        raise
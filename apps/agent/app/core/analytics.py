@@ -1,17 +1,257 @@
-from mixpanel import Mixpanel
+"""
+Non-blocking Mixpanel analytics.
+
+The Mixpanel SDK sends every event with a synchronous HTTP request. Here the
+client is wired to a queueing consumer instead: `mixpanel.track(...)` only
+serializes the event into a bounded in-memory buffer, and a background task
+flushes the buffer in batches through Mixpanel's `BufferedConsumer` in a
+worker thread. When the buffer is full, or Mixpanel rejects a batch, events
+are spilled to a local file (replayed on the next start) or dropped, and
+everything left is flushed on shutdown. Spill files are written by the
+flusher in a worker thread too, never by `track`.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import deque
 from functools import lru_cache
+from typing import Deque, List, Optional, Tuple
+
+from mixpanel import BufferedConsumer, Mixpanel, MixpanelException
+
 from app.core.config import get_settings
 
+logger = logging.getLogger(__name__)
+
+# (endpoint, serialized message) as produced by the Mixpanel client
+QueuedEvent = Tuple[str, str]
+
+
+class AnalyticsPipeline:
+    """Bounded event buffer with a background batch flusher."""
+
+    def __init__(
+        self,
+        buffer_size: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+        spill_path: Optional[str] = None,
+    ):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.spill_path = spill_path or None
+
+        self._buffer: Deque[QueuedEvent] = deque()
+        # Events that didn't fit in the buffer, waiting to be spilled
+        self._overflowed: Deque[QueuedEvent] = deque()
+        self._consumer = BufferedConsumer(max_size=batch_size)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    def enqueue(self, endpoint: str, message: str) -> None:
+        """Buffer a serialized event. Never blocks on the network."""
+        if len(self._buffer) >= self.buffer_size:
+            if self.spill_path is None or len(self._overflowed) >= self.buffer_size:
+                self._drop(1, "Buffer full")
+                return
+            self._overflowed.append((endpoint, message))
+            if self._wakeup is not None:
+                self._wakeup.set()
+            return
+
+        self._buffer.append((endpoint, message))
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _drop(self, count: int, reason: str) -> None:
+        self.dropped += count
+        logger.warning(
+            f"⚠️ ANALYTICS: {reason}, dropped {count} event(s) (total dropped: {self.dropped})"
+        )
+
+    async def _overflow(self, events: List[QueuedEvent], reason: str) -> None:
+        if self.spill_path is None:
+            self._drop(len(events), reason)
+            return
+        await asyncio.to_thread(self._spill, events)
+
+    def _spill(self, events: List[QueuedEvent]) -> None:
+        """Append events to the spill file. Runs in a worker thread."""
+        assert self.spill_path is not None
+        try:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                for endpoint, message in events:
+                    spill_file.write(
+                        json.dumps({"endpoint": endpoint, "message": message}) + "\n"
+                    )
+            self.spilled += len(events)
+        except OSError as e:
+            self.dropped += len(events)
+            logger.error(f"❌ ANALYTICS: Failed to spill events to disk: {str(e)}")
+
+    def _replay_spilled(self) -> List[QueuedEvent]:
+        """Read (and remove) events spilled by a previous run."""
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return []
+        replay_path = f"{self.spill_path}.replay"
+        os.replace(self.spill_path, replay_path)
+        events: List[QueuedEvent] = []
+        with open(replay_path, encoding="utf-8") as spill_file:
+            for line in spill_file:
+                try:
+                    item = json.loads(line)
+                    events.append((item["endpoint"], item["message"]))
+                except (ValueError, KeyError):
+                    continue
+        os.remove(replay_path)
+        return events
+
+    def _send(self, events: List[QueuedEvent]) -> List[QueuedEvent]:
+        """
+        Send events in batches of `batch_size` and return the ones that failed.
+
+        Runs in a worker thread, one call at a time (the consumer isn't
+        thread-safe).
+        """
+        failed: List[QueuedEvent] = []
+        for start in range(0, len(events), self.batch_size):
+            chunk = events[start : start + self.batch_size]
+            try:
+                for endpoint, message in chunk:
+                    self._consumer.send(endpoint, message)
+                self._consumer.flush()
+                self.sent += len(chunk)
+            except MixpanelException as e:
+                self.failed += len(chunk)
+                failed.extend(chunk)
+                logger.error(
+                    f"❌ ANALYTICS: Failed to send {len(chunk)} event(s) to Mixpanel: {str(e)}"
+                )
+                # Start over with a clean buffer instead of resending the failed batch
+                self._consumer = BufferedConsumer(max_size=self.batch_size)
+        return failed
+
+    def _take_batch(self) -> List[QueuedEvent]:
+        count = min(len(self._buffer), self.batch_size * 10)
+        return [self._buffer.popleft() for _ in range(count)]
+
+    async def _flush(self):
+        if self._overflowed:
+            overflowed = list(self._overflowed)
+            self._overflowed.clear()
+            await self._overflow(overflowed, "Buffer full")
+        while self._buffer:
+            failed = await asyncio.to_thread(self._send, self._take_batch())
+            if failed:
+                # Kept for the next start rather than retried against a failing API
+                await self._overflow(failed, "Mixpanel unavailable")
+
+    async def _flush_loop(self):
+        assert self._wakeup is not None
+        while not self._stopping:
+            try:
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=self.flush_interval_seconds
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self._flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ ANALYTICS: Flush loop error: {str(e)}")
+
+    async def start(self):
+        """Replay spilled events and start the background flusher."""
+        if self._flush_task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        try:
+            replayed = await asyncio.to_thread(self._replay_spilled)
+        except OSError as e:
+            replayed = []
+            logger.error(f"❌ ANALYTICS: Failed to replay spilled events: {str(e)}")
+        if replayed:
+            logger.info(f"♻️ ANALYTICS: Replaying {len(replayed)} spilled event(s)")
+            self._buffer.extendleft(reversed(replayed))
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info("📊 ANALYTICS: Background flusher started")
+
+    async def stop(self):
+        """Stop the flusher and send everything still buffered."""
+        if self._flush_task is not None:
+            # Let an in-flight send finish instead of racing it from another thread
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+
+        if self._buffer or self._overflowed:
+            logger.info(
+                f"📊 ANALYTICS: Flushing {len(self._buffer) + len(self._overflowed)} event(s) on shutdown"
+            )
+            await self._flush()
+
+    def get_stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "buffer_size": self.buffer_size,
+            "awaiting_spill": len(self._overflowed),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+        }
+
+
+class QueueingConsumer:
+    """Mixpanel consumer that hands messages to the analytics pipeline."""
+
+    def __init__(self, pipeline: AnalyticsPipeline):
+        self.pipeline = pipeline
+
+    def send(self, endpoint, json_message, api_key=None, api_secret=None):
+        self.pipeline.enqueue(endpoint, json_message)
+
+
+@lru_cache()
+def get_analytics_pipeline() -> AnalyticsPipeline:
+    settings = get_settings()
+    return AnalyticsPipeline(
+        buffer_size=settings.ANALYTICS_BUFFER_SIZE,
+        batch_size=settings.ANALYTICS_BATCH_SIZE,
+        flush_interval_seconds=settings.ANALYTICS_FLUSH_INTERVAL_SECONDS,
+        spill_path=settings.ANALYTICS_SPILL_PATH,
+    )
+
 
 @lru_cache()
 def get_mixpanel() -> Mixpanel:
     """
     Returns a singleton instance of Mixpanel client.
     Uses lru_cache to ensure only one instance is created.
+    Events are queued and sent in the background by the analytics pipeline.
     """
     settings = get_settings()
-    return Mixpanel(settings.MIXPANEL_TOKEN)
+    return Mixpanel(
+        settings.MIXPANEL_TOKEN, consumer=QueueingConsumer(get_analytics_pipeline())
+    )
 
 
-# Create a global instance that can be imported and used throughout the application
+# Create global instances that can be imported and used throughout the application
+analytics_pipeline = get_analytics_pipeline()
 mixpanel = get_mixpanel()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -39,6 +40,119 @@ class Settings(BaseSettings):
     # PostgreSQL Configuration for LangGraph
     CHAT_DATABASE_URL: str  # PostgreSQL connection string for conversation storage
 
+    # Durable ingress queue for WhatsApp webhooks (one queue file per process)
+    INGRESS_QUEUE_PATH: str = "data/ingress_queue.sqlite3"
+    INGRESS_QUEUE_WORKERS: int = 8  # Bounded worker pool size
+    INGRESS_QUEUE_MAX_DEPTH: int = 5000  # Reject (HTTP 503) above this depth
+    INGRESS_QUEUE_MAX_ATTEMPTS: int = 5  # Attempts before dead-lettering a job
+    # Jobs handed off but not yet acknowledged; workers stop claiming above this
+    INGRESS_QUEUE_MAX_AWAITING_COMPLETION: int = 500
+    # Lease before redelivery; renewed every third of it while a job is in progress
+    INGRESS_QUEUE_VISIBILITY_TIMEOUT_SECONDS: int = 120
+
+    # Deduplication of webhook deliveries and message IDs
+    DEDUPE_BACKEND: str = "memory"  # "memory" or "redis" (shared across replicas)
+    DEDUPE_MESSAGE_TTL_SECONDS: int = 7200
+    DEDUPE_MESSAGE_MAX_ENTRIES: int = 200000
+    DEDUPE_WEBHOOK_TTL_SECONDS: int = 30  # Redeliveries after this are processed
+    DEDUPE_WEBHOOK_MAX_ENTRIES: int = 20000
+
+    # Per-user conversation actors (message batching)
+    MESSAGE_DEBOUNCE_SECONDS: float = 5.0  # Window for users without history
+    MESSAGE_DEBOUNCE_MIN_SECONDS: float = 0.5  # Floor, e.g. a single complete text
+    MESSAGE_DEBOUNCE_MAX_SECONDS: float = 8.0  # Ceiling for any adaptive window
+    MESSAGE_DEBOUNCE_MEDIA_SECONDS: float = 6.0  # Albums and voice notes
+    CONVERSATION_ACTOR_IDLE_SECONDS: int = 300  # Evict actors idle this long
+    DEBOUNCE_GAP_STATS_MAX_USERS: int = 50000  # Typing patterns kept past eviction
+    MESSAGE_PREPROCESS_CONCURRENCY: int = 16  # Messages preprocessed in parallel
+
+    # Shared outbound HTTP clients
+    HTTP_ENABLE_HTTP2: bool = False  # Requires the optional 'h2' package
+    HTTP_MAX_CONNECTIONS: int = 50  # Per upstream
+    HTTP_WHATSAPP_TIMEOUT_SECONDS: float = 30.0
+    HTTP_MAIN_API_TIMEOUT_SECONDS: float = 30.0
+    HTTP_MEDIA_DOWNLOAD_TIMEOUT_SECONDS: float = 60.0  # Read timeout for media files
+
+    # Background Mixpanel analytics
+    ANALYTICS_BUFFER_SIZE: int = 10000  # Events held in memory before overflow
+    ANALYTICS_BATCH_SIZE: int = 50  # Events per Mixpanel request (API max: 50)
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: float = 2.0
+    ANALYTICS_SPILL_PATH: str = "data/analytics_spill.jsonl"  # Empty to drop
+
+    # Audio transcription (OpenAI)
+    TRANSCRIPTION_MAX_CONCURRENCY: int = 4  # Simultaneous uploads
+    TRANSCRIPTION_MAX_REQUESTS_PER_MINUTE: int = 500
+    TRANSCRIPTION_MAX_TOKENS_PER_MINUTE: int = 50000
+    TRANSCRIPTION_TIMEOUT_SECONDS: float = 60.0
+    TRANSCRIPTION_MAX_ATTEMPTS: int = 3
+
+    # Model input budget for long conversation threads
+    CONVERSATION_WINDOW_MAX_TOKENS: int = 12000
+    CONVERSATION_WINDOW_KEEP_TURNS: int = 6  # Recent turns sent verbatim
+    CONVERSATION_TOOL_OUTPUT_MAX_CHARS: int = 1500  # Older tool outputs are cut
+    CONVERSATION_SUMMARY_BATCH_TURNS: int = 10  # Old turns folded per summary
+    CONVERSATION_SUMMARY_MODEL: str = "gemini-2.5-flash-lite-preview-06-17"
+
+    # Gemini explicit context caching of the static agent instructions
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = False
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    GEMINI_CONTEXT_CACHE_RETRY_SECONDS: float = 300.0  # After a failed create
+
+    # Agent run retries (resumed from the last checkpoint when possible)
+    AGENT_RETRY_MAX_ATTEMPTS: int = 3
+    AGENT_RETRY_BASE_DELAY_SECONDS: float = 0.5  # Jittered, doubled per attempt
+    AGENT_RETRY_MAX_DELAY_SECONDS: float = 8.0
+
+    # Connection pool behind the LangGraph Postgres checkpointer
+    CHECKPOINT_POOL_MIN_SIZE: int = 2
+    CHECKPOINT_POOL_MAX_SIZE: int = 20
+    CHECKPOINT_POOL_TIMEOUT_SECONDS: float = 10.0  # Max wait for a free connection
+    CHECKPOINT_POOL_MAX_LIFETIME_SECONDS: float = 1800.0  # Connections are recycled
+    CHECKPOINT_POOL_MAX_IDLE_SECONDS: float = 300.0  # Idle extras above min are closed
+    # Executions before a query is server-prepared; None disables prepared
+    # statements (needed behind PgBouncer in transaction mode)
+    CHECKPOINT_DB_PREPARE_THRESHOLD: Optional[int] = 5
+
+    # Checkpoint blob serialization ("zstd" or "jsonplus")
+    CHECKPOINT_SERIALIZER: str = "zstd"
+    CHECKPOINT_COMPRESSION_THRESHOLD_BYTES: int = 1024  # Smaller blobs stay raw
+    CHECKPOINT_COMPRESSION_LEVEL: int = 3
+    CHECKPOINT_ZSTD_DICTIONARY_PATH: str = ""  # Trained dictionary, optional
+
+    # Checkpoint retention: idle threads are deleted, others keep recent history
+    CHECKPOINT_RETENTION_DAYS: int = 30
+    CHECKPOINT_HISTORY_KEEP: int = 10  # Latest checkpoints kept per thread namespace
+    CHECKPOINT_CLEANUP_INTERVAL_SECONDS: float = 6 * 3600
+    CHECKPOINT_CLEANUP_ACTIVE_GRACE_SECONDS: float = (
+        900  # Recently active threads are skipped
+    )
+    CHECKPOINT_CLEANUP_BATCH_SIZE: int = 200  # Threads per delete transaction
+    CHECKPOINT_CLEANUP_MAX_BATCHES: int = 500  # Per run, per phase
+    CHECKPOINT_CLEANUP_LOCK_TIMEOUT_MS: int = 2000
+    # Storage stats (thread sizes, table growth) are recomputed at most this often
+    CHECKPOINT_STATS_CACHE_SECONDS: float = 300.0
+    CHECKPOINT_STATS_TOP_THREADS: int = 10
+
+    # When checkpoints are written: "step" (every super-step), "exit" (end of
+    # turn) or "async" (end of turn, in the background after the reply)
+    CHECKPOINT_DURABILITY: str = "step"
+
+    # In-process cache of the latest checkpoint of active threads: "memory" or
+    # "none". Cached copies are checked against the thread's head in Postgres
+    CHECKPOINT_CACHE_BACKEND: str = "memory"
+    CHECKPOINT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CHECKPOINT_CACHE_TTL_SECONDS: int = 1800
+
+    # Per-user cache of upsert-user responses; entries older than the TTL are
+    # revalidated with the main API instead of being served
+    USER_DATA_CACHE_TTL_SECONDS: float = 60.0  # 0 disables the cache
+    USER_DATA_CACHE_MAX_ENTRIES: int = 10000
+
+    # Per-user cache of main API read tools (spending, income, balances,
+    # budgets, savings), dropped whenever one of the user's writes succeeds
+    MAIN_API_READ_CACHE_TTL_SECONDS: float = 120.0  # 0 disables the cache
+    MAIN_API_READ_CACHE_MAX_USERS: int = 10000
+
     # LangSmith Configuration
     LANGSMITH_TRACING: bool = False
     LANGSMITH_API_KEY: str = ""
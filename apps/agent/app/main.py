@@ -1,8 +1,19 @@
 # To update requirements: pip freeze > requirements.txt
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.core.analytics import analytics_pipeline
 from app.core.config import get_settings
-from app.api.v1.endpoints import webhooks
+from app.api.v1.endpoints import internal, webhooks
+from app.services.apolo_langgraph_service import apolo_langgraph_service
+from app.services.conversation_actor_service import conversation_actor_service
+from app.services.gemini_cache_service import gemini_context_cache
+from app.services.http_transport_service import http_transport
+from app.services.ingress_queue_service import ingress_queue_service
+from app.services.lukai_free_langgraph_service import lukai_free_langgraph_service
+from app.services.postgres_checkpointer_service import (
+    cleanup_postgres_checkpointer_service,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -13,6 +24,8 @@ logging.basicConfig(
     ],
 )
 
+logger = logging.getLogger(__name__)
+
 # Initialize settings
 settings = get_settings()
 
@@ -30,6 +43,40 @@ if not settings.MISTRAL_API_KEY:
         "Please set it in your .env file or environment variables."
     )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_transport.start()
+    await analytics_pipeline.start()
+    # Compile the agent graphs once, before the first message needs them
+    try:
+        await apolo_langgraph_service.warm_up()
+        await lukai_free_langgraph_service.warm_up()
+    except Exception as e:
+        logger.error(
+            f"❌ Failed to warm up agent graphs, compiling on demand: {str(e)}"
+        )
+    conversation_actor_service.start(
+        webhooks.process_user_message_batch,
+        prefetcher=webhooks.prefetch_user_conversation,
+    )
+    # Drain durable webhook jobs (including any left over from a previous run)
+    await ingress_queue_service.start(
+        webhooks.handle_ingress_job,
+        on_dead_letter=webhooks.notify_dead_lettered_job,
+    )
+    try:
+        yield
+    finally:
+        await ingress_queue_service.stop()
+        await conversation_actor_service.stop()
+        await cleanup_postgres_checkpointer_service()
+        if gemini_context_cache is not None:
+            await gemini_context_cache.close()
+        await analytics_pipeline.stop()
+        await http_transport.close()
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -37,12 +84,16 @@ app = FastAPI(
     description="LukAI Python Agent Service - AI-powered scheduling and automation",
     docs_url=settings.DOCS_URL,
     redoc_url=settings.REDOC_URL,
+    lifespan=lifespan,
 )
 
 # Include routers
 app.include_router(
     webhooks.router, prefix=f"{settings.API_V1_STR}/webhooks", tags=["webhooks"]
 )
+app.include_router(
+    internal.router, prefix=f"{settings.API_V1_STR}/internal", tags=["internal"]
+)
 
 if __name__ == "__main__":
     import uvicorn
@@ -7,9 +7,9 @@ from app.services.main_api_service import UserData
 class ApoloFreeTrialPromptFormatter(ApoloPromptFormatter):
     @classmethod
     def format_spanish_agent_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-
-        return f"""{RECOMMENDED_PROMPT_PREFIX}
+        template = (
+            RECOMMENDED_PROMPT_PREFIX
+            + """
 Identidad:
 Eres Apolo, asistente de finanzas personales diseñado para ayudar a los usuarios a gestionar su dinero de manera eficiente y sin complicaciones. Estás interactuando con un usuario en período de prueba gratuita.
 
@@ -83,14 +83,15 @@ Información sobre la suscripción:
 • El usuario puede cancelarla en cualquier momento desde su cuenta.
 • Seguridad de pago: los pagos se procesan a través de Lemon Squeezy, plataforma que utiliza la infraestructura de Stripe, una de las más seguras y confiables del mundo. Esto garantiza transacciones cifradas, seguras y conformes al estándar PCI DSS Nivel 1.
 
-{user_context}
 """
+        )
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_english_agent_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-
-        return f"""{RECOMMENDED_PROMPT_PREFIX}
+        template = (
+            RECOMMENDED_PROMPT_PREFIX
+            + """
 Identity:
 You are Apolo, a personal finance assistant designed to help users manage their money efficiently and hassle-free. You are interacting with a user in their free trial period.
 
@@ -167,14 +168,15 @@ Information about the subscription:
 • The user can cancel it at any time from their account.
 • Payment security: the payments are processed through Lemon Squeezy, a platform that uses the Stripe infrastructure, one of the most secure and reliable payment processors in the world. This ensures encrypted transactions, secure and compliant with the PCI DSS Level 1 standard.
 
-{user_context}
 """
+        )
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_multilingual_agent_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-
-        return f"""{RECOMMENDED_PROMPT_PREFIX}
+        template = (
+            RECOMMENDED_PROMPT_PREFIX
+            + """
 Identity:
 You are Apolo, a personal finance assistant designed to help users manage their money efficiently and hassle-free. You can help the user in any language depending on the user's message language. You are interacting with a user in their free trial period.
 
@@ -252,5 +254,6 @@ Information about the subscription:
 • The user can cancel it at any time from their account.
 • Payment security: the payments are processed through Lemon Squeezy, a platform that uses the Stripe infrastructure, one of the most secure and reliable payment processors in the world. This ensures encrypted transactions, secure and compliant with the PCI DSS Level 1 standard.
 
-{user_context}
 """
+        )
+        return cls._render_prompt(template, user)
@@ -1,8 +1,10 @@
-from typing import List, Dict, Any, Annotated, Optional
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, Annotated, Callable, Optional
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.tools import tool
-from langchain_core.messages import BaseMessage
+from langchain_core.tools import BaseTool, tool
+from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.prebuilt import create_react_agent, InjectedState
 from langgraph.graph import StateGraph, START
@@ -11,6 +13,8 @@ from langgraph.types import Command
 from langchain_core.tools import InjectedToolCallId
 from app.core.config import get_settings
 
+from app.services.conversation_window import create_conversation_window
+from app.services.gemini_cache_service import create_chat_model
 from app.services.main_api_service import UserData
 from app.services.prompt_formatter import ApoloPromptFormatter
 from app.services.postgres_checkpointer_service import get_postgres_checkpointer_service
@@ -18,6 +22,8 @@ from app.services.postgres_checkpointer_service import get_postgres_checkpointer
 # Import our native LangGraph tools (much simpler!)
 from app.services.apolo_langgraph_tools import (
     ApoloState,
+    state_prompt,
+    user_config,
     # Expense tools
     register_expenses_tool,
     create_expense_category_tool,
@@ -47,6 +53,11 @@ from app.services.apolo_langgraph_tools import (
     create_transaction_tags_tool,
 )
 
+logger = logging.getLogger(__name__)
+
+# Main agent prompt variants, one compiled graph each
+LANGUAGE_VARIANTS = ("es", "en", "multilingual")
+
 
 def create_handoff_tool(*, agent_name: str, description: str | None = None):
     """Create a handoff tool for transferring control between agents"""
@@ -69,6 +80,9 @@ def create_handoff_tool(*, agent_name: str, description: str | None = None):
             update={
                 "messages": state["messages"] + [tool_message],
                 "last_active_agent": agent_name,
+                # Carry over summary updates made by this agent's window
+                "conversation_summary": state.get("conversation_summary", ""),
+                "summarized_through": state.get("summarized_through", ""),
             },
             graph=Command.PARENT,
         )
@@ -84,7 +98,8 @@ class ApoloLangGraphService:
         settings = get_settings()
 
         self.prompt_formatter = ApoloPromptFormatter()
-        self.model = ChatGoogleGenerativeAI(
+        self.model = create_chat_model(
+            "apolo",
             model="gemini-2.5-flash",
             temperature=0,
             api_key=settings.GOOGLE_API_KEY,
@@ -93,6 +108,12 @@ class ApoloLangGraphService:
         # Initialize PostgreSQL checkpointer (persistent and reliable)
         self.checkpointer = None  # Will be initialized lazily
 
+        # Compiled graphs keyed by main agent language. Prompts are rendered at
+        # run time from the user in the run config (see `user_config`), so
+        # graphs are shared by users.
+        self._graphs: Dict[str, CompiledStateGraph] = {}
+        self._graphs_lock = asyncio.Lock()
+
         # Native LangGraph tools (much simpler and more reliable!)
         self.tools = {
             # Support tools
@@ -123,6 +144,13 @@ class ApoloLangGraphService:
             # Transaction tools
             "create_transaction_tags": create_transaction_tags_tool,
         }
+        self.handoff_tools = self._create_handoff_tools()
+
+        # Token budget for the model input of every agent
+        self.conversation_window = create_conversation_window("apolo")
+
+        # Only "step" durability persists the intermediate super-steps of a turn
+        self.checkpoint_during = settings.CHECKPOINT_DURABILITY == "step"
 
     async def _get_checkpointer(self):
         """Get the PostgreSQL checkpointer (async initialization)"""
@@ -131,7 +159,7 @@ class ApoloLangGraphService:
             self.checkpointer = await postgres_service.get_checkpointer()
         return self.checkpointer
 
-    def _create_handoff_tools(self):
+    def _create_handoff_tools(self) -> Dict[str, BaseTool]:
         """Create handoff tools for agent communication"""
         return {
             "transfer_to_income_agent": create_handoff_tool(
@@ -156,11 +184,24 @@ class ApoloLangGraphService:
             ),
         }
 
-    async def create_agents_graph(self, user: UserData) -> CompiledStateGraph:
+    @staticmethod
+    def _language_key(user: UserData) -> str:
+        """Language variant of the main agent prompt for a user"""
+        if user.favorite_language in ("es", "en"):
+            return user.favorite_language
+        return "multilingual"
+
+    def _main_agent_prompt_formatter(self, language: str) -> Callable[[UserData], str]:
+        if language == "es":
+            return self.prompt_formatter.format_spanish_accounting_agent_prompt
+        if language == "en":
+            return self.prompt_formatter.format_english_accounting_agent_prompt
+        return self.prompt_formatter.format_multilingual_accounting_agent_prompt
+
+    async def create_agents_graph(self, language: str) -> CompiledStateGraph:
         """Create the multi-agent graph with handoff capabilities"""
 
-        # Get handoff tools
-        handoff_tools = self._create_handoff_tools()
+        handoff_tools = self.handoff_tools
 
         # Create specialized agents
         income_agent = create_react_agent(
@@ -173,7 +214,11 @@ class ApoloLangGraphService:
                 self.tools["create_financial_account"],
                 handoff_tools["transfer_to_main_agent"],
             ],
-            prompt=self.prompt_formatter.format_income_agent_prompt(user),
+            pre_model_hook=self.conversation_window.apply,
+            prompt=state_prompt(
+                self.prompt_formatter.format_income_agent_prompt,
+                self.conversation_window,
+            ),
             state_schema=ApoloState,
         )
 
@@ -187,7 +232,11 @@ class ApoloLangGraphService:
                 self.tools["create_financial_account"],
                 handoff_tools["transfer_to_main_agent"],
             ],
-            prompt=self.prompt_formatter.format_expense_agent_prompt(user),
+            pre_model_hook=self.conversation_window.apply,
+            prompt=state_prompt(
+                self.prompt_formatter.format_expense_agent_prompt,
+                self.conversation_window,
+            ),
             state_schema=ApoloState,
         )
 
@@ -201,7 +250,11 @@ class ApoloLangGraphService:
                 self.tools["find_transfers"],
                 handoff_tools["transfer_to_main_agent"],
             ],
-            prompt=self.prompt_formatter.format_accounts_agent_prompt(user),
+            pre_model_hook=self.conversation_window.apply,
+            prompt=state_prompt(
+                self.prompt_formatter.format_accounts_agent_prompt,
+                self.conversation_window,
+            ),
             state_schema=ApoloState,
         )
 
@@ -215,23 +268,15 @@ class ApoloLangGraphService:
                 self.tools["get_savings"],
                 handoff_tools["transfer_to_main_agent"],
             ],
-            prompt=self.prompt_formatter.format_budget_agent_prompt(user),
+            pre_model_hook=self.conversation_window.apply,
+            prompt=state_prompt(
+                self.prompt_formatter.format_budget_agent_prompt,
+                self.conversation_window,
+            ),
             state_schema=ApoloState,
         )
 
         # Main coordination agent
-        main_agent_prompt = (
-            self.prompt_formatter.format_spanish_accounting_agent_prompt(user)
-            if user.favorite_language == "es"
-            else (
-                self.prompt_formatter.format_english_accounting_agent_prompt(user)
-                if user.favorite_language == "en"
-                else self.prompt_formatter.format_multilingual_accounting_agent_prompt(
-                    user
-                )
-            )
-        )
-
         main_agent = create_react_agent(
             self.model,
             tools=[
@@ -243,7 +288,10 @@ class ApoloLangGraphService:
                 handoff_tools["transfer_to_accounts_agent"],
                 handoff_tools["transfer_to_budget_agent"],
             ],
-            prompt=main_agent_prompt,
+            pre_model_hook=self.conversation_window.apply,
+            prompt=state_prompt(
+                self._main_agent_prompt_formatter(language), self.conversation_window
+            ),
             state_schema=ApoloState,
         )
 
@@ -266,29 +314,59 @@ class ApoloLangGraphService:
         # Compile with checkpointer for session persistence
         return graph.compile(checkpointer=checkpointer)
 
+    async def get_agents_graph(self, language: str) -> CompiledStateGraph:
+        """Return the compiled graph for a language variant, building it once"""
+        graph = self._graphs.get(language)
+        if graph is not None:
+            return graph
+
+        async with self._graphs_lock:
+            graph = self._graphs.get(language)
+            if graph is None:
+                started_at = time.monotonic()
+                graph = self._graphs[language] = await self.create_agents_graph(
+                    language
+                )
+                logger.info(
+                    f"🧩 Compiled Apolo agents graph for language '{language}' in {time.monotonic() - started_at:.2f}s"
+                )
+        return graph
+
+    async def warm_up(self):
+        """Compile every graph variant up front so no message pays for it"""
+        for language in LANGUAGE_VARIANTS:
+            await self.get_agents_graph(language)
+
+    async def prefetch_conversation(
+        self, user_data: UserData, thread_id: Optional[str] = None
+    ):
+        """Warm the checkpointer, compiled graph and latest checkpoint for a thread"""
+        thread_id = thread_id or f"user_{user_data.phone_number}"
+        checkpointer = await self._get_checkpointer()
+        checkpointer.prefetch(thread_id)
+        await self.get_agents_graph(self._language_key(user_data))
+
     async def process_query(
         self, query: str, user_data: UserData, thread_id: Optional[str] = None
     ) -> str:
         """Process a single query using the LangGraph multi-agent system"""
 
-        # Create the graph for this user
-        graph = await self.create_agents_graph(user_data)
+        graph = await self.get_agents_graph(self._language_key(user_data))
 
         # Prepare initial state
         initial_state = {
             "messages": [{"role": "user", "content": query}],
-            "user_data": user_data,
             "last_active_agent": "main_agent",
             "remaining_steps": 25,
         }
 
-        # Configuration for checkpointing
-        config: RunnableConfig = {
-            "configurable": {"thread_id": thread_id or f"user_{user_data.phone_number}"}
-        }
+        # Configuration for checkpointing; the user travels with the run, not the state
+        config = user_config(thread_id or f"user_{user_data.phone_number}", user_data)
 
         # Invoke the graph
-        result = await graph.ainvoke(initial_state, config=config)
+        result = await graph.ainvoke(
+            initial_state, config=config, checkpoint_during=self.checkpoint_during
+        )
 
         # Return the final message content
         if result["messages"]:
@@ -304,8 +382,13 @@ class ApoloLangGraphService:
         current_message: str,
         user_data: UserData,
         thread_id: Optional[str] = None,
+        resume: bool = False,
     ) -> str:
-        """Process a new message using the LangGraph multi-agent system with automatic conversation memory"""
+        """Process a new message using the LangGraph multi-agent system with automatic conversation memory
+
+        With `resume=True` the message is not sent again: the graph continues
+        the thread's interrupted run from its last checkpoint (see `can_resume`).
+        """
         import logging
 
         logger = logging.getLogger(__name__)
@@ -314,30 +397,35 @@ class ApoloLangGraphService:
             f"🚀 Starting LangGraph conversation processing for user {user_data.phone_number}"
         )
 
-        # Create the graph for this user
-        graph = await self.create_agents_graph(user_data)
-        logger.info(f"📊 Graph created successfully with {len(self.tools)} tools")
+        thread_id = thread_id or f"user_{user_data.phone_number}"
+
+        graph = await self.get_agents_graph(self._language_key(user_data))
+        logger.info(f"📊 Graph ready with {len(self.tools)} tools")
 
         # Prepare initial state with only the new message
         # LangGraph will automatically load previous conversation state via thread_id
         initial_state = {
             "messages": [{"role": "user", "content": current_message}],
-            "user_data": user_data,
             "last_active_agent": "main_agent",
             "remaining_steps": 25,
         }
 
-        # Configuration for checkpointing - this is where LangGraph manages conversation memory
-        config: RunnableConfig = {
-            "configurable": {"thread_id": thread_id or f"user_{user_data.phone_number}"}
-        }
+        # Configuration for checkpointing - this is where LangGraph manages conversation memory.
+        # The user is a per-run input, so checkpoints only hold conversation data
+        config = user_config(thread_id, user_data)
 
         logger.info(
             f"📤 Invoking graph with new message for thread {config['configurable']['thread_id']}"
         )
 
         # Invoke the graph - LangGraph automatically handles conversation continuity
-        result = await graph.ainvoke(initial_state, config=config)
+        if resume:
+            logger.info(f"⏯️ Resuming interrupted run for thread {thread_id}")
+        result = await graph.ainvoke(
+            None if resume else initial_state,
+            config=config,
+            checkpoint_during=self.checkpoint_during,
+        )
 
         logger.info(
             f"📥 Graph execution completed. Result messages: {len(result.get('messages', []))}"
@@ -361,23 +449,47 @@ class ApoloLangGraphService:
 
         return "I apologize, but I couldn't process your request. Please try again."
 
+    async def can_resume(
+        self, current_message: str, user_data: UserData, thread_id: Optional[str] = None
+    ) -> bool:
+        """Whether the thread's last run stopped before answering `current_message`, so it can be resumed."""
+        graph = await self.get_agents_graph(self._language_key(user_data))
+        config: RunnableConfig = {
+            "configurable": {"thread_id": thread_id or f"user_{user_data.phone_number}"}
+        }
+        snapshot = await graph.aget_state(config)
+        if not snapshot.next:
+            return False
+        # Only resume the run started for this message, never an older one
+        user_messages = [
+            m
+            for m in snapshot.values.get("messages", [])
+            if isinstance(m, HumanMessage)
+        ]
+        return bool(user_messages) and user_messages[-1].content == current_message
+
     async def get_conversation_history(self, thread_id: str) -> List[BaseMessage]:
-        """Get conversation history for a specific thread"""
+        """Get the full message history of a thread, oldest first"""
         try:
-            # For now, return empty list since LangGraph manages this internally
-            # This method can be enhanced later if needed for debugging/audit purposes
-            return []
-        except Exception:
-            pass
+            postgres_service = await get_postgres_checkpointer_service()
+            history = await postgres_service.get_thread_messages(thread_id)
+            logger.info(
+                f"📋 Loaded {history['total']} messages of conversation history for thread {thread_id}"
+            )
+            return history["messages"]
+        except Exception as e:
+            logger.error(f"❌ Error getting conversation history: {str(e)}")
         return []
 
     async def clear_conversation_history(self, thread_id: str) -> bool:
-        """Clear conversation history for a specific thread"""
+        """Permanently delete a thread's checkpoints, blobs and pending writes"""
         try:
-            # Use checkpointer's delete functionality if available
-            # For now, we'll rely on Redis TTL for cleanup
+            postgres_service = await get_postgres_checkpointer_service()
+            await postgres_service.delete_threads([thread_id])
+            logger.info(f"🗑️ Cleared conversation history for thread {thread_id}")
             return True
         except Exception as e:
+            logger.error(f"❌ Error clearing conversation history: {str(e)}")
             return False
 
 
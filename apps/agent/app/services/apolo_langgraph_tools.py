@@ -4,10 +4,12 @@ These tools directly call main_api_service without complex adapters.
 """
 
 import logging
-from typing import List, Annotated
-from langchain_core.tools import tool
-from langgraph.prebuilt import InjectedState
+from typing import Callable, List, Annotated, NotRequired, Optional
+from langchain_core.messages import AnyMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import InjectedToolCallId, tool
 
+from app.services.conversation_window import ConversationWindow
 from app.services.main_api_service import (
     main_api_service,
     UserData,
@@ -36,12 +38,56 @@ from langgraph.graph.message import MessagesState
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Key of the run's UserData in config["configurable"]
+USER_DATA_CONFIG_KEY = "user_data"
+
 
 # Define ApoloState here to avoid circular imports
 class ApoloState(MessagesState):
-    user_data: UserData
+    # The user is passed per run in the config (see `user_config`), not kept in
+    # state, so it isn't written to every checkpoint
     last_active_agent: str
     remaining_steps: int = 25
+    # Rolling summary of the turns that no longer fit the model input window
+    conversation_summary: NotRequired[str]
+    # ID of the last message folded into the summary
+    summarized_through: NotRequired[str]
+
+
+def user_config(thread_id: str, user_data: UserData) -> RunnableConfig:
+    """Run config for a thread, carrying the user as a non-persisted input."""
+    return {"configurable": {"thread_id": thread_id, USER_DATA_CONFIG_KEY: user_data}}
+
+
+def get_user_data(config: RunnableConfig) -> UserData:
+    """The user of the current run, as passed by `user_config`."""
+    user_data = config.get("configurable", {}).get(USER_DATA_CONFIG_KEY)
+    if user_data is None:
+        raise ValueError("Run config has no user data")
+    return user_data
+
+
+def state_prompt(
+    format_prompt: Callable[[UserData], str],
+    window: Optional[ConversationWindow] = None,
+):
+    """
+    Agent prompt rendered from the run's user on every model call.
+
+    Compiled graphs are shared by all users, so nothing user-specific can be
+    baked in at compile time. With a `window`, only its selection of the
+    conversation is sent.
+    """
+
+    def prompt(state: ApoloState, config: RunnableConfig) -> List[AnyMessage]:
+        system_prompt = format_prompt(get_user_data(config))
+        summary = state.get("conversation_summary")
+        if summary:
+            system_prompt += f"\nSummary of the earlier conversation:\n{summary}\n"
+        messages = window.window(state) if window is not None else state["messages"]
+        return [SystemMessage(content=system_prompt)] + messages
+
+    return prompt
 
 
 # ============================================================================
@@ -51,7 +97,9 @@ class ApoloState(MessagesState):
 
 @tool
 async def register_expenses_tool(
-    state: Annotated[ApoloState, InjectedState], expenses: List[dict]
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
+    expenses: List[dict],
 ) -> str:
     """Register user expenses and update account balances.
 
@@ -84,8 +132,9 @@ async def register_expenses_tool(
 
         # Call the main API service
         response = await main_api_service.register_expenses(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             expenses=expense_items,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -95,7 +144,8 @@ async def register_expenses_tool(
 
 @tool
 async def create_expense_category_tool(
-    state: Annotated[ApoloState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
     name: str,
     key: str,
     description: str = None,
@@ -115,8 +165,9 @@ async def create_expense_category_tool(
         )
 
         response = await main_api_service.create_expense_category(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             category=category,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -126,7 +177,7 @@ async def create_expense_category_tool(
 
 @tool
 async def get_spending_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     currency_code: str,
     date_from: str,
     date_to: str,
@@ -149,7 +200,7 @@ async def get_spending_tool(
         )
 
         response = await main_api_service.get_spending(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -160,7 +211,7 @@ async def get_spending_tool(
 
 @tool
 async def find_spendings_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     currency_code: str,
     date_from: str,
     date_to: str,
@@ -192,7 +243,7 @@ async def find_spendings_tool(
         )
 
         response = await main_api_service.find_spendings(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -208,7 +259,9 @@ async def find_spendings_tool(
 
 @tool
 async def register_incomes_tool(
-    state: Annotated[ApoloState, InjectedState], incomes: List[dict]
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
+    incomes: List[dict],
 ) -> str:
     """Register user incomes and update account balances.
 
@@ -239,8 +292,9 @@ async def register_incomes_tool(
 
         # Call the main API service
         response = await main_api_service.register_incomes(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             incomes=income_items,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -250,7 +304,8 @@ async def register_incomes_tool(
 
 @tool
 async def create_income_category_tool(
-    state: Annotated[ApoloState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
     name: str,
     key: str,
     description: str = None,
@@ -270,8 +325,9 @@ async def create_income_category_tool(
         )
 
         response = await main_api_service.create_income_category(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             category=category,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -281,7 +337,7 @@ async def create_income_category_tool(
 
 @tool
 async def get_income_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     currency_code: str,
     date_from: str,
     date_to: str,
@@ -304,7 +360,7 @@ async def get_income_tool(
         )
 
         response = await main_api_service.get_income(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -315,7 +371,7 @@ async def get_income_tool(
 
 @tool
 async def find_incomes_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     currency_code: str,
     date_from: str,
     date_to: str,
@@ -347,7 +403,7 @@ async def find_incomes_tool(
         )
 
         response = await main_api_service.find_incomes(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -363,7 +419,9 @@ async def find_incomes_tool(
 
 @tool
 async def call_customer_support_tool(
-    state: Annotated[ApoloState, InjectedState], context: str
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
+    context: str,
 ) -> str:
     """Call customer support for a given phone number with context.
 
@@ -372,8 +430,9 @@ async def call_customer_support_tool(
     """
     try:
         response = await main_api_service.call_customer_support(
-            phone_number=state["user_data"].phone_number,
+            phone_number=get_user_data(config).phone_number,
             context=context,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -383,12 +442,12 @@ async def call_customer_support_tool(
 
 @tool
 async def get_billing_portal_link_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
 ) -> str:
     """Get the customer billing portal link for managing their subscription."""
     try:
         response = await main_api_service.get_customer_billing_portal_link(
-            phone_number=state["user_data"].phone_number,
+            phone_number=get_user_data(config).phone_number,
         )
         return response.data.tool_response
 
@@ -403,7 +462,8 @@ async def get_billing_portal_link_tool(
 
 @tool
 async def create_financial_account_tool(
-    state: Annotated[ApoloState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
     account_type: str,  # "REGULAR", "SAVINGS", "DEBT"
     name: str,
     key: str,
@@ -432,8 +492,9 @@ async def create_financial_account_tool(
         )
 
         response = await main_api_service.create_financial_account(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             account=account,
+            idempotency_key=tool_call_id,
         )
 
         return response.data.tool_response
@@ -445,7 +506,7 @@ async def create_financial_account_tool(
             extra={
                 "error": str(e),
                 "account_type": account_type,
-                "user_phone": state["user_data"].phone_number,
+                "user_phone": get_user_data(config).phone_number,
             },
         )
         return f"Invalid account data: {str(e)}"
@@ -457,7 +518,7 @@ async def create_financial_account_tool(
             extra={
                 "error": str(e),
                 "error_type": type(e).__name__,
-                "user_phone": state["user_data"].phone_number,
+                "user_phone": get_user_data(config).phone_number,
             },
             exc_info=True,
         )  # This includes the traceback automatically
@@ -466,7 +527,7 @@ async def create_financial_account_tool(
 
 @tool
 async def get_account_balance_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     account_key: str,
 ) -> str:
     """Get the current balance of a financial account.
@@ -476,7 +537,7 @@ async def get_account_balance_tool(
     """
     try:
         response = await main_api_service.get_account_balance(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             account_key=account_key,
         )
         return response.data.tool_response
@@ -492,7 +553,8 @@ async def get_account_balance_tool(
 
 @tool
 async def set_budget_tool(
-    state: Annotated[ApoloState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
     amount: float,
     year: int,
     currency_code: str,
@@ -515,8 +577,9 @@ async def set_budget_tool(
         )
 
         response = await main_api_service.set_budget(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             budget=budget,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -526,7 +589,7 @@ async def set_budget_tool(
 
 @tool
 async def get_budget_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     year: int,
     month: int,
     currency_code: str,
@@ -546,7 +609,7 @@ async def get_budget_tool(
         )
 
         response = await main_api_service.get_budget(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -562,7 +625,9 @@ async def get_budget_tool(
 
 @tool
 async def transfer_money_between_accounts_tool(
-    state: Annotated[ApoloState, InjectedState], transfers: List[dict]
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
+    transfers: List[dict],
 ) -> str:
     """Transfer money between user's financial accounts.
 
@@ -588,8 +653,9 @@ async def transfer_money_between_accounts_tool(
             transfer_items.append(transfer_item)
 
         response = await main_api_service.transfer_money_between_accounts(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             transfers=transfer_items,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -599,7 +665,7 @@ async def transfer_money_between_accounts_tool(
 
 @tool
 async def get_transfers_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     date_from: str,
     date_to: str,
     from_account_key: str = None,
@@ -628,7 +694,7 @@ async def get_transfers_tool(
         )
 
         response = await main_api_service.get_transfers(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -639,7 +705,7 @@ async def get_transfers_tool(
 
 @tool
 async def find_transfers_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     date_from: str,
     date_to: str,
     from_account_key: str = None,
@@ -668,7 +734,7 @@ async def find_transfers_tool(
         )
 
         response = await main_api_service.find_transfers(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -684,7 +750,8 @@ async def find_transfers_tool(
 
 @tool
 async def set_expense_category_budget_tool(
-    state: Annotated[ApoloState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
     category_key: str,
     amount: float,
     year: int,
@@ -710,8 +777,9 @@ async def set_expense_category_budget_tool(
         )
 
         response = await main_api_service.set_expense_category_budget(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             budget=budget,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -721,7 +789,7 @@ async def set_expense_category_budget_tool(
 
 @tool
 async def get_budget_by_category_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     category_key: str,
     year: int,
     month: int,
@@ -744,7 +812,7 @@ async def get_budget_by_category_tool(
         )
 
         response = await main_api_service.get_budget_by_category(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -755,7 +823,7 @@ async def get_budget_by_category_tool(
 
 @tool
 async def get_savings_tool(
-    state: Annotated[ApoloState, InjectedState],
+    config: RunnableConfig,
     savings_accounts_keys: List[str],
 ) -> str:
     """Get the user's savings information from specified savings accounts.
@@ -769,7 +837,7 @@ async def get_savings_tool(
         )
 
         response = await main_api_service.get_savings(
-            user_phone_number=state["user_data"].phone_number,
+            user_phone_number=get_user_data(config).phone_number,
             params=params,
         )
         return response.data.tool_response
@@ -780,7 +848,8 @@ async def get_savings_tool(
 
 @tool
 async def create_transaction_tags_tool(
-    state: Annotated[ApoloState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
     tags: List[str],
 ) -> str:
     """Create new transaction tags for the user.
@@ -790,8 +859,9 @@ async def create_transaction_tags_tool(
     """
     try:
         response = await main_api_service.create_transaction_tags(
-            user_phone_number=state["user_data"].phone_number,
+            phone_number=get_user_data(config).phone_number,
             tags=tags,
+            idempotency_key=tool_call_id,
         )
         return response.data.tool_response
 
@@ -5,8 +5,7 @@ from app.services.main_api_service import UserData
 class ApoloSubscriptionPromptFormatter(ApoloPromptFormatter):
     @classmethod
     def format_expired_spanish_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-        return f"""Identidad:
+        template = """Identidad:
 Eres Apolo, asistente de finanzas personales. La suscripción del usuario ha expirado.
 
 Tono:
@@ -31,13 +30,12 @@ Beneficios de la suscripción:
 • Múltiples cuentas y monedas
 • Seguridad y privacidad con cifrado E2EE (solo tú puedes ver tus datos)
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_expired_english_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-        return f"""Identity:
+        template = """Identity:
 You are Apolo, a personal finance assistant. The user's subscription has expired.
 
 Tone:
@@ -62,13 +60,12 @@ Subscription Benefits:
 • Multiple accounts and currencies
 • Security and privacy with E2EE encryption (only you can see your data)
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_expired_multilingual_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-        return f"""Identity:
+        template = """Identity:
 You are Apolo, a personal finance assistant. The user's subscription has expired. Respond in the user's preferred language.
 
 Tone:
@@ -93,13 +90,12 @@ Subscription Benefits:
 • Multiple accounts and currencies
 • Security and privacy with E2EE encryption (only you can see your data)
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_trial_conversion_spanish_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-        return f"""Identidad:
+        template = """Identidad:
 Eres Apolo, asistente de finanzas personales. El usuario ha alcanzado el límite de gastos gratuitos.
 
 Tono:
@@ -130,13 +126,12 @@ Sin riesgo:
 • Cancela en cualquier momento
 • Mantén todos tus datos y progreso
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_trial_conversion_english_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-        return f"""Identity:
+        template = """Identity:
 You are Apolo, a personal finance assistant. The user has reached their free expense limit.
 
 Tone:
@@ -167,13 +162,12 @@ Risk-Free:
 • Cancel anytime
 • Keep all your data and progress
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_trial_conversion_multilingual_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-        return f"""Identity:
+        template = """Identity:
 You are Apolo, a personal finance assistant. The user has reached their free expense limit. Respond in the user's preferred language.
 
 Tone:
@@ -204,5 +198,5 @@ Risk-Free:
 • Cancel anytime
 • Keep all your data and progress
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
@@ -0,0 +1,339 @@
+"""
+Retention for the LangGraph checkpoint tables.
+
+Every super-step writes a checkpoint, so without pruning the `checkpoints`,
+`checkpoint_blobs` and `checkpoint_writes` tables grow with every turn of
+every conversation. `CheckpointRetention` keeps them bounded:
+
+- threads idle for longer than the retention period are deleted entirely,
+- other threads keep only their latest root checkpoints and the subgraph
+  checkpoints (namespaces like `agent:<task_id>`) that ran under one of
+  them, along with the pending writes of kept checkpoints and the blobs they
+  reference.
+
+Work is done in small batches, each in its own short transaction with a lock
+timeout, and threads active within a grace period are never touched, so
+cleanup doesn't hold up live conversations. Pruning walks the threads in
+keyset pages and picks up where the previous run stopped. The tables have no
+timestamp column; the checkpoint's own `ts` is used and indexed.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEXES_SQL = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS checkpoints_ts_idx ON checkpoints ((checkpoint ->> 'ts'))",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS checkpoints_thread_ts_idx ON checkpoints (thread_id, (checkpoint ->> 'ts'))",
+]
+
+SELECT_IDLE_THREADS_SQL = """
+SELECT DISTINCT c.thread_id FROM checkpoints c
+WHERE (c.checkpoint ->> 'ts') < %(cutoff)s
+  AND NOT EXISTS (
+    SELECT 1 FROM checkpoints n
+    WHERE n.thread_id = c.thread_id AND (n.checkpoint ->> 'ts') >= %(cutoff)s
+  )
+LIMIT %(limit)s
+"""
+
+# Re-checked inside the deleting transaction in case the user came back
+DELETE_IDLE_CHECKPOINTS_SQL = """
+WITH deleted AS (
+  DELETE FROM checkpoints c
+  WHERE c.thread_id = ANY(%(thread_ids)s)
+    AND NOT EXISTS (
+      SELECT 1 FROM checkpoints n
+      WHERE n.thread_id = c.thread_id AND (n.checkpoint ->> 'ts') >= %(cutoff)s
+    )
+  RETURNING c.thread_id, pg_column_size(c.*) AS size
+)
+SELECT array_agg(DISTINCT thread_id) AS thread_ids, count(*) AS rows, coalesce(sum(size), 0)::bigint AS bytes
+FROM deleted
+"""
+
+DELETE_THREAD_BLOBS_SQL = """
+WITH deleted AS (
+  DELETE FROM checkpoint_blobs b WHERE b.thread_id = ANY(%(thread_ids)s)
+  RETURNING pg_column_size(b.*) AS size
+)
+SELECT count(*) AS rows, coalesce(sum(size), 0)::bigint AS bytes FROM deleted
+"""
+
+DELETE_THREAD_WRITES_SQL = """
+WITH deleted AS (
+  DELETE FROM checkpoint_writes w WHERE w.thread_id = ANY(%(thread_ids)s)
+  RETURNING pg_column_size(w.*) AS size
+)
+SELECT count(*) AS rows, coalesce(sum(size), 0)::bigint AS bytes FROM deleted
+"""
+
+# Keyset page over the primary key, starting after the last thread seen
+SELECT_THREAD_PAGE_SQL = """
+SELECT DISTINCT thread_id FROM checkpoints
+WHERE thread_id > %(after)s
+ORDER BY thread_id
+LIMIT %(limit)s
+"""
+
+# checkpoint_id is a time-ordered UUID, so it sorts by recency. A subgraph
+# checkpoint records the root checkpoint it ran under in metadata.parents['']
+PRUNE_CHECKPOINTS_SQL = """
+WITH kept AS (
+  SELECT thread_id, checkpoint_id FROM (
+    SELECT thread_id, checkpoint_id,
+           row_number() OVER (
+             PARTITION BY thread_id ORDER BY checkpoint_id DESC
+           ) AS position
+    FROM checkpoints
+    WHERE thread_id = ANY(%(thread_ids)s) AND checkpoint_ns = ''
+  ) ranked
+  WHERE position <= %(keep)s
+), deleted AS (
+  DELETE FROM checkpoints c
+  WHERE c.thread_id = ANY(%(thread_ids)s)
+    AND NOT EXISTS (
+      SELECT 1 FROM kept k
+      WHERE k.thread_id = c.thread_id
+        AND k.checkpoint_id = CASE
+          WHEN c.checkpoint_ns = '' THEN c.checkpoint_id
+          ELSE c.metadata -> 'parents' ->> ''
+        END
+    )
+    AND NOT EXISTS (
+      SELECT 1 FROM checkpoints n
+      WHERE n.thread_id = c.thread_id AND (n.checkpoint ->> 'ts') >= %(active_cutoff)s
+    )
+  RETURNING c.thread_id, c.checkpoint_ns, c.checkpoint_id, pg_column_size(c.*) AS size
+), deleted_writes AS (
+  DELETE FROM checkpoint_writes w
+  USING deleted d
+  WHERE w.thread_id = d.thread_id
+    AND w.checkpoint_ns = d.checkpoint_ns
+    AND w.checkpoint_id = d.checkpoint_id
+  RETURNING pg_column_size(w.*) AS size
+)
+SELECT
+  (SELECT count(*) FROM deleted) AS checkpoint_rows,
+  (SELECT coalesce(sum(size), 0)::bigint FROM deleted) AS checkpoint_bytes,
+  (SELECT count(*) FROM deleted_writes) AS write_rows,
+  (SELECT coalesce(sum(size), 0)::bigint FROM deleted_writes) AS write_bytes
+"""
+
+# Blobs are shared between checkpoints by channel version
+DELETE_ORPHAN_BLOBS_SQL = """
+WITH deleted AS (
+  DELETE FROM checkpoint_blobs b
+  WHERE b.thread_id = ANY(%(thread_ids)s)
+    AND NOT EXISTS (
+      SELECT 1 FROM checkpoints c
+      WHERE c.thread_id = b.thread_id
+        AND c.checkpoint_ns = b.checkpoint_ns
+        AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+    )
+    AND NOT EXISTS (
+      SELECT 1 FROM checkpoints n
+      WHERE n.thread_id = b.thread_id AND (n.checkpoint ->> 'ts') >= %(active_cutoff)s
+    )
+  RETURNING pg_column_size(b.*) AS size
+)
+SELECT count(*) AS rows, coalesce(sum(size), 0)::bigint AS bytes FROM deleted
+"""
+
+TABLE_SIZES_SQL = """
+SELECT relname AS table_name, pg_total_relation_size(oid) AS bytes
+FROM pg_class
+WHERE relname IN ('checkpoints', 'checkpoint_blobs', 'checkpoint_writes')
+"""
+
+
+class CheckpointRetention:
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        keep_checkpoints: int,
+        active_grace_seconds: float,
+        batch_size: int,
+        max_batches: int,
+        lock_timeout_ms: int,
+    ):
+        self.pool = pool
+        self.keep_checkpoints = max(1, keep_checkpoints)
+        self.active_grace_seconds = active_grace_seconds
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.lock_timeout_ms = lock_timeout_ms
+        self._indexes_ready = False
+        # Last thread pruned; the next run continues after it
+        self._prune_after = ""
+        self.last_run: Optional[dict] = None
+        self.totals = {
+            "runs": 0,
+            "rows_deleted": 0,
+            "bytes_reclaimed": 0,
+            "duration_seconds": 0.0,
+        }
+
+    async def ensure_indexes(self):
+        """Create the indexes cleanup relies on, without blocking writes."""
+        if self._indexes_ready:
+            return
+        # CONCURRENTLY can't run inside a transaction; pool connections autocommit
+        async with self.pool.connection() as conn:
+            for statement in INDEXES_SQL:
+                await conn.execute(statement)
+        self._indexes_ready = True
+
+    async def _select_thread_ids(self, sql: str, params: dict) -> List[str]:
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(sql, params)
+            return list(
+                dict.fromkeys(row["thread_id"] for row in await cursor.fetchall())
+            )
+
+    async def _delete_idle_batch(self, thread_ids: List[str], cutoff: str) -> dict:
+        params = {"thread_ids": thread_ids, "cutoff": cutoff}
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}"
+                )
+                cursor = await conn.execute(DELETE_IDLE_CHECKPOINTS_SQL, params)
+                checkpoints = await cursor.fetchone()
+                deleted_ids = checkpoints["thread_ids"] or []
+                if not deleted_ids:
+                    return {"threads": 0, "rows": 0, "bytes": 0}
+                params["thread_ids"] = deleted_ids
+                cursor = await conn.execute(DELETE_THREAD_BLOBS_SQL, params)
+                blobs = await cursor.fetchone()
+                cursor = await conn.execute(DELETE_THREAD_WRITES_SQL, params)
+                writes = await cursor.fetchone()
+        return {
+            "threads": len(deleted_ids),
+            "rows": checkpoints["rows"] + blobs["rows"] + writes["rows"],
+            "bytes": checkpoints["bytes"] + blobs["bytes"] + writes["bytes"],
+        }
+
+    async def _prune_batch(self, thread_ids: List[str], active_cutoff: str) -> dict:
+        params = {
+            "thread_ids": thread_ids,
+            "keep": self.keep_checkpoints,
+            "active_cutoff": active_cutoff,
+        }
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}"
+                )
+                cursor = await conn.execute(PRUNE_CHECKPOINTS_SQL, params)
+                pruned = await cursor.fetchone()
+                cursor = await conn.execute(DELETE_ORPHAN_BLOBS_SQL, params)
+                blobs = await cursor.fetchone()
+        return {
+            "checkpoints": pruned["checkpoint_rows"],
+            "rows": pruned["checkpoint_rows"] + pruned["write_rows"] + blobs["rows"],
+            "bytes": pruned["checkpoint_bytes"]
+            + pruned["write_bytes"]
+            + blobs["bytes"],
+        }
+
+    @staticmethod
+    async def _apply_batch(delete, thread_ids: List[str], totals: dict) -> None:
+        try:
+            result = await delete(thread_ids)
+        except Exception as e:
+            # Most likely a lock timeout on a thread that just woke up
+            logger.warning(f"⚠️ CHECKPOINT RETENTION: Skipping batch: {str(e)}")
+            totals["skipped_batches"] = totals.get("skipped_batches", 0) + 1
+            return
+        for key, value in result.items():
+            totals[key] = totals.get(key, 0) + value
+
+    async def _run_batches(self, select_sql: str, select_params: dict, delete) -> dict:
+        totals: dict = {}
+        for _ in range(self.max_batches):
+            thread_ids = await self._select_thread_ids(
+                select_sql, {**select_params, "limit": self.batch_size}
+            )
+            if not thread_ids:
+                break
+            await self._apply_batch(delete, thread_ids, totals)
+            if len(thread_ids) < self.batch_size:
+                break
+            # Let live traffic through between batches
+            await asyncio.sleep(0.05)
+        return totals
+
+    async def _prune_threads(self, active_cutoff: str) -> dict:
+        """Prune up to `max_batches` pages of threads, continuing from the last run."""
+        totals: dict = {}
+        for _ in range(self.max_batches):
+            thread_ids = await self._select_thread_ids(
+                SELECT_THREAD_PAGE_SQL,
+                {"after": self._prune_after, "limit": self.batch_size},
+            )
+            # Start over from the first thread once the end is reached
+            self._prune_after = (
+                thread_ids[-1] if len(thread_ids) == self.batch_size else ""
+            )
+            if not thread_ids:
+                break
+            await self._apply_batch(
+                lambda ids: self._prune_batch(ids, active_cutoff), thread_ids, totals
+            )
+            if not self._prune_after:
+                break
+            # Let live traffic through between batches
+            await asyncio.sleep(0.05)
+        return totals
+
+    async def get_table_sizes(self) -> dict:
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(TABLE_SIZES_SQL)
+            return {row["table_name"]: row["bytes"] for row in await cursor.fetchall()}
+
+    async def run(self, idle_cutoff: datetime) -> dict:
+        """Delete threads idle since `idle_cutoff`, then prune the history of the rest."""
+        started = time.monotonic()
+        await self.ensure_indexes()
+
+        now = datetime.now(timezone.utc)
+        cutoff = idle_cutoff.astimezone(timezone.utc).isoformat()
+        active_cutoff = (now - timedelta(seconds=self.active_grace_seconds)).isoformat()
+
+        idle = await self._run_batches(
+            SELECT_IDLE_THREADS_SQL,
+            {"cutoff": cutoff},
+            lambda ids: self._delete_idle_batch(ids, cutoff),
+        )
+        pruned = await self._prune_threads(active_cutoff)
+
+        rows = idle.get("rows", 0) + pruned.get("rows", 0)
+        reclaimed = idle.get("bytes", 0) + pruned.get("bytes", 0)
+        metrics.increment("checkpoint_cleanup_rows", rows)
+        metrics.increment("checkpoint_cleanup_bytes", reclaimed)
+
+        self.last_run = {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "duration_seconds": round(time.monotonic() - started, 2),
+            "idle_threads_deleted": idle.get("threads", 0),
+            "checkpoints_pruned": pruned.get("checkpoints", 0),
+            "rows_deleted": rows,
+            "bytes_reclaimed": reclaimed,
+            "skipped_batches": idle.get("skipped_batches", 0)
+            + pruned.get("skipped_batches", 0),
+            "table_sizes": await self.get_table_sizes(),
+        }
+        self.totals["runs"] += 1
+        self.totals["rows_deleted"] += rows
+        self.totals["bytes_reclaimed"] += reclaimed
+        self.totals["duration_seconds"] += self.last_run["duration_seconds"]
+        return self.last_run
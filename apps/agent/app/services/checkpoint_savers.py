@@ -0,0 +1,500 @@
+"""
+Checkpoint saver wrappers layered on top of the PostgreSQL checkpointer.
+
+`DelegatingCheckpointSaver` forwards every call to an inner saver so wrappers
+only override what they change. `PrefetchingCheckpointSaver` lets the message
+pipeline load a thread's latest checkpoint while the debounce window is still
+open, so the graph run that follows doesn't wait on Postgres.
+`WriteBehindCheckpointSaver` takes checkpoint writes off the reply path for the
+"async" checkpoint durability mode, and `CachedCheckpointSaver` serves the
+latest checkpoint of active threads from memory once Postgres confirms it is
+still current.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_metadata,
+)
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.metrics import metrics
+from app.utils.lru import SizedLRUCache
+from app.utils.prefetch import PrefetchRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class DelegatingCheckpointSaver(BaseCheckpointSaver):
+    """Checkpoint saver that forwards everything to an inner saver."""
+
+    def __init__(self, inner: BaseCheckpointSaver):
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+
+    @property
+    def config_specs(self) -> list:
+        return self.inner.config_specs
+
+    def get_next_version(self, current: Any, channel: None) -> Any:
+        return self.inner.get_next_version(current, channel)
+
+    # Sync API
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.inner.get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.inner.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.inner.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.inner.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        return self.inner.delete_thread(thread_id)
+
+    # Async API
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self.inner.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for item in self.inner.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self.inner.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await self.inner.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await self.inner.adelete_thread(thread_id)
+
+    async def aevict_thread(self, thread_id: str) -> None:
+        """Drop what the wrappers hold for a thread; stored checkpoints stay."""
+        evict = getattr(self.inner, "aevict_thread", None)
+        if evict is not None:
+            await evict(thread_id)
+
+
+def _is_latest_root_lookup(config: RunnableConfig) -> bool:
+    configurable = config.get("configurable", {})
+    return not configurable.get("checkpoint_id") and not configurable.get(
+        "checkpoint_ns"
+    )
+
+
+class PrefetchingCheckpointSaver(DelegatingCheckpointSaver):
+    """
+    Read-ahead cache for the latest root checkpoint of a thread.
+
+    `prefetch` starts loading a thread's latest checkpoint in the background.
+    The next `aget_tuple` for that thread consumes the prefetched result (or
+    joins the in-flight load). Entries are single-use, expire after
+    `ttl_seconds`, and any write to the thread discards them.
+    """
+
+    def __init__(self, inner: BaseCheckpointSaver, ttl_seconds: float = 60.0):
+        super().__init__(inner)
+        self._prefetched = PrefetchRegistry(ttl_seconds=ttl_seconds)
+
+    def prefetch(self, thread_id: str) -> None:
+        """Start loading the latest checkpoint of a thread, if not already loading."""
+        config: RunnableConfig = {
+            "configurable": {"thread_id": thread_id, "checkpoint_ns": ""}
+        }
+        if self._prefetched.start(thread_id, lambda: self.inner.aget_tuple(config)):
+            logger.info(
+                f"🔮 PREFETCH: Loading latest checkpoint for thread {thread_id}"
+            )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id is not None and _is_latest_root_lookup(config):
+            task = self._prefetched.take(thread_id)
+            if task is None:
+                metrics.increment("checkpoint_prefetch", labels={"result": "miss"})
+            else:
+                try:
+                    result = await task
+                    metrics.increment("checkpoint_prefetch", labels={"result": "hit"})
+                    return result
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    metrics.increment("checkpoint_prefetch", labels={"result": "error"})
+                    logger.warning(
+                        f"⚠️ PREFETCH: Prefetched load failed for thread {thread_id}, reading again: {str(e)}"
+                    )
+        return await self.inner.aget_tuple(config)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self._prefetched.discard(config.get("configurable", {}).get("thread_id"))
+        return await self.inner.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._prefetched.discard(config.get("configurable", {}).get("thread_id"))
+        return await self.inner.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self._prefetched.discard(thread_id)
+        return await self.inner.adelete_thread(thread_id)
+
+    async def aevict_thread(self, thread_id: str) -> None:
+        self._prefetched.discard(thread_id)
+        await super().aevict_thread(thread_id)
+
+    def get_stats(self) -> dict:
+        return {"prefetched_threads": len(self._prefetched)}
+
+
+class WriteBehindCheckpointSaver(DelegatingCheckpointSaver):
+    """
+    Persists checkpoints and writes in the background, off the run's path.
+
+    Writes to a thread are applied in order by a chain of tasks per thread,
+    and reads of a thread wait for its pending writes first, so a thread
+    always reads its own writes. `flush` waits for pending writes (call it
+    before shutdown); writes still pending when the process dies are lost.
+    Only the async API is write-behind.
+    """
+
+    def __init__(self, inner: BaseCheckpointSaver):
+        super().__init__(inner)
+        self._tails: Dict[str, asyncio.Task] = {}
+        self.flushed = 0
+        self.failed = 0
+
+    def _enqueue(self, thread_id: str, write) -> None:
+        previous = self._tails.get(thread_id)
+
+        async def run():
+            if previous is not None:
+                # Keep order; a failed earlier write is already logged
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await write()
+                self.flushed += 1
+            except Exception as e:
+                self.failed += 1
+                metrics.increment("checkpoint_write_behind_errors")
+                logger.error(
+                    f"❌ WRITE-BEHIND: Failed to persist checkpoint for thread {thread_id}: {str(e)}"
+                )
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tails[thread_id] = task
+        task.add_done_callback(
+            lambda done: self._tails.get(thread_id) is done
+            and self._tails.pop(thread_id, None)
+        )
+
+    async def flush(self, thread_id: Optional[str] = None) -> None:
+        """Wait until the pending writes of a thread (or of all threads) are persisted."""
+        if thread_id is not None:
+            tail = self._tails.get(thread_id)
+            if tail is not None:
+                await asyncio.shield(tail)
+            return
+        while self._tails:
+            await asyncio.gather(*self._tails.values(), return_exceptions=True)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        await self.flush(config.get("configurable", {}).get("thread_id"))
+        return await self.inner.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.flush((config or {}).get("configurable", {}).get("thread_id"))
+        async for item in self.inner.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        self._enqueue(
+            configurable["thread_id"],
+            lambda: self.inner.aput(config, checkpoint, metadata, new_versions),
+        )
+        # What the saver would return once the write lands
+        return {
+            "configurable": {
+                "thread_id": configurable["thread_id"],
+                "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        writes = list(writes)
+        self._enqueue(
+            config["configurable"]["thread_id"],
+            lambda: self.inner.aput_writes(config, writes, task_id, task_path),
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.flush(thread_id)
+        return await self.inner.adelete_thread(thread_id)
+
+    async def aevict_thread(self, thread_id: str) -> None:
+        await self.flush(thread_id)
+        await super().aevict_thread(thread_id)
+
+    def get_stats(self) -> dict:
+        return {
+            "pending_threads": len(self._tails),
+            "flushed": self.flushed,
+            "failed": self.failed,
+        }
+
+
+# Latest root checkpoint of a thread, and whether writes were saved against it
+SELECT_HEAD_SQL = """
+SELECT c.checkpoint_id,
+       EXISTS (
+         SELECT 1 FROM checkpoint_writes w
+         WHERE w.thread_id = c.thread_id
+           AND w.checkpoint_ns = ''
+           AND w.checkpoint_id = c.checkpoint_id
+       ) AS has_writes
+FROM checkpoints c
+WHERE c.thread_id = %(thread_id)s AND c.checkpoint_ns = ''
+ORDER BY c.checkpoint_id DESC
+LIMIT 1
+"""
+
+
+class CachedCheckpointSaver(DelegatingCheckpointSaver):
+    """
+    In-process cache of the latest root checkpoint of active threads.
+
+    The cache is an LRU bounded by bytes. Checkpoints are cached serialized,
+    so a run can't mutate a cached copy. Before a cached checkpoint is
+    served, one indexed query reads the thread's head: its latest root
+    checkpoint ID and whether writes were saved against it. The copy is only
+    served while it is still the head and has no pending writes, so writes
+    from other workers and replicas are never missed, and interrupted runs
+    resume from the inner saver. Writes go to the inner saver and cache the
+    new checkpoint once persisted.
+    """
+
+    def __init__(
+        self,
+        inner: BaseCheckpointSaver,
+        pool: AsyncConnectionPool,
+        max_bytes: int,
+        ttl_seconds: int,
+    ):
+        super().__init__(inner)
+        self.pool = pool
+        # thread_id -> (checkpoint_id, typed blob)
+        self.local = SizedLRUCache(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _dump(self, saved: CheckpointTuple) -> Tuple[str, bytes]:
+        return self.serde.dumps_typed(
+            {
+                "config": saved.config,
+                "checkpoint": saved.checkpoint,
+                "metadata": saved.metadata,
+                "parent_config": saved.parent_config,
+            }
+        )
+
+    def _load(self, typed: Tuple[str, bytes]) -> CheckpointTuple:
+        data = self.serde.loads_typed(typed)
+        return CheckpointTuple(
+            config=data["config"],
+            checkpoint=data["checkpoint"],
+            metadata=data["metadata"],
+            parent_config=data["parent_config"],
+            pending_writes=[],
+        )
+
+    def _store(self, thread_id: str, saved: CheckpointTuple) -> None:
+        typed = self._dump(saved)
+        self.local.set(thread_id, (saved.checkpoint["id"], typed), len(typed[1]))
+
+    async def _is_head(self, thread_id: str, checkpoint_id: str) -> bool:
+        """Whether `checkpoint_id` is still the thread's head, with no writes."""
+        try:
+            async with self.pool.connection() as conn:
+                cursor = await conn.execute(SELECT_HEAD_SQL, {"thread_id": thread_id})
+                head = await cursor.fetchone()
+        except Exception as e:
+            metrics.increment("checkpoint_cache", labels={"result": "error"})
+            logger.error(
+                f"❌ CHECKPOINT CACHE: Head lookup failed for thread {thread_id}: {str(e)}"
+            )
+            return False
+        return (
+            head is not None
+            and head["checkpoint_id"] == checkpoint_id
+            and not head["has_writes"]
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id is None or not _is_latest_root_lookup(config):
+            return await self.inner.aget_tuple(config)
+
+        entry = self.local.get(thread_id)
+        if entry is not None:
+            if await self._is_head(thread_id, entry[0]):
+                self.hits += 1
+                metrics.increment("checkpoint_cache", labels={"result": "hit"})
+                return self._load(entry[1])
+            self.stale += 1
+            self.local.discard(thread_id)
+
+        self.misses += 1
+        metrics.increment("checkpoint_cache", labels={"result": "miss"})
+        result = await self.inner.aget_tuple(config)
+        # Skip if a write to the thread landed while reading; a tuple with
+        # pending writes is always read from the inner saver
+        if (
+            result is not None
+            and not result.pending_writes
+            and self.local.get(thread_id) is None
+        ):
+            self._store(thread_id, result)
+        return result
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await self.inner.aput(config, checkpoint, metadata, new_versions)
+        configurable = config["configurable"]
+        if configurable.get("checkpoint_ns"):
+            return next_config
+
+        thread_id = configurable["thread_id"]
+        parent_id = configurable.get("checkpoint_id")
+        self._store(
+            thread_id,
+            CheckpointTuple(
+                config=next_config,
+                checkpoint=checkpoint,
+                metadata=get_checkpoint_metadata(config, metadata),
+                parent_config=(
+                    {
+                        "configurable": {
+                            "thread_id": thread_id,
+                            "checkpoint_ns": "",
+                            "checkpoint_id": parent_id,
+                        }
+                    }
+                    if parent_id
+                    else None
+                ),
+                pending_writes=[],
+            ),
+        )
+        return next_config
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.inner.adelete_thread(thread_id)
+        await self.aevict_thread(thread_id)
+
+    async def aevict_thread(self, thread_id: str) -> None:
+        self.local.discard(thread_id)
+        await super().aevict_thread(thread_id)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            **self.local.get_stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,120 @@
+"""
+Compact serializer for LangGraph checkpoints.
+
+Channel values and pending writes (message histories, `UserData`) are stored
+as typed blobs. `CompressedCheckpointSerializer` encodes them as msgpack via
+`JsonPlusSerializer` and zstd-compresses blobs above a size threshold,
+optionally with a dictionary trained on real checkpoints. Compressed blobs are
+tagged `<type>+zstd`, so rows written before compression was enabled (plain
+`msgpack`, `json` or `pickle`) are still read as they are.
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import zstandard
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+ZSTD_SUFFIX = "+zstd"
+
+
+class CompressedCheckpointSerializer(SerializerProtocol):
+    def __init__(
+        self,
+        inner: Optional[SerializerProtocol] = None,
+        threshold_bytes: int = 1024,
+        level: int = 3,
+        dictionary: Optional[bytes] = None,
+    ):
+        # Pickle fallback keeps objects msgpack can't encode storable
+        self.inner = inner or JsonPlusSerializer(pickle_fallback=True)
+        self.threshold_bytes = threshold_bytes
+        self.level = level
+        self._dictionary = (
+            zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        )
+        # zstd (de)compressors must not be shared between threads
+        self._local = threading.local()
+
+    @property
+    def dictionary_id(self) -> int:
+        return self._dictionary.dict_id() if self._dictionary is not None else 0
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self._dictionary
+            )
+        return compressor
+
+    def _decompressor(self) -> zstandard.ZstdDecompressor:
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstandard.ZstdDecompressor(
+                dict_data=self._dictionary
+            )
+        return decompressor
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.inner.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if type_ in ("null", "bytes", "bytearray") or len(data) < self.threshold_bytes:
+            return type_, data
+        compressed = self._compressor().compress(data)
+        if len(compressed) >= len(data):
+            return type_, data
+        return f"{type_}{ZSTD_SUFFIX}", compressed
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, data_ = data
+        if type_.endswith(ZSTD_SUFFIX):
+            frame_dictionary_id = zstandard.get_frame_parameters(data_).dict_id
+            if frame_dictionary_id and frame_dictionary_id != self.dictionary_id:
+                raise ValueError(
+                    f"Checkpoint blob was compressed with zstd dictionary {frame_dictionary_id}, "
+                    f"but dictionary {self.dictionary_id or 'none'} is loaded"
+                )
+            type_ = type_[: -len(ZSTD_SUFFIX)]
+            data_ = self._decompressor().decompress(data_)
+        return self.inner.loads_typed((type_, data_))
+
+
+def train_dictionary(samples: list, size_bytes: int = 64 * 1024) -> bytes:
+    """Train a zstd dictionary on serialized checkpoint blobs."""
+    return zstandard.train_dictionary(size_bytes, samples).as_bytes()
+
+
+def create_checkpoint_serializer() -> SerializerProtocol:
+    """Serializer for the checkpointer, as chosen by CHECKPOINT_SERIALIZER."""
+    settings = get_settings()
+    if settings.CHECKPOINT_SERIALIZER == "jsonplus":
+        return JsonPlusSerializer(pickle_fallback=True)
+    if settings.CHECKPOINT_SERIALIZER != "zstd":
+        raise ValueError(
+            f"Unknown CHECKPOINT_SERIALIZER '{settings.CHECKPOINT_SERIALIZER}'"
+        )
+
+    dictionary = None
+    if settings.CHECKPOINT_ZSTD_DICTIONARY_PATH:
+        dictionary = Path(settings.CHECKPOINT_ZSTD_DICTIONARY_PATH).read_bytes()
+        logger.info(
+            f"📚 Loaded zstd checkpoint dictionary ({len(dictionary)} bytes) from {settings.CHECKPOINT_ZSTD_DICTIONARY_PATH}"
+        )
+    return CompressedCheckpointSerializer(
+        threshold_bytes=settings.CHECKPOINT_COMPRESSION_THRESHOLD_BYTES,
+        level=settings.CHECKPOINT_COMPRESSION_LEVEL,
+        dictionary=dictionary,
+    )
@@ -0,0 +1,185 @@
+"""
+Storage telemetry for the LangGraph checkpoint tables.
+
+Reports how many threads there are, how their checkpoint rows and blob bytes
+are distributed, which threads are the largest, how big each table and index
+is and how fast the tables grow. Sizes come from the catalog; per-thread
+figures from aggregates grouped by `thread_id`, using `pg_column_size` so
+blobs are never detoasted. Those aggregates read whole tables, so results
+are cached for `cache_seconds` and concurrent callers share one refresh.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from psycopg_pool import AsyncConnectionPool
+
+from app.services.checkpoint_retention import CheckpointRetention
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TABLES = ("checkpoints", "checkpoint_blobs", "checkpoint_writes")
+
+TABLE_SIZES_SQL = """
+SELECT c.relname AS table_name,
+       c.reltuples::bigint AS estimated_rows,
+       pg_table_size(c.oid) AS table_bytes,
+       pg_indexes_size(c.oid) AS index_bytes,
+       pg_total_relation_size(c.oid) AS total_bytes
+FROM pg_class c
+WHERE c.relname = ANY(%(tables)s) AND c.relkind = 'r'
+"""
+
+INDEX_SIZES_SQL = """
+SELECT indexrelname AS index_name, relname AS table_name,
+       pg_relation_size(indexrelid) AS bytes, idx_scan AS scans
+FROM pg_stat_user_indexes
+WHERE relname = ANY(%(tables)s)
+ORDER BY bytes DESC
+"""
+
+CHECKPOINTS_PER_THREAD_SQL = """
+WITH per_thread AS (
+  SELECT thread_id, count(*) AS checkpoints FROM checkpoints GROUP BY thread_id
+)
+SELECT count(*) AS threads,
+       coalesce(percentile_disc(0.5) WITHIN GROUP (ORDER BY checkpoints), 0) AS p50,
+       coalesce(percentile_disc(0.99) WITHIN GROUP (ORDER BY checkpoints), 0) AS p99,
+       coalesce(max(checkpoints), 0) AS max
+FROM per_thread
+"""
+
+BLOB_BYTES_PER_THREAD_SQL = """
+WITH per_thread AS MATERIALIZED (
+  SELECT thread_id, sum(pg_column_size(blob))::bigint AS bytes, count(*) AS blobs
+  FROM checkpoint_blobs
+  GROUP BY thread_id
+)
+SELECT coalesce(percentile_disc(0.5) WITHIN GROUP (ORDER BY bytes), 0) AS p50,
+       coalesce(percentile_disc(0.99) WITHIN GROUP (ORDER BY bytes), 0) AS p99,
+       coalesce(max(bytes), 0) AS max,
+       coalesce(sum(bytes), 0)::bigint AS total,
+       (
+         SELECT coalesce(json_agg(top ORDER BY top.bytes DESC), '[]'::json)
+         FROM (
+           SELECT thread_id, bytes, blobs FROM per_thread
+           ORDER BY bytes DESC LIMIT %(top)s
+         ) top
+       ) AS top_threads
+FROM per_thread
+"""
+
+# Per top thread, through the (thread_id) and (thread_id, ts) indexes
+THREAD_CHECKPOINTS_SQL = """
+SELECT count(*) AS checkpoints, max(checkpoint ->> 'ts') AS last_checkpoint_at
+FROM checkpoints WHERE thread_id = %(thread_id)s
+"""
+
+
+class CheckpointStorageStats:
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        retention: Optional[CheckpointRetention],
+        top_threads: int,
+        cache_seconds: float,
+        statement_timeout_ms: int = 30000,
+    ):
+        self.pool = pool
+        self.retention = retention
+        self.top_threads = top_threads
+        self.cache_seconds = cache_seconds
+        self.statement_timeout_ms = statement_timeout_ms
+        self._cached: Optional[dict] = None
+        self._cached_at = 0.0
+        self._lock = asyncio.Lock()
+        # (monotonic time, total bytes of the tables) per refresh, for growth
+        self._size_samples: deque = deque(maxlen=48)
+
+    async def _query(self) -> dict:
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}"
+                )
+                params = {"tables": list(CHECKPOINT_TABLES), "top": self.top_threads}
+                cursor = await conn.execute(TABLE_SIZES_SQL, params)
+                tables = {row["table_name"]: row for row in await cursor.fetchall()}
+                cursor = await conn.execute(INDEX_SIZES_SQL, params)
+                indexes = await cursor.fetchall()
+                cursor = await conn.execute(CHECKPOINTS_PER_THREAD_SQL)
+                checkpoints = await cursor.fetchone()
+                cursor = await conn.execute(BLOB_BYTES_PER_THREAD_SQL, params)
+                blobs = await cursor.fetchone()
+                top_threads = []
+                for thread in blobs["top_threads"]:
+                    cursor = await conn.execute(
+                        THREAD_CHECKPOINTS_SQL, {"thread_id": thread["thread_id"]}
+                    )
+                    top_threads.append({**thread, **await cursor.fetchone()})
+
+        return {
+            "threads": checkpoints["threads"],
+            "checkpoints_per_thread": {
+                key: checkpoints[key] for key in ("p50", "p99", "max")
+            },
+            "blob_bytes_per_thread": {
+                key: blobs[key] for key in ("p50", "p99", "max", "total")
+            },
+            "top_threads": top_threads,
+            "tables": tables,
+            "indexes": indexes,
+        }
+
+    def _growth(self, total_bytes: int) -> Optional[float]:
+        """Bytes per hour since the oldest size sample still kept."""
+        now = time.monotonic()
+        self._size_samples.append((now, total_bytes))
+        first_at, first_bytes = self._size_samples[0]
+        if now - first_at < 1:
+            return None
+        return round((total_bytes - first_bytes) / (now - first_at) * 3600)
+
+    def _cleanup(self) -> Optional[dict]:
+        if self.retention is None or not self.retention.totals["runs"]:
+            return None
+        totals = self.retention.totals
+        seconds = totals["duration_seconds"] or None
+        return {
+            **totals,
+            "rows_per_second": (
+                round(totals["rows_deleted"] / seconds, 1) if seconds else None
+            ),
+            "bytes_per_second": (
+                round(totals["bytes_reclaimed"] / seconds) if seconds else None
+            ),
+            "last_run": self.retention.last_run,
+        }
+
+    async def get(self) -> dict:
+        """The latest stats, refreshed if older than `cache_seconds`."""
+        async with self._lock:
+            if (
+                self._cached is None
+                or time.monotonic() - self._cached_at >= self.cache_seconds
+            ):
+                started = time.monotonic()
+                stats = await self._query()
+                total_bytes = sum(t["total_bytes"] for t in stats["tables"].values())
+                self._cached = {
+                    **stats,
+                    "total_bytes": total_bytes,
+                    "growth_bytes_per_hour": self._growth(total_bytes),
+                    "collected_at": datetime.now(timezone.utc).isoformat(),
+                    "query_seconds": round(time.monotonic() - started, 3),
+                }
+                self._cached_at = time.monotonic()
+                logger.info(
+                    f"📊 CHECKPOINT STATS: {stats['threads']} threads, {total_bytes} bytes "
+                    f"(collected in {self._cached['query_seconds']}s)"
+                )
+            return {**self._cached, "cleanup": self._cleanup()}
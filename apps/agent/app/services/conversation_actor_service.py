@@ -0,0 +1,192 @@
+"""
+Per-user conversation actors for WhatsApp message batching.
+
+Each active user gets an actor: a mailbox plus a single long-lived task that
+debounces bursts of messages into a batch and processes batches one at a time.
+The debounce window adapts to the user's typing pattern and message types
+(see `debounce_policy`).
+Actors evict themselves after idling, so memory scales with active users and
+enqueueing a message is a constant-time mailbox put.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.services.debounce_policy import (
+    GapStatsRegistry,
+    create_debounce_policy,
+    message_sent_at,
+)
+
+logger = logging.getLogger(__name__)
+
+# Processes one debounced batch of preprocessed messages for a user
+BatchHandler = Callable[[str, List[Dict[str, Any]]], Awaitable[None]]
+
+# Warms conversation context from the first message of a burst
+PrefetchHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+BATCH_SIZE_BUCKETS = (1, 2, 3, 5, 8, 13, 21)
+
+
+class ConversationActor:
+    """Mailbox and debounce/processing loop for a single user."""
+
+    def __init__(self, user_phone: str, service: "ConversationActorService"):
+        self.user_phone = user_phone
+        self.mailbox: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
+        self.is_processing = False
+        self._service = service
+        self.prefetch_task: Optional[asyncio.Task] = None
+        self.task = asyncio.create_task(self._run())
+
+    def _start_prefetch(self, first_message: Dict[str, Any]):
+        """Load conversation context while the debounce window is open."""
+        prefetcher = self._service.prefetcher
+        if prefetcher is None:
+            return
+        self.prefetch_task = asyncio.create_task(
+            prefetcher(self.user_phone, first_message)
+        )
+
+    async def _collect_batch(
+        self, first_message: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Keep adding messages until the debounce window passes in silence."""
+        batch = [first_message]
+        policy = self._service.debounce_policy
+        opened_at = time.monotonic()
+        while True:
+            window, reason = policy.window_for(
+                batch, self._service.gap_stats.get(self.user_phone)
+            )
+            metrics.observe("debounce_window_seconds", window, {"reason": reason})
+            logger.info(
+                f"⏳ ACTOR: Debouncing {window:.2f}s ({reason}) for user {self.user_phone}"
+            )
+            try:
+                message = await asyncio.wait_for(self.mailbox.get(), timeout=window)
+            except asyncio.TimeoutError:
+                metrics.observe(
+                    "debounce_batch_wait_seconds", time.monotonic() - opened_at
+                )
+                metrics.observe(
+                    "debounce_batch_size", len(batch), buckets=BATCH_SIZE_BUCKETS
+                )
+                return batch
+            batch.append(message)
+            logger.info(
+                f"📊 ACTOR: Batch for user {self.user_phone} grew to {len(batch)} messages"
+            )
+
+    async def _run(self):
+        while True:
+            try:
+                first_message = await asyncio.wait_for(
+                    self.mailbox.get(), timeout=self._service.idle_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                # No await between the emptiness check and eviction, so a
+                # concurrent submit either lands here first or gets a new actor
+                if self.mailbox.empty():
+                    self._service._evict(self)
+                    logger.info(
+                        f"👋 ACTOR: Evicted idle actor for user {self.user_phone}"
+                    )
+                    return
+                continue
+            except asyncio.CancelledError:
+                return
+
+            self._start_prefetch(first_message)
+            batch: List[Dict[str, Any]] = []
+            try:
+                batch = await self._collect_batch(first_message)
+                self.is_processing = True
+                await self._service.handler(self.user_phone, batch)
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logger.error(
+                    f"❌ ACTOR: Unhandled error processing batch for user {self.user_phone}: {str(e)}"
+                )
+            finally:
+                self.is_processing = False
+                if self.prefetch_task is not None:
+                    self.prefetch_task.cancel()
+                    self.prefetch_task = None
+
+
+class ConversationActorService:
+    """Registry of live conversation actors keyed by user phone number."""
+
+    def __init__(self):
+        settings = get_settings()
+        self.debounce_policy = create_debounce_policy()
+        self.idle_timeout_seconds = settings.CONVERSATION_ACTOR_IDLE_SECONDS
+        self.gap_stats = GapStatsRegistry(
+            burst_horizon=self.debounce_policy.ceiling_seconds,
+            max_users=settings.DEBOUNCE_GAP_STATS_MAX_USERS,
+        )
+        self.handler: Optional[BatchHandler] = None
+        self.prefetcher: Optional[PrefetchHandler] = None
+        self._actors: Dict[str, ConversationActor] = {}
+
+    def start(
+        self, handler: BatchHandler, prefetcher: Optional[PrefetchHandler] = None
+    ):
+        """Register the batch handler (and optional prefetcher) used by every actor."""
+        self.handler = handler
+        self.prefetcher = prefetcher
+
+    def submit(self, user_phone: str, message_data: Dict[str, Any]):
+        """Deliver a preprocessed message to the user's actor, creating it if needed."""
+        if self.handler is None:
+            raise RuntimeError("Conversation actor service is not started")
+
+        actor = self._actors.get(user_phone)
+        if actor is None:
+            actor = ConversationActor(user_phone, self)
+            self._actors[user_phone] = actor
+            logger.info(f"🆕 ACTOR: Created actor for user {user_phone}")
+        elif actor.is_processing:
+            logger.info(
+                f"🔒 ACTOR: User {user_phone} is being processed, message queued for next batch"
+            )
+
+        self.gap_stats.get(user_phone).record_arrival(message_sent_at(message_data))
+        actor.mailbox.put_nowait(message_data)
+
+    def _evict(self, actor: ConversationActor):
+        if self._actors.get(actor.user_phone) is actor:
+            del self._actors[actor.user_phone]
+
+    async def stop(self):
+        """Cancel all actors. Unprocessed messages are replayed by the ingress queue."""
+        actors = list(self._actors.values())
+        for actor in actors:
+            actor.task.cancel()
+            if actor.prefetch_task is not None:
+                actor.prefetch_task.cancel()
+        await asyncio.gather(*(actor.task for actor in actors), return_exceptions=True)
+        self._actors.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "active_actors": len(self._actors),
+            "processing": sum(
+                1 for actor in self._actors.values() if actor.is_processing
+            ),
+            "queued_messages": sum(
+                actor.mailbox.qsize() for actor in self._actors.values()
+            ),
+            "gap_stats_users": len(self.gap_stats),
+        }
+
+
+# Create a singleton instance
+conversation_actor_service = ConversationActorService()
@@ -0,0 +1,155 @@
+"""
+Conversation history reads and deletions straight from the checkpoint tables.
+
+A thread's whole message history is the `messages` channel of its latest
+checkpoint, stored as one blob. Reads look up the latest version of that
+channel, fetch the blob by primary key and decode it, never the other
+channels or older checkpoints. Pages are cut from the decoded list with an
+index cursor; indexes are stable because messages are only ever appended to
+a thread.
+
+The blob can't be decoded partially, so a page costs as much as the whole
+history the first time. Decoded histories are therefore cached by thread
+and channel version: walking a cursor (or exporting page by page) decodes
+once, and any new message changes the version. Memory for a read still
+grows with the length of the thread.
+
+Deletion removes threads from `checkpoints`, `checkpoint_blobs` and
+`checkpoint_writes` in one statement per batch, through the tables'
+`thread_id` indexes.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from psycopg_pool import AsyncConnectionPool
+
+from app.utils.lru import SizedLRUCache
+
+logger = logging.getLogger(__name__)
+
+SELECT_MESSAGES_VERSION_SQL = """
+SELECT checkpoint -> 'channel_versions' ->> 'messages' AS version
+FROM checkpoints
+WHERE thread_id = %(thread_id)s AND checkpoint_ns = ''
+ORDER BY checkpoint_id DESC
+LIMIT 1
+"""
+
+SELECT_MESSAGES_BLOB_SQL = """
+SELECT type, blob
+FROM checkpoint_blobs
+WHERE thread_id = %(thread_id)s AND checkpoint_ns = ''
+  AND channel = 'messages' AND version = %(version)s
+"""
+
+DELETE_THREADS_SQL = """
+WITH deleted_checkpoints AS (
+  DELETE FROM checkpoints WHERE thread_id = ANY(%(thread_ids)s)
+  RETURNING thread_id
+), deleted_blobs AS (
+  DELETE FROM checkpoint_blobs WHERE thread_id = ANY(%(thread_ids)s)
+  RETURNING 1
+), deleted_writes AS (
+  DELETE FROM checkpoint_writes WHERE thread_id = ANY(%(thread_ids)s)
+  RETURNING 1
+)
+SELECT
+  (SELECT count(DISTINCT thread_id) FROM deleted_checkpoints) AS threads,
+  (SELECT count(*) FROM deleted_checkpoints) AS checkpoints,
+  (SELECT count(*) FROM deleted_blobs) AS blobs,
+  (SELECT count(*) FROM deleted_writes) AS writes
+"""
+
+
+class ConversationHistory:
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        serde: SerializerProtocol,
+        batch_size: int,
+        lock_timeout_ms: int,
+        cache_max_bytes: int = 32 * 1024 * 1024,
+        cache_ttl_seconds: float = 300.0,
+    ):
+        self.pool = pool
+        self.serde = serde
+        self.batch_size = max(1, batch_size)
+        self.lock_timeout_ms = lock_timeout_ms
+        # (thread_id, messages version) -> decoded messages, sized by blob bytes
+        self.decoded = SizedLRUCache(
+            max_bytes=cache_max_bytes, ttl_seconds=cache_ttl_seconds
+        )
+
+    async def load_messages(self, thread_id: str) -> List[BaseMessage]:
+        """All messages of a thread, oldest first."""
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(
+                SELECT_MESSAGES_VERSION_SQL, {"thread_id": thread_id}
+            )
+            row = await cursor.fetchone()
+            if row is None or row["version"] is None:
+                return []
+            key = (thread_id, row["version"])
+            messages = self.decoded.get(key)
+            if messages is not None:
+                return list(messages)
+            cursor = await conn.execute(
+                SELECT_MESSAGES_BLOB_SQL,
+                {"thread_id": thread_id, "version": row["version"]},
+            )
+            row = await cursor.fetchone()
+        if row is None or row["type"] == "empty":
+            return []
+        blob = bytes(row["blob"])
+        # Long threads take a while to decode; keep the event loop free
+        messages = await asyncio.to_thread(self.serde.loads_typed, (row["type"], blob))
+        self.decoded.set(key, messages, len(blob))
+        return list(messages)
+
+    async def read_page(
+        self, thread_id: str, before: Optional[int] = None, limit: int = 50
+    ) -> dict:
+        """
+        The `limit` messages preceding index `before` (the newest without it).
+
+        `next_cursor` is the `before` for the next, older page, or None once
+        the start of the conversation is reached. Pages share one decoded
+        history while the thread doesn't change (see the module docstring).
+        """
+        messages = await self.load_messages(thread_id)
+        end = len(messages) if before is None else min(before, len(messages))
+        start = max(0, end - limit)
+        return {
+            "thread_id": thread_id,
+            "total": len(messages),
+            "start": start,
+            "messages": messages[start:end],
+            "next_cursor": start or None,
+        }
+
+    async def delete_threads(self, thread_ids: List[str]) -> Dict[str, int]:
+        """Delete every checkpoint, blob and write of the given threads."""
+        thread_ids = list(dict.fromkeys(thread_ids))
+        totals = {"threads": 0, "checkpoints": 0, "blobs": 0, "writes": 0}
+        for offset in range(0, len(thread_ids), self.batch_size):
+            batch = thread_ids[offset : offset + self.batch_size]
+            async with self.pool.connection() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}"
+                    )
+                    cursor = await conn.execute(
+                        DELETE_THREADS_SQL, {"thread_ids": batch}
+                    )
+                    row = await cursor.fetchone()
+            for key in totals:
+                totals[key] += row[key]
+        logger.info(
+            f"🗑️ CONVERSATION HISTORY: Deleted {totals['threads']} thread(s), "
+            f"{totals['checkpoints']} checkpoints, {totals['blobs']} blobs, {totals['writes']} writes"
+        )
+        return totals
@@ -0,0 +1,225 @@
+"""
+Token-budgeted model input for long-lived conversation threads.
+
+Threads are keyed by the user's chat and live for months, so the checkpointed
+message list grows without bound. `ConversationWindow` builds what the model
+actually sees (`window`, called from the agent prompt):
+
+- the last few turns verbatim,
+- older turns with their tool outputs truncated,
+- everything before that folded into a rolling summary kept in state,
+
+dropping the oldest turns if the result is still over the token budget. The
+checkpointed history itself is left untouched.
+
+The summary is never computed on the reply path. Once enough old turns pile
+up, `apply` (the agents' pre-model hook) starts summarizing them in the
+background. A later hook call on the same thread stores the finished summary
+in state, usually on the next turn. Until then the old turns are elided as
+usual.
+"""
+
+import asyncio
+import contextvars
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AnyMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+    get_buffer_string,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Turn = List[AnyMessage]
+
+# (summarized_through it was built on, new summarized_through, summary)
+SummaryResult = Tuple[str, str, str]
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of a conversation between a user and LukAI, a personal finance assistant on WhatsApp.
+
+Update the existing summary with the new messages. Keep only what helps continue the conversation: amounts, dates, categories and accounts the user mentioned, what was registered or changed, open questions, and the user's preferences. Drop greetings and tool mechanics. Write at most 200 words, in the user's language."""
+
+
+def split_turns(messages: List[AnyMessage]) -> List[Turn]:
+    """Group messages into turns, each starting at a user message."""
+    turns: List[Turn] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+class ConversationWindow:
+    # Threads with a summary in progress or waiting to be picked up
+    MAX_PENDING_SUMMARIES = 1000
+
+    def __init__(
+        self,
+        max_tokens: int,
+        keep_turns: int,
+        tool_output_max_chars: int,
+        summary_batch_turns: int,
+        summarizer: Optional[BaseChatModel] = None,
+        name: str = "default",
+    ):
+        self.max_tokens = max_tokens
+        self.keep_turns = max(1, keep_turns)
+        self.tool_output_max_chars = tool_output_max_chars
+        self.summary_batch_turns = summary_batch_turns
+        self.summarizer = summarizer
+        self.name = name
+        self._summaries: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+
+    def _elide(self, message: AnyMessage) -> AnyMessage:
+        """Truncate a tool output, keeping the message (and its tool_call_id)."""
+        if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+            return message
+        if len(message.content) <= self.tool_output_max_chars:
+            return message
+        omitted = len(message.content) - self.tool_output_max_chars
+        return message.model_copy(
+            update={
+                "content": f"{message.content[: self.tool_output_max_chars]}\n[... {omitted} characters of older tool output omitted]"
+            }
+        )
+
+    async def _summarize(self, summary: str, messages: List[AnyMessage]) -> str:
+        assert self.summarizer is not None
+        transcript = get_buffer_string([self._elide(m) for m in messages])
+        response = await self.summarizer.ainvoke(
+            [
+                SystemMessage(content=SUMMARY_INSTRUCTIONS),
+                HumanMessage(
+                    content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+                ),
+            ]
+        )
+        return response.content if isinstance(response.content, str) else summary
+
+    @staticmethod
+    def _unsummarized(messages: List[AnyMessage], summarized_through: Optional[str]):
+        if summarized_through:
+            for index in range(len(messages) - 1, -1, -1):
+                if messages[index].id == summarized_through:
+                    return messages[index + 1 :]
+        return messages
+
+    def _split(self, state: dict):
+        turns = split_turns(
+            self._unsummarized(state["messages"], state.get("summarized_through"))
+        )
+        return turns[: -self.keep_turns], turns[-self.keep_turns :]
+
+    async def _summarize_in_background(
+        self, base: str, summary: str, older: List[Turn]
+    ) -> Optional[SummaryResult]:
+        folded = [message for turn in older for message in turn]
+        try:
+            new_summary = await self._summarize(summary, folded)
+        except Exception as e:
+            logger.warning(
+                f"⚠️ WINDOW: Failed to summarize {len(older)} turns, keeping them: {str(e)}"
+            )
+            return None
+        return base, folded[-1].id, new_summary
+
+    def _take_summary(self, thread_id: str, base: str) -> Optional[SummaryResult]:
+        """The thread's finished summary, if it was built on the state's summary."""
+        task = self._summaries.get(thread_id)
+        if task is None or not task.done():
+            return None
+        del self._summaries[thread_id]
+        result = None if task.cancelled() else task.result()
+        return result if result is not None and result[0] == base else None
+
+    def _start_summary(self, thread_id: str, state: dict, older: List[Turn]) -> None:
+        # A fresh context, so the summary isn't traced or streamed as part of the run
+        self._summaries[thread_id] = asyncio.get_running_loop().create_task(
+            self._summarize_in_background(
+                state.get("summarized_through") or "",
+                state.get("conversation_summary") or "",
+                older,
+            ),
+            context=contextvars.Context(),
+        )
+        while len(self._summaries) > self.MAX_PENDING_SUMMARIES:
+            _, oldest = self._summaries.popitem(last=False)
+            oldest.cancel()
+
+    async def apply(self, state: dict, config: RunnableConfig) -> dict:
+        """Pre-model hook: stores finished summaries and starts new ones."""
+        # The model input itself is built by the prompt (see `window`), so it
+        # isn't written to the checkpoint on every model call; the empty value
+        # also clears inputs persisted by threads from before that change
+        update: dict = {"llm_input_messages": []}
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if self.summarizer is None or thread_id is None:
+            return update
+
+        finished = self._take_summary(thread_id, state.get("summarized_through") or "")
+        if finished is not None:
+            _, update["summarized_through"], update["conversation_summary"] = finished
+            metrics.increment("conversation_summaries", labels={"tier": self.name})
+            return update
+
+        older, _ = self._split(state)
+        if len(older) >= self.summary_batch_turns and thread_id not in self._summaries:
+            self._start_summary(thread_id, state, older)
+        return update
+
+    def window(self, state: dict) -> List[AnyMessage]:
+        """The messages the model sees for this state, within the token budget."""
+        older, recent = self._split(state)
+        window = [[self._elide(m) for m in turn] for turn in older] + recent
+        tokens = count_tokens_approximately([m for turn in window for m in turn])
+        # Over budget: shorten tool outputs in all but the current turn, then
+        # drop whole turns (never splitting a tool call from its result)
+        if tokens > self.max_tokens:
+            window = [[self._elide(m) for m in turn] for turn in window[:-1]] + [
+                window[-1]
+            ]
+            tokens = count_tokens_approximately([m for turn in window for m in turn])
+        while tokens > self.max_tokens and len(window) > 1:
+            dropped = window.pop(0)
+            tokens -= count_tokens_approximately(dropped)
+
+        metrics.observe(
+            "conversation_window_tokens",
+            tokens,
+            labels={"tier": self.name},
+            buckets=(1000, 2000, 4000, 8000, 16000, 32000, 64000),
+        )
+        return [m for turn in window for m in turn]
+
+
+def create_conversation_window(name: str) -> ConversationWindow:
+    settings = get_settings()
+    summarizer = None
+    if settings.CONVERSATION_SUMMARY_MODEL:
+        summarizer = ChatGoogleGenerativeAI(
+            model=settings.CONVERSATION_SUMMARY_MODEL,
+            temperature=0,
+            api_key=settings.GOOGLE_API_KEY,
+        )
+    return ConversationWindow(
+        max_tokens=settings.CONVERSATION_WINDOW_MAX_TOKENS,
+        keep_turns=settings.CONVERSATION_WINDOW_KEEP_TURNS,
+        tool_output_max_chars=settings.CONVERSATION_TOOL_OUTPUT_MAX_CHARS,
+        summary_batch_turns=settings.CONVERSATION_SUMMARY_BATCH_TURNS,
+        summarizer=summarizer,
+        name=name,
+    )
@@ -0,0 +1,171 @@
+"""
+Adaptive debounce window for per-user message batching.
+
+Instead of always waiting a fixed time after the last message, the window is
+chosen from the message type and from how this user usually types: people who
+send one self-contained message get an almost immediate reply, while bursts of
+short messages, photo albums and voice notes keep the batch open longer.
+"""
+
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+MEDIA_MESSAGE_TYPES = {"image", "document", "audio"}
+
+# Trailing characters/words that suggest the user has not finished the thought
+_CONTINUATION_PATTERN = re.compile(
+    r"([,:;+\-(]|\.\.\.|…|\b(y|e|o|and|or|but|pero|con|de|en|que|with))\s*$",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class InterMessageGapStats:
+    """
+    Per-user exponentially weighted statistics of message arrival gaps.
+
+    Gaps are measured between the times WhatsApp says the messages were sent,
+    so delays in delivery and preprocessing don't distort them.
+    `follow_up_rate` estimates how often a message is followed by another one
+    within the burst horizon; `mean_gap` is the typical gap inside a burst.
+    """
+
+    burst_horizon: float
+    alpha: float = 0.3
+    mean_gap: Optional[float] = None
+    follow_up_rate: float = 0.0
+    last_arrival: Optional[float] = None
+    samples: int = 0
+
+    def record_arrival(self, sent_at: float) -> None:
+        if self.last_arrival is not None:
+            gap = sent_at - self.last_arrival
+            if gap < 0:
+                # Delivered out of order; the later message was already counted
+                return
+            followed = gap <= self.burst_horizon
+            self.follow_up_rate += self.alpha * (float(followed) - self.follow_up_rate)
+            if followed:
+                self.mean_gap = (
+                    gap
+                    if self.mean_gap is None
+                    else self.mean_gap + self.alpha * (gap - self.mean_gap)
+                )
+            self.samples += 1
+        self.last_arrival = sent_at
+
+
+def message_sent_at(message_data: Dict[str, Any]) -> float:
+    """The WhatsApp send time of a message (epoch seconds), else now."""
+    try:
+        return float(message_data["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class GapStatsRegistry:
+    """
+    Gap statistics of the most recently active users.
+
+    Kept apart from the conversation actors, which are evicted after a few
+    idle minutes, so a user's typing pattern outlives them.
+    """
+
+    def __init__(self, burst_horizon: float, max_users: int):
+        self.burst_horizon = burst_horizon
+        self.max_users = max_users
+        self._stats: "OrderedDict[str, InterMessageGapStats]" = OrderedDict()
+
+    def get(self, user_phone: str) -> InterMessageGapStats:
+        stats = self._stats.get(user_phone)
+        if stats is None:
+            stats = self._stats[user_phone] = InterMessageGapStats(
+                burst_horizon=self.burst_horizon
+            )
+            while len(self._stats) > self.max_users:
+                self._stats.popitem(last=False)
+        self._stats.move_to_end(user_phone)
+        return stats
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+
+class AdaptiveDebouncePolicy:
+    """Chooses how long to keep a user's batch open after its latest message."""
+
+    # Below this follow-up rate a complete text is answered at the floor
+    SINGLE_MESSAGE_FOLLOW_UP_RATE = 0.3
+    # Wait this multiple of the user's typical in-burst gap
+    GAP_MULTIPLIER = 1.5
+
+    def __init__(
+        self,
+        floor_seconds: float,
+        ceiling_seconds: float,
+        default_seconds: float,
+        media_seconds: float,
+    ):
+        self.floor_seconds = floor_seconds
+        self.ceiling_seconds = ceiling_seconds
+        self.default_seconds = default_seconds
+        self.media_seconds = media_seconds
+
+    def _clamp(self, seconds: float) -> float:
+        return max(self.floor_seconds, min(self.ceiling_seconds, seconds))
+
+    @staticmethod
+    def _looks_complete(text: Optional[str]) -> bool:
+        if not text or not text.strip():
+            return False
+        return not _CONTINUATION_PATTERN.search(text.strip())
+
+    def _burst_window(self, stats: InterMessageGapStats) -> float:
+        if stats.mean_gap is None:
+            return self.default_seconds
+        return stats.mean_gap * self.GAP_MULTIPLIER
+
+    def window_for(
+        self, batch: List[Dict[str, Any]], stats: InterMessageGapStats
+    ) -> Tuple[float, str]:
+        """
+        Pick the debounce window for a batch whose latest message just arrived.
+
+        Returns:
+            Tuple of (window in seconds, reason label for metrics)
+        """
+        latest = batch[-1]
+        message_type = latest.get("type")
+
+        if message_type in MEDIA_MESSAGE_TYPES:
+            # Albums and voice notes arrive as separate deliveries
+            return self._clamp(self.media_seconds), f"media_{message_type}"
+
+        if not self._looks_complete(latest.get("text")):
+            return (
+                self._clamp(max(self.default_seconds, self._burst_window(stats))),
+                "incomplete_text",
+            )
+
+        if (
+            len(batch) == 1
+            and stats.follow_up_rate < self.SINGLE_MESSAGE_FOLLOW_UP_RATE
+        ):
+            return self.floor_seconds, "complete_text"
+
+        return self._clamp(self._burst_window(stats)), "burst"
+
+
+def create_debounce_policy() -> AdaptiveDebouncePolicy:
+    settings = get_settings()
+    return AdaptiveDebouncePolicy(
+        floor_seconds=settings.MESSAGE_DEBOUNCE_MIN_SECONDS,
+        ceiling_seconds=settings.MESSAGE_DEBOUNCE_MAX_SECONDS,
+        default_seconds=settings.MESSAGE_DEBOUNCE_SECONDS,
+        media_seconds=settings.MESSAGE_DEBOUNCE_MEDIA_SECONDS,
+    )
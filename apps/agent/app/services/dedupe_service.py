@@ -0,0 +1,226 @@
+"""
+Bounded, TTL-indexed deduplication for inbound WhatsApp traffic.
+
+Keys are hashed to 64-bit integers and tracked in a timer wheel: a ring of
+time buckets where each bucket holds the keys first seen during its slice of
+the TTL. Insert, lookup and expiry are all O(1) per key, memory is capped by
+`max_entries`, and an optional Redis backend lets several replicas share the
+same dedupe state.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import xxhash
+from upstash_redis.asyncio import Redis
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def compact_key(value: str) -> int:
+    """Hash a message ID or payload digest into a compact 64-bit integer."""
+    return xxhash.xxh3_64_intdigest(value.encode("utf-8"))
+
+
+class TimeBucketedDedupeStore:
+    """
+    In-process timer wheel of hashed keys.
+
+    A key inserted during tick `t` expires once the wheel reaches tick
+    `t + bucket_count`, i.e. after between `ttl` and `ttl + ttl / bucket_count`
+    seconds. When the store is full the oldest keys are evicted first.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        bucket_count: int = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bucket_count = bucket_count
+        self.bucket_width = ttl_seconds / bucket_count
+        self._clock = clock
+
+        self._buckets: List[Set[int]] = [set() for _ in range(bucket_count)]
+        self._index: Dict[int, int] = {}  # key -> tick it was inserted at
+        self._current_tick = self._tick_for(clock())
+        self.evicted = 0
+        self.expired = 0
+
+    def _tick_for(self, now: float) -> int:
+        return int(now / self.bucket_width)
+
+    def _advance(self) -> None:
+        """Expire every bucket the wheel has rotated past since the last call."""
+        target_tick = self._tick_for(self._clock())
+        if target_tick <= self._current_tick:
+            return
+
+        # Never touch more than one full rotation worth of buckets
+        start_tick = max(self._current_tick + 1, target_tick - self.bucket_count + 1)
+        for tick in range(start_tick, target_tick + 1):
+            bucket = self._buckets[tick % self.bucket_count]
+            if bucket:
+                for key in bucket:
+                    del self._index[key]
+                self.expired += len(bucket)
+                bucket.clear()
+        self._current_tick = target_tick
+
+    def _evict_oldest(self) -> None:
+        for offset in range(1, self.bucket_count + 1):
+            bucket = self._buckets[(self._current_tick + offset) % self.bucket_count]
+            if bucket:
+                del self._index[bucket.pop()]
+                self.evicted += 1
+                return
+
+    def contains(self, key: int) -> bool:
+        self._advance()
+        return key in self._index
+
+    def add(self, key: int) -> bool:
+        """Insert a key. Returns False if it was already present."""
+        self._advance()
+        if key in self._index:
+            return False
+
+        if len(self._index) >= self.max_entries:
+            self._evict_oldest()
+
+        self._buckets[self._current_tick % self.bucket_count].add(key)
+        self._index[key] = self._current_tick
+        return True
+
+    def __len__(self) -> int:
+        self._advance()
+        return len(self._index)
+
+
+class DedupeService:
+    """
+    Dedupe component with a local timer wheel and an optional shared backend.
+
+    The local store answers repeats without a network round-trip; when the
+    shared Redis backend is enabled, first sightings are claimed there with
+    `SET NX EX` so other replicas see them too. Backend errors fail open to
+    the local result.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: int,
+        max_entries: int,
+        redis: Optional[Redis] = None,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.local = TimeBucketedDedupeStore(
+            ttl_seconds=ttl_seconds, max_entries=max_entries
+        )
+        self.redis = redis
+
+    def _redis_key(self, key: int) -> str:
+        return f"dedupe:{self.name}:{key:016x}"
+
+    async def contains(self, value: str) -> bool:
+        """Check whether a value was seen within the TTL without recording it."""
+        key = compact_key(value)
+        if self.local.contains(key):
+            return True
+
+        if self.redis is not None:
+            try:
+                if await self.redis.exists(self._redis_key(key)):
+                    self.local.add(key)
+                    return True
+            except Exception as e:
+                logger.error(f"❌ DEDUPE[{self.name}]: Shared lookup failed: {str(e)}")
+        return False
+
+    async def add(self, value: str) -> None:
+        """Record a value as seen."""
+        key = compact_key(value)
+        self.local.add(key)
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._redis_key(key), "1", ex=self.ttl_seconds)
+            except Exception as e:
+                logger.error(f"❌ DEDUPE[{self.name}]: Shared insert failed: {str(e)}")
+
+    async def check_and_mark(self, value: str) -> bool:
+        """
+        Atomically record a value.
+
+        Returns:
+            bool: True if this is the first sighting, False if it is a duplicate
+        """
+        key = compact_key(value)
+        if not self.local.add(key):
+            return False
+
+        if self.redis is not None:
+            try:
+                claimed = await self.redis.set(
+                    self._redis_key(key), "1", nx=True, ex=self.ttl_seconds
+                )
+                return bool(claimed)
+            except Exception as e:
+                logger.error(f"❌ DEDUPE[{self.name}]: Shared claim failed: {str(e)}")
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self.local),
+            "max_entries": self.local.max_entries,
+            "expired": self.local.expired,
+            "evicted": self.local.evicted,
+            "shared_backend": self.redis is not None,
+        }
+
+
+def _create_shared_backend() -> Optional[Redis]:
+    settings = get_settings()
+    if settings.DEDUPE_BACKEND != "redis":
+        return None
+    return Redis(
+        url=settings.UPSTASH_REDIS_REST_URL,
+        token=settings.UPSTASH_REDIS_REST_TOKEN,
+    )
+
+
+_settings = get_settings()
+_shared_backend = _create_shared_backend()
+
+# Message IDs (wamid) already accepted for processing
+processed_message_dedupe = DedupeService(
+    name="messages",
+    ttl_seconds=_settings.DEDUPE_MESSAGE_TTL_SECONDS,
+    max_entries=_settings.DEDUPE_MESSAGE_MAX_ENTRIES,
+    redis=_shared_backend,
+)
+
+# Message IDs whose batch was processed and answered, so a replayed delivery
+# only reprocesses the messages that didn't complete
+completed_message_dedupe = DedupeService(
+    name="completed",
+    ttl_seconds=_settings.DEDUPE_MESSAGE_TTL_SECONDS,
+    max_entries=_settings.DEDUPE_MESSAGE_MAX_ENTRIES,
+    redis=_shared_backend,
+)
+
+# SHA-256 digests of raw webhook payloads, to drop Meta's rapid redeliveries
+webhook_request_dedupe = DedupeService(
+    name="webhooks",
+    ttl_seconds=_settings.DEDUPE_WEBHOOK_TTL_SECONDS,
+    max_entries=_settings.DEDUPE_WEBHOOK_MAX_ENTRIES,
+    redis=_shared_backend,
+)
@@ -0,0 +1,370 @@
+"""
+Gemini context caching for the agent prompts.
+
+Agent system prompts are a long static template followed by a short per-user
+block and the clock (see the prompt formatters). Gemini 2.5 models already
+cache repeated prefixes implicitly; on top of that, when explicit caching is
+enabled, each (model, template, tool set) is stored once as a `CachedContent`
+and requests reference it by name instead of resending the instructions and
+tool declarations. Cache usage reported by Gemini is tracked per graph node.
+
+Explicit caching hooks into private parts of langchain-google-genai (pinned
+in pyproject.toml). If the installed version no longer matches, it is
+disabled at startup and the agents use the plain model.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from google.ai.generativelanguage_v1beta import (
+    CacheServiceAsyncClient,
+    CachedContent,
+    Content,
+    Part,
+)
+from google.protobuf.duration_pb2 import Duration
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+try:
+    from langchain_google_genai._function_utils import (
+        convert_to_genai_function_declarations,
+    )
+except ImportError:  # Private module; checked by supports_context_caching
+    convert_to_genai_function_declarations = None
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.utils.prompt_cache import static_prompt_prefixes
+
+logger = logging.getLogger(__name__)
+
+# Refresh a cache this long before it expires, so requests never race expiry
+REFRESH_MARGIN_SECONDS = 120
+
+CacheKey = Tuple[str, str, Tuple[str, ...]]
+
+# Parameters of the private ChatGoogleGenerativeAI._prepare_request that
+# ContextCachingChatGoogleGenerativeAI overrides and passes through
+PREPARE_REQUEST_PARAMETERS = (
+    "messages",
+    "tools",
+    "functions",
+    "tool_config",
+    "tool_choice",
+    "cached_content",
+)
+
+
+def supports_context_caching() -> bool:
+    """Whether the installed langchain-google-genai has the private hooks we use."""
+    if convert_to_genai_function_declarations is None:
+        return False
+    prepare_request = getattr(ChatGoogleGenerativeAI, "_prepare_request", None)
+    if prepare_request is None:
+        return False
+    try:
+        parameters = inspect.signature(prepare_request).parameters
+    except (TypeError, ValueError):
+        return False
+    return all(name in parameters for name in PREPARE_REQUEST_PARAMETERS)
+
+
+@dataclass
+class ContextCacheEntry:
+    name: str
+    expires_at: float
+
+
+def _tool_name(tool: Any) -> str:
+    if isinstance(tool, dict):
+        return tool.get("name") or tool.get("function", {}).get("name", "")
+    return getattr(tool, "name", type(tool).__name__)
+
+
+class GeminiContextCache:
+    """
+    Explicit `CachedContent` per (model, static prompt prefix, tool set).
+
+    Lookups never block a request: a missing or expiring cache is created in
+    the background and the request goes out uncached in the meantime.
+    """
+
+    def __init__(self, api_key: str, ttl_seconds: int, retry_seconds: float):
+        self.api_key = api_key
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self._client: Optional[CacheServiceAsyncClient] = None
+        self._entries: Dict[CacheKey, ContextCacheEntry] = {}
+        self._pending: Dict[CacheKey, asyncio.Task] = {}
+        self._failed_at: Dict[CacheKey, float] = {}
+        self.created = 0
+        self.failed = 0
+
+    def _get_client(self) -> CacheServiceAsyncClient:
+        if self._client is None:
+            self._client = CacheServiceAsyncClient(
+                client_options={"api_key": self.api_key}
+            )
+        return self._client
+
+    def lookup(self, model: str, prefix: str, tools: Sequence[Any]) -> Optional[str]:
+        """Name of a live cache for this prompt prefix and tool set, if any."""
+        prefix_hash = hashlib.blake2b(prefix.encode(), digest_size=16).hexdigest()
+        key: CacheKey = (model, prefix_hash, tuple(_tool_name(t) for t in tools))
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at - now > REFRESH_MARGIN_SECONDS:
+            return entry.name
+
+        if key not in self._pending and (
+            now - self._failed_at.get(key, 0.0) >= self.retry_seconds
+        ):
+            try:
+                task = asyncio.get_running_loop().create_task(
+                    self._create(key, model, prefix, list(tools))
+                )
+            except RuntimeError:
+                pass  # Sync call outside the event loop; stay uncached
+            else:
+                self._pending[key] = task
+                task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        if entry is not None and entry.expires_at > now:
+            return entry.name
+        return None
+
+    async def _create(
+        self, key: CacheKey, model: str, prefix: str, tools: List[Any]
+    ) -> None:
+        cached_content = CachedContent(
+            model=model,
+            display_name=f"agent-prompt-{key[1][:12]}",
+            system_instruction=Content(parts=[Part(text=prefix)]),
+            ttl=Duration(seconds=self.ttl_seconds),
+        )
+        if tools:
+            cached_content.tools = [convert_to_genai_function_declarations(tools)]
+
+        try:
+            created = await self._get_client().create_cached_content(
+                cached_content=cached_content
+            )
+        except Exception as e:
+            self.failed += 1
+            self._failed_at[key] = time.time()
+            logger.warning(
+                f"⚠️ GEMINI CACHE: Failed to create context cache for {model}: {str(e)}"
+            )
+            return
+
+        # A replaced cache is left to expire; requests may still reference it
+        self._entries[key] = ContextCacheEntry(
+            name=created.name, expires_at=time.time() + self.ttl_seconds
+        )
+        self._failed_at.pop(key, None)
+        self.created += 1
+        logger.info(
+            f"🧊 GEMINI CACHE: Created {created.name} for {model} ({len(tools)} tools)"
+        )
+
+    async def _delete(self, name: str) -> None:
+        try:
+            await self._get_client().delete_cached_content(name=name)
+        except Exception as e:
+            logger.warning(f"⚠️ GEMINI CACHE: Failed to delete {name}: {str(e)}")
+
+    async def close(self):
+        """Delete our caches instead of paying for storage until they expire."""
+        for task in list(self._pending.values()):
+            task.cancel()
+        await asyncio.gather(*self._pending.values(), return_exceptions=True)
+        for entry in list(self._entries.values()):
+            await self._delete(entry.name)
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        return {
+            "live": sum(1 for e in self._entries.values() if e.expires_at > now),
+            "pending": len(self._pending),
+            "created": self.created,
+            "failed": self.failed,
+        }
+
+
+class ContextCachingChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+    """
+    Gemini chat model that serves the static part of the system prompt and the
+    tool declarations from an explicit context cache when one is available.
+
+    Gemini rejects requests that set `cached_content` together with a system
+    instruction or tools, so those are stripped from cached requests and the
+    per-user remainder of the system prompt is sent as the first user turn.
+    """
+
+    context_cache: Optional[Any] = None
+
+    def _prepare_request(
+        self,
+        messages: List[BaseMessage],
+        *,
+        tools: Optional[Sequence[Any]] = None,
+        tool_choice: Optional[Any] = None,
+        tool_config: Optional[Any] = None,
+        cached_content: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        if (
+            self.context_cache is not None
+            and cached_content is None
+            and tool_choice is None
+            and tool_config is None
+            and messages
+            and isinstance(messages[0], SystemMessage)
+            and isinstance(messages[0].content, str)
+        ):
+            system_prompt = messages[0].content
+            prefix = static_prompt_prefixes.match(system_prompt)
+            name = (
+                self.context_cache.lookup(self.model, prefix, tools or [])
+                if prefix is not None
+                else None
+            )
+            if name is not None:
+                kwargs.pop("functions", None)
+                messages = [HumanMessage(content=system_prompt[len(prefix) :])] + list(
+                    messages[1:]
+                )
+                return super()._prepare_request(messages, cached_content=name, **kwargs)
+
+        return super()._prepare_request(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            tool_config=tool_config,
+            cached_content=cached_content,
+            **kwargs,
+        )
+
+
+class CacheUsageTracker:
+    """Prompt cache hit rate and cached input tokens per (tier, graph node)."""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def record(self, tier: str, node: str, input_tokens: int, cached_tokens: int):
+        stats = self._stats.setdefault(
+            (tier, node),
+            {"calls": 0, "cache_hits": 0, "input_tokens": 0, "cached_tokens": 0},
+        )
+        stats["calls"] += 1
+        stats["cache_hits"] += 1 if cached_tokens else 0
+        stats["input_tokens"] += input_tokens
+        stats["cached_tokens"] += cached_tokens
+
+        labels = {"tier": tier, "node": node}
+        metrics.increment("llm_calls", labels=labels)
+        metrics.increment("llm_input_tokens", input_tokens, labels=labels)
+        if cached_tokens:
+            metrics.increment("llm_cache_hits", labels=labels)
+            metrics.increment("llm_cached_input_tokens", cached_tokens, labels=labels)
+
+    def callback(self, tier: str) -> "CacheUsageCallback":
+        return CacheUsageCallback(self, tier)
+
+    def get_stats(self) -> dict:
+        return {
+            f"{tier}/{node}": {
+                **stats,
+                "hit_rate": round(stats["cache_hits"] / stats["calls"], 3),
+                "cached_token_ratio": round(
+                    stats["cached_tokens"] / max(stats["input_tokens"], 1), 3
+                ),
+            }
+            for (tier, node), stats in sorted(self._stats.items())
+        }
+
+
+class CacheUsageCallback(BaseCallbackHandler):
+    """Reads Gemini usage metadata off every model call of a graph."""
+
+    run_inline = True
+
+    def __init__(self, tracker: CacheUsageTracker, tier: str):
+        self.tracker = tracker
+        self.tier = tier
+        self._nodes: Dict[UUID, str] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        # The outermost namespace segment is the agent node in the parent graph
+        checkpoint_ns = metadata.get("langgraph_checkpoint_ns") or ""
+        node = checkpoint_ns.split("|")[0].split(":")[0]
+        self._nodes[run_id] = node or metadata.get("langgraph_node") or "unknown"
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        node = self._nodes.pop(run_id, "unknown")
+        generation = response.generations[0][0] if response.generations else None
+        if not isinstance(generation, ChatGeneration):
+            return
+        usage = getattr(generation.message, "usage_metadata", None)
+        if not usage:
+            return
+        cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        self.tracker.record(
+            self.tier, node, usage.get("input_tokens", 0), cached_tokens or 0
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._nodes.pop(run_id, None)
+
+
+def create_gemini_context_cache() -> Optional[GeminiContextCache]:
+    settings = get_settings()
+    if not settings.GEMINI_CONTEXT_CACHE_ENABLED:
+        return None
+    if not supports_context_caching():
+        logger.warning(
+            "⚠️ GEMINI CACHE: Installed langchain-google-genai doesn't match the "
+            "private _prepare_request hook, explicit context caching is disabled"
+        )
+        return None
+    return GeminiContextCache(
+        api_key=settings.GOOGLE_API_KEY,
+        ttl_seconds=settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+        retry_seconds=settings.GEMINI_CONTEXT_CACHE_RETRY_SECONDS,
+    )
+
+
+# Create singleton instances
+gemini_context_cache = create_gemini_context_cache()
+cache_usage_tracker = CacheUsageTracker()
+
+
+def create_chat_model(tier: str, **kwargs: Any) -> ChatGoogleGenerativeAI:
+    """Gemini chat model for an agent tier, with context caching if available."""
+    callbacks = [cache_usage_tracker.callback(tier)]
+    if gemini_context_cache is None:
+        return ChatGoogleGenerativeAI(callbacks=callbacks, **kwargs)
+    return ContextCachingChatGoogleGenerativeAI(
+        context_cache=gemini_context_cache, callbacks=callbacks, **kwargs
+    )
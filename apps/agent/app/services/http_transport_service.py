@@ -0,0 +1,150 @@
+"""
+Shared, long-lived HTTP clients for outbound calls.
+
+Creating an `httpx.AsyncClient` per request pays a TCP + TLS handshake on every
+hop. The transport manager keeps one pooled client per upstream (WhatsApp
+Graph API, main API, ...) with its own limits and timeouts, so connections are
+reused across requests. Clients are created at startup, closed on shutdown,
+and expose pool statistics for monitoring.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict
+
+import httpx
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ClientProfile:
+    """Connection tuning for one upstream."""
+
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 5.0
+    max_connections: int = 50
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HTTPTransportManager:
+    """Owns the process-wide pooled HTTP clients, one per named upstream."""
+
+    WHATSAPP = "whatsapp"
+    MAIN_API = "main_api"
+    OPENAI = "openai"
+    DEFAULT = "default"
+
+    def __init__(self):
+        settings = get_settings()
+        self.profiles: Dict[str, ClientProfile] = {
+            # Messages, read receipts and media downloads (graph.facebook.com)
+            self.WHATSAPP: ClientProfile(
+                read_timeout=settings.HTTP_WHATSAPP_TIMEOUT_SECONDS,
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+            ),
+            # Backend tools API, called several times per conversation turn
+            self.MAIN_API: ClientProfile(
+                read_timeout=settings.HTTP_MAIN_API_TIMEOUT_SECONDS,
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+            ),
+            # Audio transcription uploads
+            self.OPENAI: ClientProfile(
+                read_timeout=settings.TRANSCRIPTION_TIMEOUT_SECONDS,
+                max_connections=settings.TRANSCRIPTION_MAX_CONCURRENCY * 2,
+            ),
+            self.DEFAULT: ClientProfile(),
+        }
+        self.http2 = settings.HTTP_ENABLE_HTTP2
+        if self.http2 and not _http2_available():
+            logger.warning(
+                "⚠️ HTTP: HTTP_ENABLE_HTTP2 is set but the 'h2' package is not installed, using HTTP/1.1"
+            )
+            self.http2 = False
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _create_client(self, name: str) -> httpx.AsyncClient:
+        profile = self.profiles.get(name, self.profiles[self.DEFAULT])
+
+        async def record_response(response: httpx.Response):
+            metrics.increment(
+                "http_client_responses",
+                labels={"client": name, "status": f"{response.status_code // 100}xx"},
+            )
+
+        return httpx.AsyncClient(
+            http2=self.http2,
+            timeout=httpx.Timeout(
+                connect=profile.connect_timeout,
+                read=profile.read_timeout,
+                write=profile.write_timeout,
+                pool=profile.pool_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=profile.max_connections,
+                max_keepalive_connections=profile.max_keepalive_connections,
+                keepalive_expiry=profile.keepalive_expiry,
+            ),
+            event_hooks={"response": [record_response]},
+        )
+
+    def get_client(self, name: str = DEFAULT) -> httpx.AsyncClient:
+        """Return the shared client for an upstream, creating it on first use."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create_client(name)
+        return client
+
+    async def start(self):
+        """Create the clients up front so the first requests don't pay for it."""
+        for name in self.profiles:
+            self.get_client(name)
+        logger.info(
+            f"🌐 HTTP: Transport started with clients {list(self._clients)} (http2: {self.http2})"
+        )
+
+    async def close(self):
+        """Close every client and its pooled connections."""
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"❌ HTTP: Error closing client '{name}': {str(e)}")
+        self._clients.clear()
+        logger.info("🛑 HTTP: Transport closed")
+
+    def get_stats(self) -> dict:
+        """Connection pool statistics per client."""
+        stats = {}
+        for name, client in self._clients.items():
+            # httpx doesn't expose the pool publicly; read it defensively
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+            stats[name] = {
+                "closed": client.is_closed,
+                "connections": len(connections),
+                "idle": sum(1 for c in connections if c.is_idle()),
+                "http2": self.http2,
+                "max_connections": self.profiles.get(
+                    name, self.profiles[self.DEFAULT]
+                ).max_connections,
+            }
+        return stats
+
+
+# Create a singleton instance
+http_transport = HTTPTransportManager()
@@ -0,0 +1,456 @@
+"""
+Durable ingress queue for WhatsApp webhook deliveries.
+
+Webhook payloads are appended to a local SQLite queue before we ACK Meta, and a
+bounded pool of workers drains the queue. A job is only acknowledged once the
+work it started has completed (including the debounced batch it ended up in),
+so a restart or crash replays in-flight deliveries instead of dropping them.
+
+Features:
+- At-least-once delivery with leases and replay on startup; leases are renewed
+  while a job is being worked on, so a long turn is never claimed twice
+- Bounded worker pool, and a bound on jobs awaiting their downstream work
+- Exponential retry backoff and a dead-letter table
+- Queue-depth backpressure
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class IngressQueueFullError(Exception):
+    """Raised when the ingress queue is at its configured maximum depth."""
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job can't help; it is dead-lettered at once."""
+
+
+@dataclass
+class IngressJob:
+    id: int
+    payload: Dict[str, Any]
+    attempts: int
+
+    @property
+    def is_redelivery(self) -> bool:
+        return self.attempts > 1
+
+
+# A handler may return an awaitable that resolves once the job's downstream work
+# has finished; the job is acknowledged only after it completes.
+IngressJobHandler = Callable[[IngressJob], Awaitable[Optional[Awaitable[Any]]]]
+# Called once a job has been moved to the dead-letter table
+DeadLetterHandler = Callable[[IngressJob, Exception], Awaitable[None]]
+
+
+class IngressQueueService:
+    """
+    SQLite-backed work queue between the webhook ACK and message processing.
+
+    All SQLite access goes through a single connection guarded by a lock and is
+    executed in a worker thread, so the event loop never blocks on disk I/O.
+    """
+
+    POLL_INTERVAL_SECONDS = 1.0
+    MAX_BACKOFF_SECONDS = 60.0
+
+    def __init__(self):
+        settings = get_settings()
+        self.path = settings.INGRESS_QUEUE_PATH
+        self.worker_count = settings.INGRESS_QUEUE_WORKERS
+        self.max_depth = settings.INGRESS_QUEUE_MAX_DEPTH
+        self.max_attempts = settings.INGRESS_QUEUE_MAX_ATTEMPTS
+        self.max_awaiting_completion = settings.INGRESS_QUEUE_MAX_AWAITING_COMPLETION
+        self.visibility_timeout = settings.INGRESS_QUEUE_VISIBILITY_TIMEOUT_SECONDS
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._handler: Optional[IngressJobHandler] = None
+        self._on_dead_letter: Optional[DeadLetterHandler] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending_acks: set[asyncio.Task] = set()
+        # Held by every claimed job until it is acknowledged or failed
+        self._slots = asyncio.Semaphore(self.max_awaiting_completion)
+        self._wakeup = asyncio.Event()
+        self._depth = 0
+        self._is_started = False
+
+    # ------------------------------------------------------------------
+    # SQLite helpers (run in a thread)
+    # ------------------------------------------------------------------
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingress_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_expires_at REAL,
+                created_at REAL NOT NULL,
+                last_error TEXT
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ingress_jobs_ready_idx "
+            "ON ingress_jobs (status, available_at, id)"
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingress_dead_letters (
+                id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                failed_at REAL NOT NULL,
+                last_error TEXT
+            )
+            """
+        )
+        self._conn = conn
+
+    def _recover(self) -> tuple[int, int]:
+        """Return jobs left in-flight by a previous process to the pending state."""
+        with self._db_lock:
+            assert self._conn is not None
+            cursor = self._conn.execute(
+                "UPDATE ingress_jobs SET status = 'pending', lease_expires_at = NULL, "
+                "available_at = ? WHERE status = 'processing'",
+                (time.time(),),
+            )
+            recovered = cursor.rowcount
+            (depth,) = self._conn.execute(
+                "SELECT COUNT(*) FROM ingress_jobs"
+            ).fetchone()
+            return recovered, depth
+
+    def _insert(self, payload: str) -> int:
+        now = time.time()
+        with self._db_lock:
+            assert self._conn is not None
+            cursor = self._conn.execute(
+                "INSERT INTO ingress_jobs (payload, available_at, created_at) "
+                "VALUES (?, ?, ?)",
+                (payload, now, now),
+            )
+            return int(cursor.lastrowid)
+
+    def _claim_one(self) -> Optional[IngressJob]:
+        now = time.time()
+        with self._db_lock:
+            assert self._conn is not None
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, payload, attempts FROM ingress_jobs "
+                    "WHERE (status = 'pending' AND available_at <= ?) "
+                    "OR (status = 'processing' AND lease_expires_at <= ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                job_id, payload, attempts = row
+                self._conn.execute(
+                    "UPDATE ingress_jobs SET status = 'processing', "
+                    "attempts = attempts + 1, lease_expires_at = ? WHERE id = ?",
+                    (now + self.visibility_timeout, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return IngressJob(id=job_id, payload=json.loads(payload), attempts=attempts + 1)
+
+    def _extend_lease(self, job_id: int) -> None:
+        with self._db_lock:
+            assert self._conn is not None
+            self._conn.execute(
+                "UPDATE ingress_jobs SET lease_expires_at = ? "
+                "WHERE id = ? AND status = 'processing'",
+                (time.time() + self.visibility_timeout, job_id),
+            )
+
+    def _delete(self, job_id: int) -> int:
+        with self._db_lock:
+            assert self._conn is not None
+            return self._conn.execute(
+                "DELETE FROM ingress_jobs WHERE id = ?", (job_id,)
+            ).rowcount
+
+    def _retry_later(self, job_id: int, delay: float, error: str) -> None:
+        with self._db_lock:
+            assert self._conn is not None
+            self._conn.execute(
+                "UPDATE ingress_jobs SET status = 'pending', lease_expires_at = NULL, "
+                "available_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, job_id),
+            )
+
+    def _dead_letter(self, job_id: int, error: str) -> int:
+        with self._db_lock:
+            assert self._conn is not None
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ingress_dead_letters "
+                    "(id, payload, attempts, created_at, failed_at, last_error) "
+                    "SELECT id, payload, attempts, created_at, ?, ? "
+                    "FROM ingress_jobs WHERE id = ?",
+                    (time.time(), error, job_id),
+                )
+                deleted = self._conn.execute(
+                    "DELETE FROM ingress_jobs WHERE id = ?", (job_id,)
+                ).rowcount
+                self._conn.execute("COMMIT")
+                return deleted
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _count_dead_letters(self) -> int:
+        with self._db_lock:
+            assert self._conn is not None
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM ingress_dead_letters"
+            ).fetchone()[0]
+
+    def _close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def start(
+        self,
+        handler: IngressJobHandler,
+        on_dead_letter: Optional[DeadLetterHandler] = None,
+    ):
+        """Open the queue, replay unacknowledged jobs and start the worker pool."""
+        if self._is_started:
+            return
+
+        self._handler = handler
+        self._on_dead_letter = on_dead_letter
+        await asyncio.to_thread(self._open)
+        recovered, self._depth = await asyncio.to_thread(self._recover)
+        if recovered:
+            logger.warning(
+                f"♻️ INGRESS: Replaying {recovered} unacknowledged job(s) from previous run"
+            )
+
+        self._workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.worker_count)
+        ]
+        self._is_started = True
+        self._wakeup.set()
+        logger.info(
+            f"🚀 INGRESS: Queue started at {self.path} with {self.worker_count} workers "
+            f"(depth: {self._depth}, max depth: {self.max_depth})"
+        )
+
+    async def stop(self):
+        """Stop the workers. Unacknowledged jobs stay in the queue for the next run."""
+        if not self._is_started:
+            return
+
+        for task in [*self._workers, *self._pending_acks]:
+            task.cancel()
+        await asyncio.gather(
+            *self._workers, *self._pending_acks, return_exceptions=True
+        )
+        self._workers = []
+        self._pending_acks.clear()
+
+        await asyncio.to_thread(self._close)
+        self._is_started = False
+        logger.info(f"🛑 INGRESS: Queue stopped with {self._depth} job(s) outstanding")
+
+    async def enqueue(self, payload: Dict[str, Any]) -> int:
+        """
+        Durably append a job to the queue.
+
+        Raises:
+            IngressQueueFullError: If the queue has reached its maximum depth
+        """
+        if not self._is_started:
+            raise RuntimeError("Ingress queue is not started")
+
+        if self._depth >= self.max_depth:
+            raise IngressQueueFullError(
+                f"Ingress queue is full ({self._depth}/{self.max_depth} jobs)"
+            )
+
+        job_id = await asyncio.to_thread(self._insert, json.dumps(payload))
+        self._depth += 1
+        self._wakeup.set()
+        return job_id
+
+    async def get_stats(self) -> dict:
+        """Get queue statistics for monitoring."""
+        dead_letters = (
+            await asyncio.to_thread(self._count_dead_letters) if self._is_started else 0
+        )
+        return {
+            "depth": self._depth,
+            "max_depth": self.max_depth,
+            "workers": len(self._workers),
+            "awaiting_completion": len(self._pending_acks),
+            "max_awaiting_completion": self.max_awaiting_completion,
+            "dead_letters": dead_letters,
+        }
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                # Backpressure: don't claim more work while too many jobs are
+                # still waiting for their batches
+                await self._slots.acquire()
+                self._wakeup.clear()
+                try:
+                    job = await asyncio.to_thread(self._claim_one)
+                except BaseException:
+                    self._slots.release()
+                    raise
+                if job is None:
+                    self._slots.release()
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), timeout=self.POLL_INTERVAL_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                # Other workers may have more to claim
+                self._wakeup.set()
+                await self._run_job(job)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ INGRESS: Worker {worker_id} error: {str(e)}")
+                await asyncio.sleep(self.POLL_INTERVAL_SECONDS)
+
+    async def _run_job(self, job: IngressJob):
+        """Run the handler; the job's slot is released here unless it is handed off."""
+        assert self._handler is not None
+        heartbeat = asyncio.create_task(self._keep_leased(job))
+        handed_off = False
+        try:
+            try:
+                completion = await self._handler(job)
+            except asyncio.CancelledError:
+                heartbeat.cancel()
+                raise
+            except Exception as e:
+                heartbeat.cancel()
+                await self._fail(job, e)
+                return
+
+            if completion is None:
+                heartbeat.cancel()
+                await self._ack(job)
+                return
+
+            # Free the worker while the downstream work (debounce + LLM) finishes
+            task = asyncio.create_task(self._ack_when_done(job, completion, heartbeat))
+            self._pending_acks.add(task)
+            task.add_done_callback(self._pending_acks.discard)
+            handed_off = True
+        finally:
+            if not handed_off:
+                self._slots.release()
+
+    async def _keep_leased(self, job: IngressJob):
+        """Renew the job's lease until cancelled, so no other worker reclaims it."""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await asyncio.to_thread(self._extend_lease, job.id)
+            except Exception as e:
+                logger.warning(
+                    f"⚠️ INGRESS: Failed to extend the lease of job {job.id}: {str(e)}"
+                )
+
+    async def _ack_when_done(
+        self, job: IngressJob, completion: Awaitable[Any], heartbeat: asyncio.Task
+    ):
+        try:
+            try:
+                try:
+                    await completion
+                finally:
+                    heartbeat.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._fail(job, e)
+                return
+            await self._ack(job)
+        finally:
+            self._slots.release()
+
+    async def _ack(self, job: IngressJob):
+        deleted = await asyncio.to_thread(self._delete, job.id)
+        self._depth = max(0, self._depth - deleted)
+
+    async def _fail(self, job: IngressJob, error: Exception):
+        if job.attempts >= self.max_attempts or isinstance(error, PermanentJobError):
+            logger.error(
+                f"☠️ INGRESS: Job {job.id} failed {job.attempts} time(s), moving to dead-letter: {str(error)}"
+            )
+            deleted = await asyncio.to_thread(self._dead_letter, job.id, str(error))
+            self._depth = max(0, self._depth - deleted)
+            if self._on_dead_letter is not None:
+                try:
+                    await self._on_dead_letter(job, error)
+                except Exception as e:
+                    logger.error(
+                        f"❌ INGRESS: Dead-letter handler failed for job {job.id}: {str(e)}"
+                    )
+            return
+
+        delay = min(self.MAX_BACKOFF_SECONDS, 2 ** (job.attempts - 1))
+        logger.warning(
+            f"🔁 INGRESS: Job {job.id} attempt {job.attempts} failed, retrying in {delay}s: {str(error)}"
+        )
+        await asyncio.to_thread(self._retry_later, job.id, delay, str(error))
+
+
+# Create a singleton instance
+ingress_queue_service = IngressQueueService()
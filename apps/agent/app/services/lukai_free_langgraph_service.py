@@ -3,15 +3,18 @@ Simplified LangGraph service for free users (≤31 days without subscription).
 This service provides basic expense tracking functionality with limited tools.
 """
 
+import asyncio
 import logging
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import create_react_agent
 from app.core.config import get_settings
 
+from app.services.conversation_window import create_conversation_window
+from app.services.gemini_cache_service import create_chat_model
 from app.services.main_api_service import UserData
 from app.services.lukai_free_prompt_formatter import LukaiFreePromptFormatter
 from app.services.postgres_checkpointer_service import get_postgres_checkpointer_service
@@ -19,6 +22,8 @@ from app.services.postgres_checkpointer_service import get_postgres_checkpointer
 # Import tools and state from the main tools file
 from app.services.apolo_langgraph_tools import (
     ApoloState,
+    state_prompt,
+    user_config,
     register_expenses_tool,
     call_customer_support_tool,
 )
@@ -26,13 +31,17 @@ from app.services.apolo_langgraph_tools import (
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Free agent prompt variants, one compiled agent each
+LANGUAGE_VARIANTS = ("es", "en", "multilingual")
+
 
 class LukaiFreeLangugraphService:
     def __init__(self):
         settings = get_settings()
 
         self.prompt_formatter = LukaiFreePromptFormatter()
-        self.model = ChatGoogleGenerativeAI(
+        self.model = create_chat_model(
+            "free",
             model="gemini-2.5-flash-lite-preview-06-17",
             temperature=0,
             api_key=settings.GOOGLE_API_KEY,
@@ -41,12 +50,24 @@ class LukaiFreeLangugraphService:
         # Initialize PostgreSQL checkpointer (same as full service)
         self.checkpointer = None  # Will be initialized lazily
 
+        # Compiled agents keyed by prompt language. Prompts are rendered at run
+        # time from the user in the run config (see `user_config`), so agents
+        # are shared by users.
+        self._agents: Dict[str, CompiledStateGraph] = {}
+        self._agents_lock = asyncio.Lock()
+
         # Limited tools for free users
         self.tools = {
             "register_expenses": register_expenses_tool,
             "call_customer_support": call_customer_support_tool,
         }
 
+        # Token budget for the model input
+        self.conversation_window = create_conversation_window("free")
+
+        # Only "step" durability persists the intermediate super-steps of a turn
+        self.checkpoint_during = settings.CHECKPOINT_DURABILITY == "step"
+
         logger.info("🆓 LukaiFreeLangugraphService initialized with limited tools")
 
     async def _get_checkpointer(self):
@@ -57,24 +78,23 @@ class LukaiFreeLangugraphService:
             logger.info("📦 PostgreSQL checkpointer initialized for free service")
         return self.checkpointer
 
-    async def create_free_agent(self, user: UserData):
+    def _prompt_formatter_for(self, language: str) -> Callable[[UserData], str]:
+        if language == "es":
+            return self.prompt_formatter.format_spanish_free_agent_prompt
+        if language == "en":
+            return self.prompt_formatter.format_english_free_agent_prompt
+        return self.prompt_formatter.format_multilingual_free_agent_prompt
+
+    @staticmethod
+    def _language_key(user: UserData) -> str:
+        """Language variant of the free agent prompt for a user"""
+        if user.favorite_language in ("es", "en"):
+            return user.favorite_language
+        return "multilingual"
+
+    async def create_free_agent(self, language: str) -> CompiledStateGraph:
         """Create a simple single-agent graph for free users"""
 
-        # Select prompt based on user's favorite language (same logic as full service)
-        if user.favorite_language == "es":
-            agent_prompt = self.prompt_formatter.format_spanish_free_agent_prompt(user)
-            logger.info(f"🇪🇸 Using Spanish prompt for free user {user.phone_number}")
-        elif user.favorite_language == "en":
-            agent_prompt = self.prompt_formatter.format_english_free_agent_prompt(user)
-            logger.info(f"🇺🇸 Using English prompt for free user {user.phone_number}")
-        else:
-            agent_prompt = self.prompt_formatter.format_multilingual_free_agent_prompt(
-                user
-            )
-            logger.info(
-                f"🌍 Using multilingual prompt for free user {user.phone_number}"
-            )
-
         # Get memory checkpointer (async)
         checkpointer = await self._get_checkpointer()
 
@@ -85,14 +105,43 @@ class LukaiFreeLangugraphService:
                 self.tools["register_expenses"],
                 self.tools["call_customer_support"],
             ],
-            prompt=agent_prompt,
+            pre_model_hook=self.conversation_window.apply,
+            prompt=state_prompt(
+                self._prompt_formatter_for(language), self.conversation_window
+            ),
             state_schema=ApoloState,
             checkpointer=checkpointer,
         )
 
-        logger.info(f"🤖 Free agent created successfully for user {user.phone_number}")
+        logger.info(f"🤖 Free agent compiled for language '{language}'")
         return free_agent
 
+    async def get_free_agent(self, language: str) -> CompiledStateGraph:
+        """Return the compiled free agent for a language variant, building it once"""
+        agent = self._agents.get(language)
+        if agent is not None:
+            return agent
+
+        async with self._agents_lock:
+            agent = self._agents.get(language)
+            if agent is None:
+                agent = self._agents[language] = await self.create_free_agent(language)
+        return agent
+
+    async def warm_up(self):
+        """Compile every agent variant up front so no message pays for it"""
+        for language in LANGUAGE_VARIANTS:
+            await self.get_free_agent(language)
+
+    async def prefetch_conversation(
+        self, user_data: UserData, thread_id: Optional[str] = None
+    ):
+        """Warm the checkpointer, compiled agent and latest checkpoint for a thread"""
+        thread_id = thread_id or f"free_user_{user_data.phone_number}"
+        checkpointer = await self._get_checkpointer()
+        checkpointer.prefetch(thread_id)
+        await self.get_free_agent(self._language_key(user_data))
+
     async def process_query(
         self, query: str, user_data: UserData, thread_id: Optional[str] = None
     ) -> str:
@@ -100,30 +149,28 @@ class LukaiFreeLangugraphService:
 
         logger.info(f"🚀 Processing query for free user {user_data.phone_number}")
 
-        # Create the agent for this user
-        agent = await self.create_free_agent(user_data)
+        agent = await self.get_free_agent(self._language_key(user_data))
 
         # Prepare initial state
         initial_state = {
             "messages": [{"role": "user", "content": query}],
-            "user_data": user_data,
             "last_active_agent": "free_agent",
             "remaining_steps": 25,
         }
 
-        # Configuration for checkpointing
-        config: RunnableConfig = {
-            "configurable": {
-                "thread_id": thread_id or f"free_user_{user_data.phone_number}"
-            }
-        }
+        # Configuration for checkpointing; the user travels with the run, not the state
+        config = user_config(
+            thread_id or f"free_user_{user_data.phone_number}", user_data
+        )
 
         logger.info(
             f"📤 Invoking free agent for thread {config['configurable']['thread_id']}"
         )
 
         # Invoke the agent
-        result = await agent.ainvoke(initial_state, config=config)
+        result = await agent.ainvoke(
+            initial_state, config=config, checkpoint_during=self.checkpoint_during
+        )
 
         # Return the final message content
         if result["messages"]:
@@ -139,39 +186,47 @@ class LukaiFreeLangugraphService:
         current_message: str,
         user_data: UserData,
         thread_id: Optional[str] = None,
+        resume: bool = False,
     ) -> str:
-        """Process a new message using the simple free user agent with automatic conversation memory"""
+        """Process a new message using the simple free user agent with automatic conversation memory
+
+        With `resume=True` the message is not sent again: the agent continues
+        the thread's interrupted run from its last checkpoint (see `can_resume`).
+        """
 
         logger.info(
             f"🚀 Starting Free LangGraph conversation processing for user {user_data.phone_number}"
         )
 
-        # Create the agent for this user
-        agent = await self.create_free_agent(user_data)
-        logger.info(f"📊 Free agent created successfully with {len(self.tools)} tools")
+        thread_id = thread_id or f"free_user_{user_data.phone_number}"
+
+        agent = await self.get_free_agent(self._language_key(user_data))
+        logger.info(f"📊 Free agent ready with {len(self.tools)} tools")
 
         # Prepare initial state with only the new message
         # LangGraph will automatically load previous conversation state via thread_id
         initial_state = {
             "messages": [{"role": "user", "content": current_message}],
-            "user_data": user_data,
             "last_active_agent": "free_agent",
             "remaining_steps": 25,
         }
 
-        # Configuration for checkpointing - this is where LangGraph manages conversation memory
-        config: RunnableConfig = {
-            "configurable": {
-                "thread_id": thread_id or f"free_user_{user_data.phone_number}"
-            }
-        }
+        # Configuration for checkpointing - this is where LangGraph manages conversation memory.
+        # The user is a per-run input, so checkpoints only hold conversation data
+        config = user_config(thread_id, user_data)
 
         logger.info(
             f"📤 Invoking free agent with new message for thread {config['configurable']['thread_id']}"
         )
 
         # Invoke the agent - LangGraph automatically handles conversation continuity
-        result = await agent.ainvoke(initial_state, config=config)
+        if resume:
+            logger.info(f"⏯️ Resuming interrupted free agent run for thread {thread_id}")
+        result = await agent.ainvoke(
+            None if resume else initial_state,
+            config=config,
+            checkpoint_during=self.checkpoint_during,
+        )
 
         logger.info(
             f"📥 Free agent execution completed. Result messages: {len(result.get('messages', []))}"
@@ -195,24 +250,46 @@ class LukaiFreeLangugraphService:
 
         return "I apologize, but I couldn't process your request. Please try again."
 
+    async def can_resume(
+        self, current_message: str, user_data: UserData, thread_id: Optional[str] = None
+    ) -> bool:
+        """Whether the thread's last run stopped before answering `current_message`, so it can be resumed."""
+        agent = await self.get_free_agent(self._language_key(user_data))
+        config: RunnableConfig = {
+            "configurable": {
+                "thread_id": thread_id or f"free_user_{user_data.phone_number}"
+            }
+        }
+        snapshot = await agent.aget_state(config)
+        if not snapshot.next:
+            return False
+        # Only resume the run started for this message, never an older one
+        user_messages = [
+            m
+            for m in snapshot.values.get("messages", [])
+            if isinstance(m, HumanMessage)
+        ]
+        return bool(user_messages) and user_messages[-1].content == current_message
+
     async def get_conversation_history(self, thread_id: str) -> List[BaseMessage]:
-        """Get conversation history for a specific thread"""
+        """Get the full message history of a thread, oldest first"""
         try:
-            # For now, return empty list since LangGraph manages this internally
-            # This method can be enhanced later if needed for debugging/audit purposes
-            logger.info(f"📋 Conversation history requested for thread {thread_id}")
-            return []
+            postgres_service = await get_postgres_checkpointer_service()
+            history = await postgres_service.get_thread_messages(thread_id)
+            logger.info(
+                f"📋 Loaded {history['total']} messages of conversation history for thread {thread_id}"
+            )
+            return history["messages"]
         except Exception as e:
             logger.error(f"❌ Error getting conversation history: {str(e)}")
-            pass
         return []
 
     async def clear_conversation_history(self, thread_id: str) -> bool:
-        """Clear conversation history for a specific thread"""
+        """Permanently delete a thread's checkpoints, blobs and pending writes"""
         try:
-            # Use checkpointer's delete functionality if available
-            # For now, we'll rely on automatic cleanup
-            logger.info(f"🗑️ Clearing conversation history for thread {thread_id}")
+            postgres_service = await get_postgres_checkpointer_service()
+            await postgres_service.delete_threads([thread_id])
+            logger.info(f"🗑️ Cleared conversation history for thread {thread_id}")
             return True
         except Exception as e:
             logger.error(f"❌ Error clearing conversation history: {str(e)}")
@@ -2,9 +2,24 @@ import pytz
 from datetime import datetime
 
 from app.services.main_api_service import UserData
+from app.utils.prompt_cache import PromptCache, fingerprint, static_prompt_prefixes
+
+# UserData fields rendered into the user context
+USER_CONTEXT_FIELDS = (
+    "name",
+    "phone_number",
+    "favorite_language",
+    "favorite_currency_code",
+    "favorite_locale",
+    "favorite_timezone",
+    "expense_categories",
+)
 
 
 class LukaiFreePromptFormatter:
+    # Rendered template + user data
+    _prompt_cache = PromptCache()
+
     @staticmethod
     def _format_categories(categories) -> str:
         if not categories:
@@ -22,11 +37,8 @@ class LukaiFreePromptFormatter:
 
     @staticmethod
     def _format_user_context(user: UserData) -> str:
-        current_time = LukaiFreePromptFormatter._get_current_time(user)
-
         return f"""
 User Context:
-- Current time in {user.favorite_timezone or 'N/A'}: {current_time}
 - Name: {user.name or 'N/A'}
 - Phone: {user.phone_number}
 - Preferred Language: {user.favorite_language or 'N/A'}
@@ -34,14 +46,33 @@ User Context:
 - Locale: {user.favorite_locale or 'N/A'}
 - Financial Account: PERSONAL (default)
 - Subscription: Free Plan (LukAI)
+
+Expense Categories:
+{LukaiFreePromptFormatter._format_categories(user.expense_categories)}
 """
 
     @classmethod
-    def format_english_free_agent_prompt(cls, user: UserData) -> str:
-        expense_categories = cls._format_categories(user.expense_categories)
-        user_context = cls._format_user_context(user)
+    def _format_clock(cls, user: UserData) -> str:
+        return f"\nCurrent time in {user.favorite_timezone or 'N/A'}: {cls._get_current_time(user)}\n"
 
-        return f"""
+    @classmethod
+    def _render_prompt(cls, template: str, user: UserData) -> str:
+        """
+        Static template (registered for provider-side context caching), then the
+        user's data (memoised by a fingerprint of the fields it is rendered
+        from), then the clock.
+        """
+
+        def render() -> str:
+            static_prompt_prefixes.add(template)
+            return template + cls._format_user_context(user)
+
+        key = (template, fingerprint(user, USER_CONTEXT_FIELDS))
+        return cls._prompt_cache.get_or_render(key, render) + cls._format_clock(user)
+
+    @classmethod
+    def format_english_free_agent_prompt(cls, user: UserData) -> str:
+        template = """
 # 🧠 System Identity
 
 You are **LukAI Expense Agent**, a specialized AI designed to help users track their personal expenses via natural language.
@@ -121,15 +152,15 @@ Used to log a new expense.
 
 ➡️ **Example Call**:
 ```json
-{{
+{
   "tool": "register_expenses",
-  "params": {{
+  "params": {
     "amount": 12.00,
     "description": "Netflix",
     "categoryKey": "ENTERTAINMENT",
     "accountKey": "PERSONAL"
-  }}
-}}
+  }
+}
 ```
 
 ## ✅ `call_customer_support_tool`
@@ -196,29 +227,28 @@ You must match expenses to the user's available categoryKey values below.
 
 Available Categories:
 
-{expense_categories}
+→ See **Expense Categories** under User Context at the end of these instructions.
 
 ➡️ If no matching category applies, ask the user what category to use, or suggest "OTHER" as a fallback.
 ➡️ Do not invent new categories — creating custom ones is not supported in the free tier.
 
 ---
 
-# 🧍 User Context
-
-{user_context}
-
 The user is a free LukAI member using the WhatsApp interface to track expenses. They only have access to the personal account and expense tracking features.
 
 Also, they can review their history, reports, and graphs by visiting their personal dashboard at: https://lukai.app
 This agent **does not interact with the dashboard or manage any other features** beyond expense logging.
+
+---
+
+# 🧍 User Context
+
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_spanish_free_agent_prompt(cls, user: UserData) -> str:
-        expense_categories = cls._format_categories(user.expense_categories)
-        user_context = cls._format_user_context(user)
-
-        return f"""
+        template = """
 # 🧠 Identidad del Sistema
 
 Eres **LukAI Agente de Gastos**, una IA especializada diseñada para ayudar a los usuarios a rastrear sus gastos personales a través de lenguaje natural.
@@ -298,15 +328,15 @@ Usado para registrar un nuevo gasto.
 
 ➡️ **Ejemplo de Llamada**:
 ```json
-{{
+{
   "tool": "register_expenses",
-  "params": {{
+  "params": {
     "amount": 12.00,
     "description": "Netflix",
     "categoryKey": "ENTERTAINMENT",
     "accountKey": "PERSONAL"
-  }}
-}}
+  }
+}
 ```
 
 ## ✅ `call_customer_support_tool`
@@ -373,30 +403,29 @@ Debes hacer coincidir los gastos con los valores categoryKey disponibles del usu
 
 Categorías Disponibles:
 
-{expense_categories}
+→ Ver **Expense Categories** en User Context, al final de estas instrucciones.
 
 ➡️ Si no aplica ninguna categoría coincidente, pregunta al usuario qué categoría usar, o sugiere "OTHER" como respaldo.
 ➡️ No inventes nuevas categorías — crear personalizadas no está soportado en el nivel gratuito.
 
 ---
 
-# 🧍 Contexto del Usuario
-
-{user_context}
-
 El usuario es un miembro gratuito de LukAI usando la interfaz de WhatsApp para rastrear gastos. Solo tienen acceso a la cuenta personal y características de seguimiento de gastos.
 
 También puede revisar su historial, reportes y gráficos visitando su dashboard personal en: https://lukai.app
 
 Este agente **no interactúa con el dashboard ni gestiona otras funciones** más allá del registro de gastos.
+
+---
+
+# 🧍 Contexto del Usuario
+
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_multilingual_free_agent_prompt(cls, user: UserData) -> str:
-        expense_categories = cls._format_categories(user.expense_categories)
-        user_context = cls._format_user_context(user)
-
-        return f"""
+        template = """
 # 🧠 System Identity
 
 You are **LukAI Free Expense Agent**, a specialized AI designed to help users track their personal expenses via natural language.
@@ -549,19 +578,21 @@ You must match expenses to the user's available categoryKey values below.
 
 Available Categories:
 
-{expense_categories}
+→ See **Expense Categories** under User Context at the end of these instructions.
 
 ➡️ If no matching category applies, ask the user what category to use, or suggest "OTHER" as a fallback.
 ➡️ Do not invent new categories — creating custom ones is not supported in the free tier.
 
 ---
 
-# 🧍 User Context
-
-{user_context}
-
 The user is a free LukAI member using the WhatsApp interface to track expenses. They only have access to the personal account and expense tracking features.
 
 Also, they can review their history, reports, and graphs by visiting their personal dashboard at: https://lukai.app
 This agent **does not interact with the dashboard or manage any other features** beyond expense logging.
+
+---
+
+# 🧍 User Context
+
 """
+        return cls._render_prompt(template, user)
@@ -1,11 +1,26 @@
 import logging
-from typing import Dict, Any, TypeVar, Generic, Type, List, Literal
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Literal,
+    Optional,
+    Type,
+    TypeVar,
+)
 import httpx
+import xxhash
 from fastapi import HTTPException
 from pydantic import BaseModel
 from datetime import datetime
 
 from app.core.config import get_settings
+from app.services.http_transport_service import http_transport
+from app.services.read_cache import ReadThroughCache, canonical_params
+from app.services.user_data_cache import CachedUserData, UserDataCache
+from app.utils.idempotency import IdempotencyMemo
 from app.schemas.api_responses import (
     MainAPIResponse,
     ToolResponse,
@@ -14,6 +29,40 @@ from app.schemas.api_responses import (
 settings = get_settings()
 logger = logging.getLogger(__name__)
 T = TypeVar("T")
+R = TypeVar("R")
+
+# Writes that change what upsert-user returns (categories, accounts and their
+# balances, tags, expense count), so they invalidate the user's cached data
+USER_DATA_WRITE_ENDPOINTS = frozenset(
+    {
+        "/v1/tools/register-expenses",
+        "/v1/tools/register-incomes",
+        "/v1/tools/create-expense-category",
+        "/v1/tools/create-income-category",
+        "/v1/tools/create-financial-account",
+        "/v1/tools/transfer-money-between-accounts",
+        "/v1/tools/create-transaction-tags",
+    }
+)
+
+# Writes after which all of the user's cached reads are dropped
+WRITE_ENDPOINTS = USER_DATA_WRITE_ENDPOINTS | {
+    "/v1/tools/set-budget",
+    "/v1/tools/set-expense-category-budget",
+}
+
+# Reads served from the per-user read-through cache
+CACHED_READ_ENDPOINTS = (
+    "/v1/tools/get-spending",
+    "/v1/tools/get-income",
+    "/v1/tools/get-account-balance",
+    "/v1/tools/get-budget",
+    "/v1/tools/get-budget-by-category",
+    "/v1/tools/get-savings",
+)
+# The billing portal link doesn't depend on the user's records and stays valid
+# for much longer than a read result
+BILLING_PORTAL_LINK_TTL_SECONDS = 600.0
 
 
 class ExpenseItem(BaseModel):
@@ -253,40 +302,133 @@ class MainAPIService:
             "Authorization": f"Bearer {settings.AGENT_API_SECRET}",
             "Content-Type": "application/json",
         }
+        # Results of writes already applied, by idempotency key
+        self.idempotent_writes = IdempotencyMemo()
+        self.user_data_cache = UserDataCache(
+            ttl_seconds=settings.USER_DATA_CACHE_TTL_SECONDS,
+            max_entries=settings.USER_DATA_CACHE_MAX_ENTRIES,
+        )
+        self.read_cache = ReadThroughCache(
+            ttls={
+                **{
+                    endpoint: settings.MAIN_API_READ_CACHE_TTL_SECONDS
+                    for endpoint in CACHED_READ_ENDPOINTS
+                },
+                "/v1/tools/get-customer-billing-portal-link": (
+                    BILLING_PORTAL_LINK_TTL_SECONDS
+                    if settings.MAIN_API_READ_CACHE_TTL_SECONDS > 0
+                    else 0
+                ),
+            },
+            max_users=settings.MAIN_API_READ_CACHE_MAX_USERS,
+        )
 
     async def _make_request(
         self,
         endpoint: str,
         payload: Dict[str, Any],
         response_model: Type[MainAPIResponse[T]],
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[T]:
         """
-        Generic method to make requests to the main API
+        Generic method to make requests to the main API.
+
+        Writes that pass an `idempotency_key` send it as the `Idempotency-Key`
+        header and are memoised in-process, so replaying the same tool call
+        (e.g. when an agent run is resumed) doesn't apply it twice.
+
+        Reads in the read cache are served from it, keyed by their payload
+        without the phone number. Successful writes drop the user's cached
+        reads and, for USER_DATA_WRITE_ENDPOINTS, their cached user data.
         """
+        if self.read_cache.is_cached(endpoint):
+            return await self.read_cache.get(
+                payload["phoneNumber"],
+                endpoint,
+                {key: value for key, value in payload.items() if key != "phoneNumber"},
+                lambda: self._dispatch_request(
+                    endpoint, payload, response_model, idempotency_key
+                ),
+            )
+
+        response = await self._dispatch_request(
+            endpoint, payload, response_model, idempotency_key
+        )
+        if endpoint in WRITE_ENDPOINTS:
+            self.read_cache.invalidate(payload["phoneNumber"])
+            if endpoint in USER_DATA_WRITE_ENDPOINTS:
+                self.user_data_cache.invalidate(payload["phoneNumber"])
+        return response
+
+    def invalidate_user(self, phone_number: str) -> bool:
+        """Drop the user's cached data and reads; True if user data was cached."""
+        self.read_cache.invalidate(phone_number)
+        return self.user_data_cache.invalidate(phone_number)
+
+    async def _dispatch_request(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        response_model: Type[MainAPIResponse[T]],
+        idempotency_key: Optional[str],
+    ) -> MainAPIResponse[T]:
+        if idempotency_key is not None:
+            return await self.idempotent_writes.run(
+                idempotency_key,
+                lambda: self._send_request(
+                    endpoint,
+                    payload,
+                    response_model,
+                    {**self.headers, "Idempotency-Key": idempotency_key},
+                ),
+            )
+        return await self._send_request(endpoint, payload, response_model, self.headers)
+
+    async def _send_request(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        response_model: Type[MainAPIResponse[T]],
+        headers: Dict[str, str],
+    ) -> MainAPIResponse[T]:
+        return await self._post(
+            endpoint,
+            payload,
+            headers,
+            lambda response: response_model(**response.json()),
+        )
+
+    async def _post(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        parse: Callable[[httpx.Response], R],
+    ) -> R:
+        """POST to the main API and parse the response, mapping errors to HTTPException."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}{endpoint}",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=30.0,
-                )
+            client = http_transport.get_client(http_transport.MAIN_API)
+            response = await client.post(
+                f"{self.base_url}{endpoint}",
+                headers=headers,
+                json=payload,
+            )
 
-                logger.info(f"📡 Response status: {response.status_code}")
-                logger.info(f"📡 Response headers: {dict(response.headers)}")
+            logger.info(f"📡 Response status: {response.status_code}")
+            logger.info(f"📡 Response headers: {dict(response.headers)}")
 
-                if response.status_code == 401:
-                    logger.error(f"❌ 401 Unauthorized - Check AGENT_API_SECRET")
-                    raise HTTPException(
-                        status_code=401,
-                        detail="Unauthorized access to main API. Check AGENT_API_SECRET.",
-                    )
+            if response.status_code == 401:
+                logger.error(f"❌ 401 Unauthorized - Check AGENT_API_SECRET")
+                raise HTTPException(
+                    status_code=401,
+                    detail="Unauthorized access to main API. Check AGENT_API_SECRET.",
+                )
 
+            # 304 only answers a conditional request, which `parse` handles
+            if response.status_code != 304:
                 response.raise_for_status()
 
-                response_data = response.json()
-
-                return response_model(**response_data)
+            return parse(response)
 
         except httpx.TimeoutException as e:
             logger.error(f"⏰ Timeout error: {str(e)}")
@@ -315,7 +457,7 @@ class MainAPIService:
             )
 
     async def call_customer_support(
-        self, phone_number: str, context: str
+        self, phone_number: str, context: str, idempotency_key: Optional[str] = None
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to initiate customer support call
@@ -324,6 +466,7 @@ class MainAPIService:
             endpoint="/v1/tools/call-for-customer-support",
             payload={"phoneNumber": phone_number, "context": context},
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def save_user_feedback(
@@ -363,7 +506,10 @@ class MainAPIService:
         )
 
     async def register_expenses(
-        self, user_phone_number: str, expenses: List[ExpenseItem]
+        self,
+        user_phone_number: str,
+        expenses: List[ExpenseItem],
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to register user expenses
@@ -377,10 +523,14 @@ class MainAPIService:
                 ],
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def register_incomes(
-        self, user_phone_number: str, incomes: List[IncomeItem]
+        self,
+        user_phone_number: str,
+        incomes: List[IncomeItem],
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to register user incomes
@@ -392,10 +542,14 @@ class MainAPIService:
                 "incomes": [income.model_dump(exclude_none=True) for income in incomes],
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def create_expense_category(
-        self, user_phone_number: str, category: ExpenseCategoryCreate
+        self,
+        user_phone_number: str,
+        category: ExpenseCategoryCreate,
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to create an expense category
@@ -407,10 +561,14 @@ class MainAPIService:
                 **category.model_dump(exclude_none=True),
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def create_income_category(
-        self, user_phone_number: str, category: IncomeCategoryCreate
+        self,
+        user_phone_number: str,
+        category: IncomeCategoryCreate,
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to create an income category
@@ -422,6 +580,7 @@ class MainAPIService:
                 **category.model_dump(exclude_none=True),
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def get_spending(
@@ -485,7 +644,10 @@ class MainAPIService:
         )
 
     async def create_financial_account(
-        self, user_phone_number: str, account: FinancialAccountCreate
+        self,
+        user_phone_number: str,
+        account: FinancialAccountCreate,
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to create a financial account
@@ -498,6 +660,7 @@ class MainAPIService:
                     **account.model_dump(exclude_none=True),
                 },
                 response_model=MainAPIResponse[ToolResponse],
+                idempotency_key=idempotency_key,
             )
             return response
         except Exception as e:
@@ -509,7 +672,10 @@ class MainAPIService:
             raise
 
     async def transfer_money_between_accounts(
-        self, user_phone_number: str, transfers: List[TransferCreate]
+        self,
+        user_phone_number: str,
+        transfers: List[TransferCreate],
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to transfer money between accounts
@@ -523,6 +689,7 @@ class MainAPIService:
                 ],
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def get_transfers(
@@ -571,7 +738,7 @@ class MainAPIService:
         )
 
     async def create_transaction_tags(
-        self, phone_number: str, tags: List[str]
+        self, phone_number: str, tags: List[str], idempotency_key: Optional[str] = None
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to create transaction tags
@@ -583,6 +750,7 @@ class MainAPIService:
                 "tags": tags,
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def upsert_user(
@@ -592,22 +760,54 @@ class MainAPIService:
         Make a POST request to upsert (create or update) a user.
         This endpoint ensures the user exists and returns their data.
 
+        Responses are cached per user (see UserDataCache). Once an entry is
+        stale, or was loaded with a different contact name, it is revalidated
+        with its ETag; if the user is unchanged the cached response is reused
+        without validating the body again.
+
         Args:
             phone_number: The user's phone number
             contact_name: Optional contact name from WhatsApp
         """
-        logger.info(f"🌐 Main API URL: {self.base_url}")
-        return await self._make_request(
-            endpoint="/v1/tools/upsert-user",
-            payload={
-                "phoneNumber": phone_number,
-                "name": contact_name,
-            },
-            response_model=MainAPIResponse[UserData],
+
+        payload = {"phoneNumber": phone_number, "name": contact_name}
+
+        async def load(stale: Optional[CachedUserData]) -> CachedUserData:
+            headers = self.headers
+            if stale is not None and stale.etag:
+                headers = {**self.headers, "If-None-Match": stale.etag}
+            return await self._post(
+                "/v1/tools/upsert-user",
+                payload,
+                headers,
+                lambda response: self._parse_user_data(response, stale),
+            )
+
+        return await self.user_data_cache.get(
+            phone_number, load, fingerprint=canonical_params({"name": contact_name})
+        )
+
+    @staticmethod
+    def _parse_user_data(
+        response: httpx.Response, stale: Optional[CachedUserData]
+    ) -> CachedUserData:
+        if response.status_code == 304 and stale is not None:
+            return stale
+        etag = response.headers.get("etag")
+        version = etag or xxhash.xxh3_64_hexdigest(response.content)
+        if stale is not None and version == stale.version:
+            return stale
+        return CachedUserData(
+            response=MainAPIResponse[UserData](**response.json()),
+            version=version,
+            etag=etag,
         )
 
     async def set_budget(
-        self, user_phone_number: str, budget: BudgetCreate
+        self,
+        user_phone_number: str,
+        budget: BudgetCreate,
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to set a general budget
@@ -619,6 +819,7 @@ class MainAPIService:
                 **budget.model_dump(exclude_none=True),
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def get_budget(
@@ -637,7 +838,10 @@ class MainAPIService:
         )
 
     async def set_expense_category_budget(
-        self, user_phone_number: str, budget: ExpenseCategoryBudgetCreate
+        self,
+        user_phone_number: str,
+        budget: ExpenseCategoryBudgetCreate,
+        idempotency_key: Optional[str] = None,
     ) -> MainAPIResponse[ToolResponse]:
         """
         Make a POST request to set a budget for a specific expense category
@@ -649,6 +853,7 @@ class MainAPIService:
                 **budget.model_dump(exclude_none=True),
             },
             response_model=MainAPIResponse[ToolResponse],
+            idempotency_key=idempotency_key,
         )
 
     async def get_budget_by_category(
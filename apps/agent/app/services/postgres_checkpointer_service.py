@@ -7,15 +7,35 @@ providing better performance, reliability, and automatic cleanup of old conversa
 
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
-from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.services.checkpoint_retention import CheckpointRetention
+from app.services.checkpoint_serializer import create_checkpoint_serializer
+from app.services.checkpoint_stats import CheckpointStorageStats
+from app.services.conversation_history import ConversationHistory
+from app.services.checkpoint_savers import (
+    PrefetchingCheckpointSaver,
+    CachedCheckpointSaver,
+    WriteBehindCheckpointSaver,
+)
 
 logger = logging.getLogger(__name__)
 
+# When conversation checkpoints reach Postgres:
+# - "step": after every super-step (agent hop, tool call, handoff); a crash
+#   loses at most the step in flight
+# - "exit": once at the end of each turn, or when the run fails; a crash
+#   loses the turn in flight
+# - "async": like "exit", but written in the background after the reply; a
+#   crash can also lose turns already answered but not yet flushed
+CHECKPOINT_DURABILITY_MODES = ("step", "exit", "async")
+
 
 class PostgresCheckpointerService:
     """
@@ -30,8 +50,13 @@ class PostgresCheckpointerService:
     
     def __init__(self):
         self.settings = get_settings()
-        self._checkpointer_manager = None
-        self._checkpointer: Optional[AsyncPostgresSaver] = None
+        self._pool: Optional[AsyncConnectionPool] = None
+        self._retention: Optional[CheckpointRetention] = None
+        self._history: Optional[ConversationHistory] = None
+        self._storage_stats: Optional[CheckpointStorageStats] = None
+        self._checkpointer: Optional[PrefetchingCheckpointSaver] = None
+        self._write_behind: Optional[WriteBehindCheckpointSaver] = None
+        self._cache: Optional[CachedCheckpointSaver] = None
         self._cleanup_task: Optional[asyncio.Task] = None
         self._is_initialized = False
 
@@ -43,23 +68,58 @@ class PostgresCheckpointerService:
         try:
             logger.info("🔗 Initializing PostgreSQL checkpointer service...")
             
-            # Create serializer with pickle fallback for complex objects like HumanMessage
-            serde = JsonPlusSerializer(pickle_fallback=True)
-            logger.info(f"🔧 Created JsonPlusSerializer: {type(serde).__name__}")
+            durability = self.settings.CHECKPOINT_DURABILITY
+            if durability not in CHECKPOINT_DURABILITY_MODES:
+                raise ValueError(f"Unknown CHECKPOINT_DURABILITY '{durability}'")
             
-            # Create the async PostgreSQL checkpointer context manager with custom serializer
-            self._checkpointer_manager = AsyncPostgresSaver.from_conn_string(
-                self.settings.CHAT_DATABASE_URL, serde=serde
-            )
-            logger.info("🔧 Created AsyncPostgresSaver context manager with custom serializer")
+            # msgpack + zstd for channel values and writes; legacy rows stay readable
+            serde = create_checkpoint_serializer()
+            logger.info(f"🔧 Created checkpoint serializer: {type(serde).__name__}")
             
-            # Enter the context manager to get the actual checkpointer
-            self._checkpointer = await self._checkpointer_manager.__aenter__()
-            logger.info("🔧 Entered context manager, got checkpointer instance")
+            # Pooled connections, so concurrent conversations don't queue
+            # their checkpoint reads and writes behind a single socket
+            self._pool = await self._open_pool()
+            saver = AsyncPostgresSaver(conn=self._pool, serde=serde)
+            logger.info("🔧 Created AsyncPostgresSaver on connection pool with custom serializer")
             
             # Set up the database tables
             logger.info("🗄️ Setting up PostgreSQL tables for LangGraph checkpoints...")
-            await self._checkpointer.setup()
+            await saver.setup()
+            
+            self._retention = CheckpointRetention(
+                self._pool,
+                keep_checkpoints=self.settings.CHECKPOINT_HISTORY_KEEP,
+                active_grace_seconds=self.settings.CHECKPOINT_CLEANUP_ACTIVE_GRACE_SECONDS,
+                batch_size=self.settings.CHECKPOINT_CLEANUP_BATCH_SIZE,
+                max_batches=self.settings.CHECKPOINT_CLEANUP_MAX_BATCHES,
+                lock_timeout_ms=self.settings.CHECKPOINT_CLEANUP_LOCK_TIMEOUT_MS,
+            )
+            self._history = ConversationHistory(
+                self._pool,
+                serde=serde,
+                batch_size=self.settings.CHECKPOINT_CLEANUP_BATCH_SIZE,
+                lock_timeout_ms=self.settings.CHECKPOINT_CLEANUP_LOCK_TIMEOUT_MS,
+            )
+            self._storage_stats = CheckpointStorageStats(
+                self._pool,
+                self._retention,
+                top_threads=self.settings.CHECKPOINT_STATS_TOP_THREADS,
+                cache_seconds=self.settings.CHECKPOINT_STATS_CACHE_SECONDS,
+            )
+            
+            # Latest checkpoints of active threads, written through to Postgres
+            self._cache = self._create_cache(saver)
+            if self._cache is not None:
+                saver = self._cache
+            
+            # "async" durability persists the end-of-turn checkpoint after the reply
+            if durability == "async":
+                self._write_behind = WriteBehindCheckpointSaver(saver)
+                saver = self._write_behind
+            logger.info(f"💾 Checkpoint durability mode: {durability}")
+            
+            # Read-ahead layer so threads can be loaded during the debounce window
+            self._checkpointer = PrefetchingCheckpointSaver(saver)
             
             # Verify serializer is attached
             if hasattr(self._checkpointer, 'serde'):
@@ -75,9 +135,82 @@ class PostgresCheckpointerService:
             
         except Exception as e:
             logger.error(f"❌ Failed to initialize PostgreSQL checkpointer: {str(e)}")
+            if self._pool is not None:
+                await self._pool.close()
+                self._pool = None
             raise e
 
-    async def get_checkpointer(self) -> AsyncPostgresSaver:
+    def _create_cache(self, saver: AsyncPostgresSaver) -> Optional[CachedCheckpointSaver]:
+        """Checkpoint cache as chosen by CHECKPOINT_CACHE_BACKEND, or None."""
+        backend = self.settings.CHECKPOINT_CACHE_BACKEND
+        if backend == "none":
+            return None
+        if backend != "memory":
+            raise ValueError(f"Unknown CHECKPOINT_CACHE_BACKEND '{backend}'")
+        
+        logger.info("⚡ Checkpoint cache enabled (memory, checked against Postgres)")
+        return CachedCheckpointSaver(
+            saver,
+            self._pool,
+            max_bytes=self.settings.CHECKPOINT_CACHE_MAX_BYTES,
+            ttl_seconds=self.settings.CHECKPOINT_CACHE_TTL_SECONDS,
+        )
+
+    async def _open_pool(self) -> AsyncConnectionPool:
+        """Open the checkpointer connection pool, waiting for its minimum size."""
+        settings = self.settings
+        pool = AsyncConnectionPool(
+            settings.CHAT_DATABASE_URL,
+            min_size=settings.CHECKPOINT_POOL_MIN_SIZE,
+            max_size=settings.CHECKPOINT_POOL_MAX_SIZE,
+            timeout=settings.CHECKPOINT_POOL_TIMEOUT_SECONDS,
+            max_lifetime=settings.CHECKPOINT_POOL_MAX_LIFETIME_SECONDS,
+            max_idle=settings.CHECKPOINT_POOL_MAX_IDLE_SECONDS,
+            # Connections that died while idle are replaced before use
+            check=AsyncConnectionPool.check_connection,
+            # Settings AsyncPostgresSaver expects of its connections
+            kwargs={
+                "autocommit": True,
+                "row_factory": dict_row,
+                "prepare_threshold": settings.CHECKPOINT_DB_PREPARE_THRESHOLD,
+            },
+            name="checkpointer",
+            open=False,
+        )
+        try:
+            await pool.open(wait=True, timeout=settings.CHECKPOINT_POOL_TIMEOUT_SECONDS)
+        except Exception:
+            # Don't leave the pool reconnecting in the background
+            await pool.close()
+            raise
+        logger.info(
+            f"🏊 Opened checkpointer pool ({settings.CHECKPOINT_POOL_MIN_SIZE}-{settings.CHECKPOINT_POOL_MAX_SIZE} connections)"
+        )
+        return pool
+
+    def get_pool_stats(self) -> dict:
+        """Pool size, utilisation and connection wait times since startup."""
+        if self._pool is None:
+            return {}
+        stats = self._pool.get_stats()
+        pool_max = stats.get("pool_max", 0)
+        in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+        requests = stats.get("requests_num", 0)
+        wait_ms = stats.get("requests_wait_ms", 0)
+        return {
+            "size": stats.get("pool_size", 0),
+            "max_size": pool_max,
+            "in_use": in_use,
+            "utilisation": round(in_use / pool_max, 3) if pool_max else 0.0,
+            "requests": requests,
+            "requests_waiting": stats.get("requests_waiting", 0),
+            "requests_queued": stats.get("requests_queued", 0),
+            "requests_timed_out": stats.get("requests_errors", 0),
+            "avg_wait_ms": round(wait_ms / requests, 2) if requests else 0.0,
+            "connections_lost": stats.get("connections_lost", 0),
+        }
+
+    async def get_checkpointer(self) -> PrefetchingCheckpointSaver:
         """Get the initialized checkpointer instance."""
         if not self._is_initialized:
             await self.initialize()
@@ -87,6 +220,37 @@ class PostgresCheckpointerService:
             
         return self._checkpointer
 
+    async def get_thread_messages(
+        self, thread_id: str, before: Optional[int] = None, limit: Optional[int] = None
+    ) -> dict:
+        """A page of a thread's messages, or all of them without `limit`."""
+        await self.get_checkpointer()
+        if self._write_behind is not None:
+            await self._write_behind.flush(thread_id)
+        if limit is None:
+            messages = await self._history.load_messages(thread_id)
+            return {
+                "thread_id": thread_id,
+                "total": len(messages),
+                "start": 0,
+                "messages": messages,
+                "next_cursor": None,
+            }
+        return await self._history.read_page(thread_id, before=before, limit=limit)
+
+    async def delete_threads(self, thread_ids: List[str]) -> Dict[str, int]:
+        """Permanently delete threads from the checkpoint tables and every cache."""
+        checkpointer = await self.get_checkpointer()
+        # Pending background writes would bring the threads back
+        if self._write_behind is not None:
+            for thread_id in thread_ids:
+                await self._write_behind.flush(thread_id)
+        result = await self._history.delete_threads(thread_ids)
+        for thread_id in thread_ids:
+            await checkpointer.aevict_thread(thread_id)
+        metrics.increment("checkpoint_threads_deleted", result["threads"])
+        return result
+
     async def _start_cleanup_task(self):
         """Start the background cleanup task for TTL management."""
         if self._cleanup_task and not self._cleanup_task.done():
@@ -98,20 +262,22 @@ class PostgresCheckpointerService:
 
     async def _cleanup_old_conversations(self):
         """
-        Background task to clean up conversations older than 30 days.
-        Runs every 6 hours to maintain optimal database performance.
+        Background task enforcing checkpoint retention: deletes threads idle for
+        CHECKPOINT_RETENTION_DAYS and prunes the history of the others.
+        Runs every CHECKPOINT_CLEANUP_INTERVAL_SECONDS (6 hours by default).
         """
         while True:
             try:
-                # Wait 6 hours between cleanup runs
-                await asyncio.sleep(6 * 3600)  # 6 hours = 21600 seconds
+                # Wait between cleanup runs
+                await asyncio.sleep(self.settings.CHECKPOINT_CLEANUP_INTERVAL_SECONDS)
                 
-                logger.info("🧹 Starting PostgreSQL conversation cleanup (30-day TTL)...")
+                logger.info(
+                    f"🧹 Starting PostgreSQL conversation cleanup ({self.settings.CHECKPOINT_RETENTION_DAYS}-day TTL)..."
+                )
                 
-                # Calculate cutoff date (30 days ago)
-                cutoff_date = datetime.utcnow() - timedelta(days=30)
+                # Calculate cutoff date
+                cutoff_date = datetime.now(timezone.utc) - timedelta(days=self.settings.CHECKPOINT_RETENTION_DAYS)
                 
-                # Execute cleanup query - simplified approach
                 await self._perform_cleanup(cutoff_date)
                 
                 logger.info("✅ PostgreSQL conversation cleanup completed successfully")
@@ -124,18 +290,24 @@ class PostgresCheckpointerService:
                 # Continue running even if one cleanup fails
                 continue
 
-    async def _perform_cleanup(self, cutoff_date: datetime):
+    async def _perform_cleanup(self, cutoff_date: datetime) -> dict:
         """
         Perform the actual cleanup of old checkpoints.
         
-        This removes checkpoints older than cutoff_date using a simple SQL approach.
+        Deletes threads with no checkpoint since cutoff_date and keeps only the
+        latest CHECKPOINT_HISTORY_KEEP checkpoints of the rest, in batches.
         """
         try:
             logger.info(f"🗑️ Cleaning up checkpoints older than {cutoff_date}")
-            # For now, we'll log the cleanup attempt
-            # The actual SQL cleanup will be handled by PostgreSQL maintenance
-            # or a separate cleanup script
-            logger.info("� Cleanup logic placeholder - to be implemented with direct SQL")
+            if self._retention is None:
+                raise RuntimeError("Checkpointer pool is not open")
+            result = await self._retention.run(cutoff_date)
+            logger.info(
+                f"🗑️ Deleted {result['idle_threads_deleted']} idle threads and pruned "
+                f"{result['checkpoints_pruned']} old checkpoints: {result['rows_deleted']} rows, "
+                f"{result['bytes_reclaimed'] / 1024 / 1024:.1f} MB reclaimed"
+            )
+            return result
                 
         except Exception as e:
             logger.error(f"❌ Error performing PostgreSQL cleanup: {str(e)}")
@@ -154,9 +326,19 @@ class PostgresCheckpointerService:
                 except asyncio.CancelledError:
                     pass
             
-            # Close checkpointer connection using context manager exit
-            if self._checkpointer_manager and self._checkpointer:
-                await self._checkpointer_manager.__aexit__(None, None, None)
+            # Persist checkpoints still queued by the write-behind layer
+            if self._write_behind is not None:
+                await self._write_behind.flush()
+                self._write_behind = None
+            self._cache = None
+            
+            # Close the pooled checkpointer connections
+            if self._pool is not None:
+                await self._pool.close()
+                self._pool = None
+                self._retention = None
+                self._history = None
+                self._storage_stats = None
                 
             self._is_initialized = False
             logger.info("✅ PostgreSQL checkpointer service cleanup completed")
@@ -164,6 +346,15 @@ class PostgresCheckpointerService:
         except Exception as e:
             logger.error(f"❌ Error during PostgreSQL checkpointer cleanup: {str(e)}")
 
+    async def _get_storage_stats(self) -> Optional[dict]:
+        if self._storage_stats is None:
+            return None
+        try:
+            return await self._storage_stats.get()
+        except Exception as e:
+            logger.error(f"❌ Error collecting checkpoint storage stats: {str(e)}")
+            return {"error": str(e)}
+
     async def get_conversation_stats(self) -> dict:
         """Get statistics about stored conversations for monitoring."""
         try:
@@ -174,7 +365,14 @@ class PostgresCheckpointerService:
             return {
                 "service_status": "initialized",
                 "cleanup_task_running": not (self._cleanup_task.done() if self._cleanup_task else True),
-                "postgres_url_configured": bool(self.settings.CHAT_DATABASE_URL)
+                "postgres_url_configured": bool(self.settings.CHAT_DATABASE_URL),
+                **(self._checkpointer.get_stats() if self._checkpointer else {}),
+                "pool": self.get_pool_stats(),
+                "durability": self.settings.CHECKPOINT_DURABILITY,
+                "write_behind": self._write_behind.get_stats() if self._write_behind else None,
+                "cache": self._cache.get_stats() if self._cache else None,
+                "last_cleanup": self._retention.last_run if self._retention else None,
+                "storage": await self._get_storage_stats(),
             }
                 
         except Exception as e:
@@ -184,19 +382,30 @@ class PostgresCheckpointerService:
 
 # Global instance
 _postgres_checkpointer_service: Optional[PostgresCheckpointerService] = None
+_postgres_checkpointer_service_lock = asyncio.Lock()
 
 
 async def get_postgres_checkpointer_service() -> PostgresCheckpointerService:
     """Get the global PostgreSQL checkpointer service instance."""
     global _postgres_checkpointer_service
     
-    if _postgres_checkpointer_service is None:
-        _postgres_checkpointer_service = PostgresCheckpointerService()
-        await _postgres_checkpointer_service.initialize()
+    # Prefetches and batches may race to create the service on first use
+    async with _postgres_checkpointer_service_lock:
+        if _postgres_checkpointer_service is None:
+            service = PostgresCheckpointerService()
+            await service.initialize()
+            _postgres_checkpointer_service = service
     
     return _postgres_checkpointer_service
 
 
+async def get_postgres_checkpointer_stats() -> Optional[dict]:
+    """Stats of the global checkpointer service, without initializing it."""
+    if _postgres_checkpointer_service is None:
+        return None
+    return await _postgres_checkpointer_service.get_conversation_stats()
+
+
 async def cleanup_postgres_checkpointer_service():
     """Clean up the global PostgreSQL checkpointer service."""
     global _postgres_checkpointer_service
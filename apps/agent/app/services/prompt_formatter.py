@@ -1,11 +1,36 @@
 import pytz
 from datetime import datetime
+from typing import Tuple
+
 from agents.extensions.handoff_prompt import RECOMMENDED_PROMPT_PREFIX
 
 from app.services.main_api_service import UserData
+from app.utils.prompt_cache import PromptCache, fingerprint, static_prompt_prefixes
+
+# UserData fields rendered into every prompt's user context
+USER_CONTEXT_FIELDS = (
+    "name",
+    "phone_number",
+    "favorite_language",
+    "favorite_currency_code",
+    "favorite_locale",
+    "favorite_timezone",
+    "subscription",
+)
+
+# Titles of the optional user data sections a prompt can include
+SECTION_TITLES = {
+    "expense_categories": "Expense Categories",
+    "income_categories": "Income Categories",
+    "accounts": "Accounts",
+    "transaction_tags": "Transaction Tags",
+}
 
 
 class ApoloPromptFormatter:
+    # Rendered template + user data, shared by subclasses
+    _prompt_cache = PromptCache()
+
     @staticmethod
     def _format_categories(categories) -> str:
         if not categories:
@@ -40,11 +65,8 @@ class ApoloPromptFormatter:
 
     @staticmethod
     def _format_user_context(user: UserData) -> str:
-        current_time = ApoloPromptFormatter._get_current_time(user)
-
         return f"""
 User Context:
-- Current time in {user.favorite_timezone or 'N/A'}: {current_time}
 - Name: {user.name or 'N/A'}
 - Phone: {user.phone_number}
 - Preferred Language: {user.favorite_language or 'N/A'}
@@ -54,13 +76,49 @@ User Context:
 """
 
     @classmethod
-    def format_expense_agent_prompt(cls, user: UserData) -> str:
-        expense_categories = cls._format_categories(user.expense_categories)
-        accounts = cls._format_accounts(user.accounts)
-        transaction_tags = cls._format_transaction_tags(user.transaction_tags)
-        user_context = cls._format_user_context(user)
+    def _format_section(cls, user: UserData, section: str) -> str:
+        if section == "accounts":
+            return cls._format_accounts(user.accounts)
+        if section == "transaction_tags":
+            return cls._format_transaction_tags(user.transaction_tags)
+        return cls._format_categories(getattr(user, section))
 
-        return f"""
+    @classmethod
+    def _format_user_data(cls, user: UserData, sections: Tuple[str, ...]) -> str:
+        user_data = cls._format_user_context(user)
+        for section in sections:
+            user_data += (
+                f"\n{SECTION_TITLES[section]}:\n{cls._format_section(user, section)}\n"
+            )
+        return user_data
+
+    @classmethod
+    def _format_clock(cls, user: UserData) -> str:
+        return f"\nCurrent time in {user.favorite_timezone or 'N/A'}: {cls._get_current_time(user)}\n"
+
+    @classmethod
+    def _render_prompt(
+        cls, template: str, user: UserData, sections: Tuple[str, ...] = ()
+    ) -> str:
+        """
+        Static template, then the user's data, then the clock.
+
+        Templates are identical for every user so the prompt prefix is stable
+        (and registered for provider-side context caching). The user data block
+        is memoised by a fingerprint of the fields it is rendered from, leaving
+        only the clock to render on each call.
+        """
+
+        def render() -> str:
+            static_prompt_prefixes.add(template)
+            return template + cls._format_user_data(user, sections)
+
+        key = (template, sections, fingerprint(user, USER_CONTEXT_FIELDS + sections))
+        return cls._prompt_cache.get_or_render(key, render) + cls._format_clock(user)
+
+    @classmethod
+    def format_expense_agent_prompt(cls, user: UserData) -> str:
+        template = """
 # 🧠 Identity
 
 You are **LukAI**, the EXPENSE AGENT in a multi-agent personal finance system.
@@ -130,7 +188,7 @@ Categories:
 
 • Use the following categoryKey values if matching applies:
 
-{expense_categories}
+→ See **Expense Categories** under User Context at the end of these instructions.
 
 • If no category matches, use create_expense_category and format keys in UPPERCASE.
 
@@ -138,7 +196,7 @@ Accounts:
 
 • Use only from:
 
-{accounts}
+→ See **Accounts** under User Context at the end of these instructions.
 
 • Create new one only if the user clearly requests it or none exist.
 
@@ -146,7 +204,7 @@ Tags:
 
 • Optional. Use only the allowed lowercase transactionTagKey values:
 
-{transaction_tags}
+→ See **Transaction Tags** under User Context at the end of these instructions.
 
 
 ⸻
@@ -173,15 +231,14 @@ User Input	Action
 
 🧍 User Context
 
-{user_context}
 """
+        return cls._render_prompt(
+            template, user, ("expense_categories", "accounts", "transaction_tags")
+        )
 
     @classmethod
     def format_accounts_agent_prompt(cls, user: UserData) -> str:
-        accounts = cls._format_accounts(user.accounts)
-        user_context = cls._format_user_context(user)
-
-        return f"""
+        template = """
 # 🧠 Identity
 
 You are **LukAI**, the ACCOUNTS AGENT in a multi-agent financial system.
@@ -245,9 +302,7 @@ Cannot transfer between accounts with different currencies. Please select two ac
 
 Only use or reference the following user accounts unless instructed otherwise:
 
-```
-{accounts}
-```
+→ See **Accounts** under User Context at the end of these instructions.
 
 ---
 
@@ -271,16 +326,12 @@ This action may involve multiple operations outside of account management. Pleas
 
 # **🧍 User Context**
 
-{user_context}
 """
+        return cls._render_prompt(template, user, ("accounts",))
 
     @classmethod
     def format_income_agent_prompt(cls, user: UserData) -> str:
-        income_categories = cls._format_categories(user.income_categories)
-        accounts = cls._format_accounts(user.accounts)
-        user_context = cls._format_user_context(user)
-
-        return f"""
+        template = """
 # 🧠 Identity
 
 You are **LukAI**, the INCOME AGENT in a multi-agent financial assistant system.
@@ -340,14 +391,14 @@ If the user’s request includes any of these, you MUST request a handoff to the
 ### 💰 Income Categories
 Use only existing categoryKey values. If the user requests a new category, create it first:
 
-{income_categories}
+→ See **Income Categories** under User Context at the end of these instructions.
 
 ```
 ### 🏦 Financial Accounts
 Use only existing accountKey values. If new, create it with descriptive name + currency:
 ```
 
-{accounts}
+→ See **Accounts** under User Context at the end of these instructions.
 
 ```
 ---
@@ -376,14 +427,12 @@ Speak like a financial mentor:
 
 # **🧍 User Context**
 
-{user_context}
 """
+        return cls._render_prompt(template, user, ("income_categories", "accounts"))
 
     @classmethod
     def format_english_accounting_agent_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-
-        return f"""
+        template = """
 # 🧠 System Identity
 
 You are **LukAI**, the Central Financial Coordinator Agent in a multi-agent personal finance system. Your primary role is to **understand user intent** and route each request to the appropriate specialized agent.
@@ -505,14 +554,12 @@ Instead, you return structured agent delegation calls (handled downstream).
 
 # 🧍 User Context
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_spanish_accounting_agent_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-
-        return f"""
+        template = """
 # 🧠 Identidad del Sistema
 
 Usted es **LukAI**, el Agente Coordinador Financiero Central en un sistema de finanzas personales multiagente. Su función principal es **comprender la intención del usuario** y dirigir cada solicitud al agente especializado adecuado.
@@ -639,14 +686,12 @@ En su lugar, se devuelven llamadas estructuradas de delegación de agente (gesti
 
 # 🧍 Contexto del usuario
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_multilingual_accounting_agent_prompt(cls, user: UserData) -> str:
-        user_context = cls._format_user_context(user)
-
-        return f"""
+        template = """
 # 🧠 System Identity
 
 You are **LukAI**, the Central Financial Coordinator Agent in a multi-agent personal finance system. Your primary role is to **understand user intent** and route each request to the appropriate specialized agent and also to answer the user in their input language.
@@ -771,17 +816,13 @@ Instead, you return structured agent delegation calls (handled downstream).
 
 # 🧍 User Context
 
-{user_context}
 """
+        return cls._render_prompt(template, user)
 
     @classmethod
     def format_budget_agent_prompt(cls, user: UserData) -> str:
-        accounts = cls._format_accounts(user.accounts)
-        expense_categories = cls._format_categories(user.expense_categories)
-        user_context = cls._format_user_context(user)
-
         if user.favorite_language == "es":
-            return f"""
+            template = """
 # 🧠 Identidad
 
 Eres **Athena**, la **Agente de Presupuesto y Ahorro** del sistema de asistencia financiera de LukAI.
@@ -825,9 +866,7 @@ Esta solicitud implica operaciones ajenas a mi función. La pasaré al Agente Co
 - Validar que todos los importes sean numéricos y positivos
 - Para presupuestos específicos de cada categoría, utilizar únicamente las **categorías aprobadas**:
 
-```
-{expense_categories}
-```
+→ Ver **Expense Categories** en User Context, al final de estas instrucciones.
 
 - Las claves de presupuesto deben ser claras y estar escritas en **MAYÚSCULAS**
 
@@ -837,9 +876,7 @@ Esta solicitud implica operaciones ajenas a mi función. La pasaré al Agente Co
 
 - Utilizar únicamente las cuentas financieras disponibles del usuario:
 
-```
-{accounts}
-```
+→ Ver **Accounts** en User Context, al final de estas instrucciones.
 
 - No dar por sentado el propósito de los ahorros; solo informar el saldo y el total ahorrado en esa cuenta.
 - Utilizar la función `get_savings` solo si el usuario solicita información de ahorros por cuenta.
@@ -867,10 +904,9 @@ Necesito más detalles para completar esta solicitud. ¿Podrías aclarar el impo
 
 # **🧍 Contexto del usuario**
 
-{user_context}
 """
         else:
-            return f"""
+            template = """
 # 🧠 Identity
 
 You are **Athena**, the **Budget and Savings Agent** in LukAI's financial assistant system.
@@ -915,9 +951,7 @@ This request involves operations outside my role. I will pass it to the Accounti
 - Validate that all amounts are numerical and positive
 - For category-specific budgets, only use **approved categories**:
 
-```
-{expense_categories}
-```
+→ See **Expense Categories** under User Context at the end of these instructions.
 
 - Budget keys must be clear and written in **UPPERCASE**
 
@@ -927,9 +961,7 @@ This request involves operations outside my role. I will pass it to the Accounti
 
 - Only use available user financial accounts:
 
-```
-{accounts}
-```
+→ See **Accounts** under User Context at the end of these instructions.
 
 - Do not assume the purpose of savings — only report balance and total saved in that account
 - Use the get_savings function only if user requests savings info by account
@@ -956,5 +988,5 @@ I need more details to complete this request. Could you clarify the budget amoun
 
 # **🧍 User Context**
 
-{user_context}
 """
+        return cls._render_prompt(template, user, ("expense_categories", "accounts"))
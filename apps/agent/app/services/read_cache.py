@@ -0,0 +1,102 @@
+"""
+Per-user read-through cache of main API read tools.
+
+Agents often repeat the same read within a turn and across turns (e.g. the
+main agent and then the expense agent both asking for month-to-date
+spending). Results are cached per user under the endpoint plus its
+canonical parameters (JSON with sorted keys) for a per-endpoint TTL.
+
+Any successful write for a user drops all of their cached reads. A read
+that was in flight when its user was invalidated (e.g. run in parallel with
+the write by the same tool node) returns its result but does not store it.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Mapping, Tuple
+
+from app.core.metrics import metrics
+from app.services.user_data_cache import user_cache_key
+
+
+@dataclass
+class _UserReads:
+    # Bumped by every invalidation of the user
+    generation: int = 0
+    # (endpoint, canonical params) -> (expires at, result)
+    results: Dict[Tuple[str, str], Tuple[float, Any]] = field(default_factory=dict)
+
+
+def canonical_params(params: Mapping[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ReadThroughCache:
+    def __init__(self, ttls: Mapping[str, float], max_users: int):
+        # Endpoints not listed here are never cached
+        self.ttls = dict(ttls)
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserReads]" = OrderedDict()
+        self.hits: Dict[str, int] = {endpoint: 0 for endpoint in self.ttls}
+        self.misses: Dict[str, int] = {endpoint: 0 for endpoint in self.ttls}
+        self.invalidations = 0
+
+    def is_cached(self, endpoint: str) -> bool:
+        return self.ttls.get(endpoint, 0) > 0
+
+    async def get(
+        self,
+        phone_number: str,
+        endpoint: str,
+        params: Mapping[str, Any],
+        load: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """The cached result of `endpoint` for these params, else `load()`."""
+        user = user_cache_key(phone_number)
+        key = (endpoint, canonical_params(params))
+        reads = self._users.get(user)
+        if reads is None:
+            reads = self._users[user] = _UserReads()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user)
+
+        cached = reads.results.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            self.hits[endpoint] += 1
+            metrics.increment(
+                "main_api_read_cache", labels={"endpoint": endpoint, "result": "hit"}
+            )
+            return cached[1]
+
+        self.misses[endpoint] += 1
+        metrics.increment(
+            "main_api_read_cache", labels={"endpoint": endpoint, "result": "miss"}
+        )
+        generation = reads.generation
+        result = await load()
+        if self._users.get(user) is reads and reads.generation == generation:
+            reads.results[key] = (time.monotonic() + self.ttls[endpoint], result)
+        return result
+
+    def invalidate(self, phone_number: str) -> None:
+        """Drop every cached read of the user."""
+        reads = self._users.get(user_cache_key(phone_number))
+        self.invalidations += 1
+        if reads is not None:
+            reads.generation += 1
+            reads.results.clear()
+
+    def get_stats(self) -> dict:
+        hits = sum(self.hits.values())
+        lookups = hits + sum(self.misses.values())
+        return {
+            "users": len(self._users),
+            "entries": sum(len(reads.results) for reads in self._users.values()),
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "invalidations": self.invalidations,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
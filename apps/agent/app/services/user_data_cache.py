@@ -0,0 +1,143 @@
+"""
+Per-user cache of the upsert-user response.
+
+Every inbound message needs the sender's `UserData`, which carries all of
+their categories, accounts, tags and subscription. Within `ttl_seconds` of
+being fetched an entry is served without calling the main API. After that it
+is revalidated: the loader sends the stored version and, if the user is
+unchanged, the stored (already validated) response is kept and its TTL
+restarted. Each entry remembers a fingerprint of the upsert payload it was
+loaded with (e.g. the WhatsApp contact name): a lookup with a different
+payload goes to the main API, so the change is applied. Concurrent lookups
+for the same user and payload share one call. Entries are keyed by the
+digits of the phone number, since WhatsApp sends "51987654321" and the main
+API returns "+51987654321".
+
+Writes that change the user (new categories, accounts, tags, balances) and
+the main API itself invalidate entries. A load that was in flight when an
+invalidation happened returns its result but does not store it.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedUserData:
+    response: Any  # MainAPIResponse[UserData]
+    version: str  # ETag of the response, or a hash of its body
+    etag: Optional[str] = None
+    fetched_at: float = field(default_factory=time.monotonic)
+    # Of the request payload the response was loaded with
+    fingerprint: str = ""
+
+
+Loader = Callable[[Optional[CachedUserData]], Awaitable[CachedUserData]]
+
+
+def user_cache_key(phone_number: str) -> str:
+    """The digits of a phone number, however it is formatted."""
+    return "".join(c for c in phone_number if c.isdigit())
+
+
+class UserDataCache:
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedUserData]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Bumped by every invalidation, so loads that overlap one aren't stored
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get(self, phone_number: str, load: Loader, fingerprint: str = "") -> Any:
+        """
+        The cached response for `phone_number`, loading it if needed.
+
+        `load` receives the stale entry (or None) and returns the entry to
+        keep: the same one when the user hasn't changed, else a new one.
+        A cached response is only served for the same `fingerprint`.
+        """
+        if self.ttl_seconds <= 0:
+            return (await load(None)).response
+
+        key = user_cache_key(phone_number)
+        entry = self._entries.get(key)
+        if (
+            entry is not None
+            and entry.fingerprint == fingerprint
+            and time.monotonic() - entry.fetched_at < self.ttl_seconds
+        ):
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.response
+
+        in_flight = self._in_flight.get((key, fingerprint))
+        if in_flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        epoch = self._epoch
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[(key, fingerprint)] = future
+        try:
+            loaded = await load(entry)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited future isn't reported
+            future.exception()
+            raise
+        else:
+            if entry is not None and loaded.version == entry.version:
+                self.revalidated += 1
+                loaded = entry
+                loaded.fetched_at = time.monotonic()
+            loaded.fingerprint = fingerprint
+            if epoch == self._epoch:
+                self._store(key, loaded)
+            future.set_result(loaded.response)
+            return loaded.response
+        finally:
+            self._in_flight.pop((key, fingerprint), None)
+
+    def _store(self, key: str, entry: CachedUserData) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, phone_number: str) -> bool:
+        """Drop the user's entry; True if there was one."""
+        self._epoch += 1
+        self.invalidations += 1
+        removed = self._entries.pop(user_cache_key(phone_number), None) is not None
+        if removed:
+            logger.info(f"🧹 USER CACHE: Invalidated user data for {phone_number}")
+        return removed
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -1,6 +1,7 @@
 from typing import Dict, Any
 import httpx
 from app.core.config import get_settings
+from app.services.http_transport_service import http_transport
 
 settings = get_settings()
 
@@ -20,28 +21,27 @@ async def send_message(to: str, message: str) -> Dict[str, Any]:
         HTTPException: If the message sending fails
     """
     try:
-        async with httpx.AsyncClient() as client:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
-            }
-
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": to,
-                "type": "text",
-                "text": {"body": message},
-            }
-
-            response = await client.post(
-                f"{settings.WHATSAPP_API_URL}/v21.0/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages",
-                headers=headers,
-                json=payload,
-                timeout=30.0,
-            )
-            response.raise_for_status()
-            return response.json()
+        client = http_transport.get_client(http_transport.WHATSAPP)
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
+        }
+
+        payload = {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": to,
+            "type": "text",
+            "text": {"body": message},
+        }
+
+        response = await client.post(
+            f"{settings.WHATSAPP_API_URL}/v21.0/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages",
+            headers=headers,
+            json=payload,
+        )
+        response.raise_for_status()
+        return response.json()
 
     except httpx.TimeoutException:
         raise Exception("Request to WhatsApp API timed out while sending message")
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class IdempotencyMemo:
+    """
+    Results of completed writes by idempotency key.
+
+    A call with a key that already succeeded within `ttl_seconds` returns the
+    stored result instead of running again, and concurrent calls with the same
+    key share one in-flight call. Failures are not stored, so they can be
+    retried.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.replayed = 0
+
+    def _get(self, key: str):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at >= self.ttl_seconds:
+            del self._results[key]
+            return None
+        return entry
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._get(key)
+        if entry is not None:
+            self.replayed += 1
+            return entry[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.replayed += 1
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited future isn't reported
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            self._results[key] = (time.monotonic(), result)
+            if len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    def get_stats(self) -> dict:
+        return {
+            "stored": len(self._results),
+            "in_flight": len(self._in_flight),
+            "replayed": self.replayed,
+        }
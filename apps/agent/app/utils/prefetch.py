@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class PrefetchRegistry:
+    """
+    Single-use results of background work started ahead of time.
+
+    `start` launches a task for a key unless one is already pending; `take`
+    hands the task to the first consumer. Entries expire after `ttl_seconds`
+    so unused prefetches never accumulate.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, asyncio.Task]] = {}
+
+    def _prune_expired(self) -> None:
+        now = time.monotonic()
+        for key, (started_at, _) in list(self._entries.items()):
+            if now - started_at >= self.ttl_seconds:
+                self.discard(key)
+
+    def start(self, key: str, factory: Callable[[], Awaitable[Any]]) -> bool:
+        """Start prefetching a key. Returns False if a prefetch is already pending."""
+        self._prune_expired()
+        if key in self._entries:
+            return False
+
+        task = asyncio.ensure_future(factory())
+        # Retrieve failures so unused tasks are not reported as "never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._entries[key] = (time.monotonic(), task)
+        return True
+
+    def take(self, key: str) -> Optional[asyncio.Task]:
+        """Claim a pending prefetch, or None if missing or expired."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        started_at, task = entry
+        if time.monotonic() - started_at >= self.ttl_seconds:
+            task.cancel()
+            return None
+        return task
+
+    def discard(self, key: Optional[str]) -> None:
+        if key is None:
+            return
+        entry = self._entries.pop(key, None)
+        if entry is not None and not entry[1].done():
+            entry[1].cancel()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,79 @@
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Optional, Set
+
+from pydantic import BaseModel
+
+
+def fingerprint(model: BaseModel, fields: Iterable[str]) -> str:
+    """Stable hash of the given fields of a model."""
+    payload = model.model_dump_json(include=set(fields))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class PromptCache:
+    """
+    LRU of rendered prompt segments.
+
+    Keys should capture everything a segment is rendered from (template plus a
+    fingerprint of the user data it uses), so entries never need invalidating;
+    stale ones simply age out.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        rendered = self._entries.get(key)
+        if rendered is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rendered
+
+        self.misses += 1
+        rendered = self._entries[key] = render()
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return rendered
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class StaticPrefixRegistry:
+    """
+    Static prompt templates rendered so far.
+
+    Lets a fully rendered prompt be split back into its cacheable static
+    prefix and the per-user remainder.
+    """
+
+    def __init__(self):
+        self._prefixes: Set[str] = set()
+
+    def add(self, prefix: str) -> None:
+        self._prefixes.add(prefix)
+
+    def match(self, text: str) -> Optional[str]:
+        """Longest registered prefix of `text`, if any."""
+        matched = None
+        for prefix in self._prefixes:
+            if text.startswith(prefix) and (
+                matched is None or len(prefix) > len(matched)
+            ):
+                matched = prefix
+        return matched
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+
+static_prompt_prefixes = StaticPrefixRegistry()
@@ -0,0 +1,45 @@
+import asyncio
+import random
+
+import httpx
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+
+# Provider and network failures that usually succeed when tried again
+RETRYABLE_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    Whether an agent run that failed with `error` is worth retrying.
+
+    Invalid requests, auth failures and programming errors are fatal: running
+    the same turn again would fail the same way.
+    """
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if isinstance(error, HTTPException):
+        # Main API failures surface as HTTPException with the upstream status
+        return error.status_code == 429 or error.status_code >= 500
+    # Checkpointer connection drops (psycopg.OperationalError) and the like
+    if type(error).__name__ in ("OperationalError", "InterfaceError"):
+        return True
+    cause = error.__cause__
+    return cause is not None and cause is not error and is_retryable_error(cause)
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Full-jitter exponential backoff for the given attempt (1-based)."""
+    return random.uniform(0, min(max_seconds, base_seconds * 2 ** (attempt - 1)))
@@ -1,14 +1,173 @@
-from openai import OpenAI
+import asyncio
+import logging
+import time
+from io import BytesIO
+from typing import Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
 from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.services.http_transport_service import http_transport
 
 settings = get_settings()
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
 
 CHAT_GPT4_MINI_TRANSCRIBE_MODEL = "gpt-4o-mini-transcribe"
 
-max_tokens_per_minute = 50000
-max_requests_per_minute = 500
+# Rough token cost of audio: WhatsApp voice notes are ~2 KB/s of Opus and the
+# model bills on the order of 15 tokens per second of audio (input + text out)
+ESTIMATED_BYTES_PER_TOKEN = 130
+MIN_ESTIMATED_TOKENS = 50
+
+# Transient failures worth retrying
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Async token bucket holding at most `capacity_per_minute` tokens."""
+
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = capacity_per_minute
+        self.refill_per_second = capacity_per_minute / 60.0
+        self.tokens = capacity_per_minute
+        self.updated_at = time.monotonic()
+        # Held while waiting, so callers are served in FIFO order
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.refill_per_second,
+        )
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """
+        Wait until `amount` tokens are available and take them.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.refill_per_second
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class TranscriptionService:
+    """
+    Async OpenAI transcription with client-side limits.
+
+    Concurrent uploads are capped by a semaphore, the requests- and
+    tokens-per-minute budgets are enforced by token buckets, and transient
+    API errors are retried with jittered exponential backoff. The semaphore is
+    held per attempt, so backoff sleeps don't block other voice notes.
+    """
+
+    def __init__(self):
+        self._client: Optional[AsyncOpenAI] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.semaphore = asyncio.Semaphore(settings.TRANSCRIPTION_MAX_CONCURRENCY)
+        self.requests_per_minute = TokenBucket(
+            settings.TRANSCRIPTION_MAX_REQUESTS_PER_MINUTE
+        )
+        self.tokens_per_minute = TokenBucket(
+            settings.TRANSCRIPTION_MAX_TOKENS_PER_MINUTE
+        )
+        self.max_attempts = settings.TRANSCRIPTION_MAX_ATTEMPTS
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """The OpenAI client, rebuilt whenever the shared HTTP client is replaced."""
+        http_client = http_transport.get_client(http_transport.OPENAI)
+        if self._client is None or self._http_client is not http_client:
+            self._client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                timeout=settings.TRANSCRIPTION_TIMEOUT_SECONDS,
+                max_retries=0,  # Retries are handled here so they respect the limits
+                http_client=http_client,
+            )
+            self._http_client = http_client
+        return self._client
+
+    @staticmethod
+    def estimate_tokens(audio_content: bytes) -> int:
+        return max(
+            MIN_ESTIMATED_TOKENS, len(audio_content) // ESTIMATED_BYTES_PER_TOKEN
+        )
+
+    async def _transcribe_once(
+        self, audio_content: bytes, filename: str, estimated_tokens: int
+    ) -> str:
+        async with self.semaphore:
+            waited = await self.requests_per_minute.acquire()
+            waited += await self.tokens_per_minute.acquire(estimated_tokens)
+            if waited:
+                metrics.observe("transcription_rate_limit_wait_seconds", waited)
+                logger.info(
+                    f"🚦 TRANSCRIBE: Waited {waited:.2f}s for rate limit budget"
+                )
+
+            audio_file = BytesIO(audio_content)
+            audio_file.name = filename
+            transcript = await self.client.audio.transcriptions.create(
+                model=CHAT_GPT4_MINI_TRANSCRIBE_MODEL,
+                file=audio_file,
+            )
+            return transcript.text
+
+    async def transcribe(self, audio_content: bytes, mime_type: str) -> str:
+        # Set a name with appropriate extension based on mime_type
+        # Handle both simple MIME types (audio/ogg) and those with codec info (audio/ogg; codecs=opus)
+        mime_subtype = mime_type.split("/")[-1]
+        extension = mime_subtype.split(";")[0].strip()
+        filename = f"audio.{extension}"
+        estimated_tokens = self.estimate_tokens(audio_content)
+
+        started_at = time.monotonic()
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential_jitter(initial=1, max=20),
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            reraise=True,
+        ):
+            with attempt:
+                attempt_number = attempt.retry_state.attempt_number
+                if attempt_number > 1:
+                    logger.warning(
+                        f"🔁 TRANSCRIBE: Retrying transcription (attempt {attempt_number}/{self.max_attempts})"
+                    )
+                text = await self._transcribe_once(
+                    audio_content, filename, estimated_tokens
+                )
+        metrics.observe("transcription_seconds", time.monotonic() - started_at)
+        return text
+
+
+transcription_service = TranscriptionService()
 
 
 async def transcribe_audio(audio_content: bytes, mime_type: str) -> str:
@@ -26,24 +185,6 @@ async def transcribe_audio(audio_content: bytes, mime_type: str) -> str:
         Exception: If transcription fails
     """
     try:
-        # Create a file-like object from bytes
-        from io import BytesIO
-
-        audio_file = BytesIO(audio_content)
-
-        # Set a name with appropriate extension based on mime_type
-        # Handle both simple MIME types (audio/ogg) and those with codec info (audio/ogg; codecs=opus)
-        mime_subtype = mime_type.split("/")[-1]
-        extension = mime_subtype.split(";")[0].strip()
-        audio_file.name = f"audio.{extension}"
-
-        # Request transcription
-        transcript = client.audio.transcriptions.create(
-            model=CHAT_GPT4_MINI_TRANSCRIBE_MODEL,  # Using Whisper model as it's the current standard for OpenAI transcription
-            file=audio_file,
-        )
-
-        return transcript.text
-
+        return await transcription_service.transcribe(audio_content, mime_type)
     except Exception as e:
         raise Exception(f"Failed to transcribe audio: {str(e)}")
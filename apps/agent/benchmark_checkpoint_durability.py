@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark the checkpoint durability modes on an Apolo expense turn.
+
+Runs the real multi-agent graph (main agent -> handoff -> expense agent ->
+tool -> reply) with a scripted model and Main API, on a checkpointer that
+counts round-trips and adds a simulated database round-trip time to each
+one. For every CHECKPOINT_DURABILITY mode it reports the round-trips per
+turn (including the ones flushed after the reply in "async" mode), the turn
+latency, and the latency added over a checkpointer with no round-trip time.
+
+Usage: python benchmark_checkpoint_durability.py [--turns 20] [--rtt-ms 4]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent / "app"))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.services.apolo_langgraph_service import apolo_langgraph_service
+from app.services.checkpoint_savers import (
+    DelegatingCheckpointSaver,
+    WriteBehindCheckpointSaver,
+)
+from app.services.checkpoint_serializer import CompressedCheckpointSerializer
+from app.services.main_api_service import UserData, main_api_service
+from app.services.postgres_checkpointer_service import CHECKPOINT_DURABILITY_MODES
+
+
+class RoundTripCountingSaver(DelegatingCheckpointSaver):
+    """In-memory saver that counts calls and sleeps one RTT per call."""
+
+    def __init__(self, rtt_seconds: float):
+        super().__init__(InMemorySaver(serde=CompressedCheckpointSerializer()))
+        self.rtt_seconds = rtt_seconds
+        self.calls = {"aget_tuple": 0, "aput": 0, "aput_writes": 0}
+
+    async def _round_trip(self, name: str):
+        self.calls[name] += 1
+        await asyncio.sleep(self.rtt_seconds)
+
+    async def aget_tuple(self, config):
+        await self._round_trip("aget_tuple")
+        return await self.inner.aget_tuple(config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        await self._round_trip("aput")
+        return await self.inner.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await self._round_trip("aput_writes")
+        return await self.inner.aput_writes(config, writes, task_id, task_path)
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+class ScriptedExpenseModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def expense_turns():
+    """Model replies for a handoff, an expense registration and the answer."""
+    while True:
+        yield AIMessage(
+            content="",
+            tool_calls=[
+                {"name": "transfer_to_expense_agent", "args": {}, "id": _call_id()}
+            ],
+        )
+        yield AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": "register_expenses_tool",
+                    "args": {
+                        "expenses": [
+                            {
+                                "amount": 12.5,
+                                "categoryKey": "ALIMENTACION",
+                                "description": "Almuerzo",
+                                "message": "Gasté 12.50 en almuerzo",
+                                "currencyCode": "PEN",
+                                "fromAccountKey": "EFECTIVO",
+                            }
+                        ]
+                    },
+                    "id": _call_id(),
+                }
+            ],
+        )
+        yield AIMessage(content="¡Listo! Registré S/ 12.50 en Alimentación.")
+
+
+def _call_id() -> str:
+    return f"call_{uuid.uuid4().hex[:24]}"
+
+
+async def fake_send_request(endpoint, payload, response_model, headers):
+    return SimpleNamespace(
+        data=SimpleNamespace(tool_response="✅ Gasto registrado: S/ 12.50")
+    )
+
+
+def make_user() -> UserData:
+    return UserData.model_construct(
+        id=str(uuid.uuid4()),
+        name="Ana",
+        phone_number="51987654321",
+        country_code="PE",
+        chatId=str(uuid.uuid4()),
+        favorite_language="es",
+        favorite_currency_code="PEN",
+        favorite_locale="es-PE",
+        favorite_timezone="America/Lima",
+        user_profile_insights=None,
+        subscription=None,
+        expense_categories=[],
+        income_categories=[],
+        accounts=[],
+        transaction_tags=[],
+    )
+
+
+async def run_mode(mode: str, turns: int, rtt_seconds: float) -> dict:
+    counting = RoundTripCountingSaver(rtt_seconds)
+    write_behind = WriteBehindCheckpointSaver(counting) if mode == "async" else None
+
+    service = apolo_langgraph_service
+    service.checkpointer = write_behind or counting
+    service.checkpoint_during = mode == "step"
+    service.model = ScriptedExpenseModel(messages=expense_turns())
+    # No summarizer: the benchmark must not call a real model
+    service.conversation_window.summarizer = None
+    service._graphs.clear()
+
+    user = make_user()
+    thread_id = f"bench_{mode}_{uuid.uuid4().hex[:8]}"
+    latencies = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        await service.process_conversation(
+            f"Gasté 12.50 en almuerzo ({turn})", user, thread_id=thread_id
+        )
+        latencies.append(time.perf_counter() - start)
+    if write_behind is not None:
+        await write_behind.flush()
+
+    return {
+        "total": counting.total / turns,
+        "latency_ms": statistics.median(latencies) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument(
+        "--rtt-ms", type=float, default=4.0, help="Simulated Postgres round-trip"
+    )
+    args = parser.parse_args()
+
+    main_api_service._send_request = fake_send_request
+
+    # The first run pays for graph compilation and imports
+    await run_mode("step", 2, 0)
+
+    print(
+        f"{args.turns} expense turns, {args.rtt_ms:g} ms per round-trip\n"
+        f"{'mode':<8}{'round-trips/turn':>18}{'turn ms':>10}{'added ms':>10}"
+    )
+    baseline = (await run_mode("step", args.turns, 0))["latency_ms"]
+    for mode in CHECKPOINT_DURABILITY_MODES:
+        result = await run_mode(mode, args.turns, args.rtt_ms / 1000)
+        print(
+            f"{mode:<8}{result['total']:>18.1f}"
+            f"{result['latency_ms']:>10.1f}{result['latency_ms'] - baseline:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
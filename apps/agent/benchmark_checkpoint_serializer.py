@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Benchmark checkpoint serializers on synthetic LukAI conversations.
+
+Compares bytes per checkpoint and encode/decode time of the current
+JsonPlusSerializer against the msgpack + zstd serializer, with and without a
+trained dictionary. Blobs are produced the way the Postgres checkpointer
+stores them: one typed blob per channel value.
+
+Usage: python benchmark_checkpoint_serializer.py [--turns 40] [--conversations 50]
+                                                 [--write-dictionary PATH]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent / "app"))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.services.checkpoint_serializer import (
+    CompressedCheckpointSerializer,
+    train_dictionary,
+)
+from app.services.main_api_service import (
+    AccountData,
+    ExpenseCategoryData,
+    IncomeCategoryData,
+    TransactionTagData,
+    UserData,
+)
+
+EXPENSE_CATEGORIES = [
+    ("ALIMENTACION", "Alimentación"),
+    ("TRANSPORTE", "Transporte"),
+    ("VIVIENDA", "Vivienda"),
+    ("SALUD", "Salud"),
+    ("ENTRETENIMIENTO", "Entretenimiento"),
+    ("EDUCACION", "Educación"),
+    ("SERVICIOS", "Servicios"),
+    ("ROPA", "Ropa"),
+]
+ACCOUNTS = [
+    ("BANCO_INTERBANK", "REGULAR"),
+    ("EFECTIVO", "REGULAR"),
+    ("AHORROS_BCP", "SAVINGS"),
+]
+
+
+def make_user(rng: random.Random) -> UserData:
+    now = datetime.now(timezone.utc)
+    return UserData(
+        id=str(uuid.uuid4()),
+        name=rng.choice(["Ana", "Luis", "María", "Jorge"]),
+        phone_number=f"519{rng.randint(10000000, 99999999)}",
+        country_code="PE",
+        favorite_language="es",
+        favorite_currency_code="PEN",
+        favorite_locale="es-PE",
+        favorite_timezone="America/Lima",
+        user_profile_insights="Prefiere registrar gastos en soles y revisar su presupuesto cada semana.",
+        chatId=str(uuid.uuid4()),
+        weeklyReport=True,
+        encryption_key=None,
+        recovery_key=None,
+        created_at=now,
+        updated_at=now,
+        subscription=None,
+        expense_categories=[
+            ExpenseCategoryData(
+                id=str(uuid.uuid4()),
+                key=key,
+                name=name,
+                description=f"Gastos de {name.lower()}",
+                color="#4F46E5",
+                image_id=None,
+                created_at=now,
+                updated_at=now,
+            )
+            for key, name in EXPENSE_CATEGORIES
+        ],
+        income_categories=[
+            IncomeCategoryData(
+                id=str(uuid.uuid4()),
+                key="SUELDO",
+                name="Sueldo",
+                description=None,
+                color="#10B981",
+                image_id=None,
+                created_at=now,
+                updated_at=now,
+            )
+        ],
+        accounts=[
+            AccountData(
+                id=str(uuid.uuid4()),
+                key=key,
+                account_type=account_type,
+                name=key.replace("_", " ").title(),
+                description=None,
+                balance=f"{rng.uniform(100, 5000):.2f}",
+                currency_code="PEN",
+                created_at=now,
+                updated_at=now,
+            )
+            for key, account_type in ACCOUNTS
+        ],
+        expenses_count=rng.randint(0, 500),
+        transaction_tags=[
+            TransactionTagData(id=str(uuid.uuid4()), name=name)
+            for name in ["trabajo", "familia", "viaje"]
+        ],
+    )
+
+
+def make_turn(rng: random.Random) -> list:
+    category, name = rng.choice(EXPENSE_CATEGORIES)
+    amount = round(rng.uniform(3, 300), 2)
+    call_id = f"call_{uuid.uuid4().hex[:24]}"
+    return [
+        HumanMessage(
+            content=f"Gasté {amount} soles en {name.lower()} hoy", id=str(uuid.uuid4())
+        ),
+        AIMessage(
+            content="",
+            id=f"run-{uuid.uuid4()}",
+            tool_calls=[
+                {
+                    "name": "register_expenses_tool",
+                    "args": {
+                        "expenses": [
+                            {
+                                "amount": amount,
+                                "categoryKey": category,
+                                "description": f"Compra de {name.lower()}",
+                                "message": f"Gasté {amount} soles en {name.lower()} hoy",
+                                "currencyCode": "PEN",
+                                "fromAccountKey": rng.choice(ACCOUNTS)[0],
+                            }
+                        ]
+                    },
+                    "id": call_id,
+                }
+            ],
+            usage_metadata={
+                "input_tokens": 5210,
+                "output_tokens": 84,
+                "total_tokens": 5294,
+            },
+        ),
+        ToolMessage(
+            content=f"✅ Gasto registrado: S/ {amount} en {name} desde tu cuenta principal. Saldo actualizado.",
+            tool_call_id=call_id,
+            name="register_expenses_tool",
+            id=str(uuid.uuid4()),
+        ),
+        AIMessage(
+            content=f"¡Listo! Registré S/ {amount} en {name}. ¿Quieres ver cuánto llevas gastado este mes?",
+            id=f"run-{uuid.uuid4()}",
+            usage_metadata={
+                "input_tokens": 5402,
+                "output_tokens": 31,
+                "total_tokens": 5433,
+            },
+        ),
+    ]
+
+
+def make_checkpoint_values(rng: random.Random, turns: int) -> list:
+    """Channel values of one checkpoint, as the saver stores them."""
+    messages = [message for _ in range(turns) for message in make_turn(rng)]
+    return [messages, make_user(rng), "main_agent", 25]
+
+
+def measure(serde, checkpoints: list, repeat: int = 3) -> dict:
+    sizes, encode_times, decode_times = [], [], []
+    for values in checkpoints:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            blobs = [serde.dumps_typed(value) for value in values]
+            encode_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for blob in blobs:
+                serde.loads_typed(blob)
+            decode_times.append(time.perf_counter() - start)
+        sizes.append(sum(len(data) for _, data in blobs))
+    return {
+        "bytes": statistics.mean(sizes),
+        "encode_ms": statistics.median(encode_times) * 1000,
+        "decode_ms": statistics.median(decode_times) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=40, help="Turns per conversation")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--dictionary-size", type=int, default=64 * 1024)
+    parser.add_argument("--write-dictionary", help="Save the trained dictionary here")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    checkpoints = [
+        make_checkpoint_values(rng, rng.randint(1, args.turns))
+        for _ in range(args.conversations)
+    ]
+
+    # Train on a separate set of conversations, as it would be in production
+    plain = CompressedCheckpointSerializer(threshold_bytes=sys.maxsize)
+    samples = [
+        data
+        for values in (
+            make_checkpoint_values(rng, rng.randint(1, args.turns)) for _ in range(200)
+        )
+        for _, data in (plain.dumps_typed(value) for value in values)
+        if data
+    ]
+    dictionary = train_dictionary(samples, args.dictionary_size)
+    if args.write_dictionary:
+        Path(args.write_dictionary).write_bytes(dictionary)
+        print(f"Wrote {len(dictionary)} byte dictionary to {args.write_dictionary}")
+
+    serializers = {
+        "jsonplus (current)": JsonPlusSerializer(pickle_fallback=True),
+        "msgpack+zstd": CompressedCheckpointSerializer(),
+        "msgpack+zstd+dict": CompressedCheckpointSerializer(dictionary=dictionary),
+    }
+    baseline = None
+    print(
+        f"{args.conversations} checkpoints, up to {args.turns} turns each\n"
+        f"{'serializer':<20}{'bytes/ckpt':>12}{'ratio':>8}{'encode ms':>11}{'decode ms':>11}"
+    )
+    for name, serde in serializers.items():
+        result = measure(serde, checkpoints)
+        baseline = baseline or result["bytes"]
+        print(
+            f"{name:<20}{result['bytes']:>12.0f}{baseline / result['bytes']:>7.1f}x"
+            f"{result['encode_ms']:>11.3f}{result['decode_ms']:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()